@@ -0,0 +1,374 @@
+# app/archive.py
+#
+# Холодный архив сообщений. Сообщения старше ARCHIVE_AFTER_DAYS переносятся из
+# таблицы messages в неизменяемые файлы-сегменты (по одному или нескольку на месяц):
+#   - сообщения упорядочены по id и сжаты блоками по BLOCK_SIZE строк (zlib);
+#   - в конце файла - разреженный индекс: для каждого блока диапазон id, смещение,
+#     длина и фильтр Блума по участникам, чтобы читать только нужные блоки;
+#   - сегмент регистрируется в archive_segments (и archive_segment_users - число
+#     сообщений каждого участника) в той же транзакции, что удаляет строки из messages.
+# Самое новое сообщение всегда остаётся в messages, поэтому SQLite не переиспользует
+# id архивных сообщений, а архив целиком лежит ниже границы last_id.
+#
+# Чтение прозрачно: эндпоинты сначала читают горячую таблицу и обращаются к архиву,
+# только если страница уходит за границу архива.
+#
+#   python -m app.archive archive [--older-than-days N] [--vacuum]
+#   python -m app.archive stats
+
+import argparse
+import json
+import os
+import struct
+import threading
+import zlib
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.orm import Session
+
+from app import models
+
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", "./archive")
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", "365"))
+# Сообщений в блоке (единица чтения и сжатия) и максимум сообщений в сегменте
+BLOCK_SIZE = 256
+SEGMENT_MAX_MESSAGES = 200000
+# Сколько распакованных блоков держать в памяти
+BLOCK_CACHE_SIZE = int(os.environ.get("ARCHIVE_BLOCK_CACHE_SIZE", "64"))
+
+MAGIC = b"MSGSEG01"
+_FOOTER = struct.Struct(">QQ")  # смещение и длина индекса
+BLOOM_BITS = 512
+BLOOM_HASHES = 3
+
+# Строка архива: (id, sender_id, receiver_id, content, timestamp в ISO 8601, attachment_id).
+# В сегментах, записанных до появления вложений, последнего поля нет.
+Row = Tuple[int, int, int, str, str, Optional[str]]
+
+
+def _bloom_positions(user_id: int) -> Iterator[int]:
+    for seed in range(BLOOM_HASHES):
+        yield ((user_id + 1) * (0x9E3779B97F4A7C15 + 2 * seed + 1) >> 17) % BLOOM_BITS
+
+
+def _bloom(user_ids: Iterable[int]) -> int:
+    bits = 0
+    for user_id in user_ids:
+        for position in _bloom_positions(user_id):
+            bits |= 1 << position
+    return bits
+
+
+def _bloom_contains(bits: int, user_id: int) -> bool:
+    return all(bits >> position & 1 for position in _bloom_positions(user_id))
+
+
+def write_segment(path: str, rows: List[Row]) -> int:
+    """Записывает сегмент атомарно (через временный файл); возвращает размер данных до сжатия."""
+    raw_bytes = 0
+    blocks = []
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as segment:
+        segment.write(MAGIC)
+        for start in range(0, len(rows), BLOCK_SIZE):
+            block = rows[start:start + BLOCK_SIZE]
+            payload = json.dumps(block, ensure_ascii=False, separators=(",", ":")).encode()
+            raw_bytes += len(payload)
+            compressed = zlib.compress(payload, 6)
+            participants = {row[1] for row in block} | {row[2] for row in block}
+            blocks.append([block[0][0], block[-1][0], segment.tell(), len(compressed),
+                           format(_bloom(participants), "x")])
+            segment.write(compressed)
+        index = zlib.compress(json.dumps({"blocks": blocks}).encode())
+        index_offset = segment.tell()
+        segment.write(index)
+        segment.write(_FOOTER.pack(index_offset, len(index)))
+        segment.flush()
+        os.fsync(segment.fileno())
+    os.replace(tmp_path, path)
+    return raw_bytes
+
+
+class SegmentReader:
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as segment:
+            if segment.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Not an archive segment: {path}")
+            segment.seek(-_FOOTER.size, os.SEEK_END)
+            index_offset, index_length = _FOOTER.unpack(segment.read(_FOOTER.size))
+            segment.seek(index_offset)
+            index = json.loads(zlib.decompress(segment.read(index_length)))
+        # [(first_id, last_id, offset, length, bloom), ...] по возрастанию id
+        self.blocks = [(first, last, offset, length, int(bloom, 16))
+                       for first, last, offset, length, bloom in index["blocks"]]
+
+    def read_block(self, number: int) -> List[Row]:
+        _, _, offset, length, _ = self.blocks[number]
+        with open(self.path, "rb") as segment:
+            segment.seek(offset)
+            return [tuple(row) for row in json.loads(zlib.decompress(segment.read(length)))]
+
+
+class MessageArchive:
+    """Чтение и пополнение архива; открытые сегменты и распакованные блоки кэшируются."""
+
+    def __init__(self, directory: str = ARCHIVE_DIR, block_cache_size: int = BLOCK_CACHE_SIZE):
+        self.directory = directory
+        self.block_cache_size = block_cache_size
+        self._readers: Dict[str, SegmentReader] = {}
+        self._blocks: "OrderedDict[Tuple[str, int], List[Row]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.blocks_read = 0
+        self.block_cache_hits = 0
+
+    # --- чтение ---
+
+    def _reader(self, path: str) -> SegmentReader:
+        with self._lock:
+            reader = self._readers.get(path)
+        if reader is None:
+            reader = SegmentReader(os.path.join(self.directory, path))
+            with self._lock:
+                self._readers[path] = reader
+        return reader
+
+    def _block(self, path: str, number: int) -> List[Row]:
+        key = (path, number)
+        with self._lock:
+            rows = self._blocks.get(key)
+            if rows is not None:
+                self._blocks.move_to_end(key)
+                self.block_cache_hits += 1
+                return rows
+        rows = self._reader(path).read_block(number)
+        with self._lock:
+            self.blocks_read += 1
+            self._blocks[key] = rows
+            while len(self._blocks) > self.block_cache_size:
+                self._blocks.popitem(last=False)
+        return rows
+
+    def last_id(self, db: Session) -> Optional[int]:
+        """Верхняя граница архива: все сообщения с id <= last_id лежат в сегментах."""
+        return db.execute(select(func.max(models.ArchiveSegment.last_id))).scalar()
+
+    def _segments(self, db: Session, user_ids: Tuple[int, ...] = ()) -> List[models.ArchiveSegment]:
+        query = select(models.ArchiveSegment).order_by(models.ArchiveSegment.first_id)
+        for user_id in user_ids:
+            # Только сегменты, где есть сообщения каждого из пользователей
+            query = query.where(models.ArchiveSegment.id.in_(
+                select(models.ArchiveSegmentUser.segment_id).where(models.ArchiveSegmentUser.user_id == user_id)
+            ))
+        return db.execute(query).scalars().all()
+
+    def _scan(self, segments, user_ids: Tuple[int, ...], descending: bool,
+              min_id: Optional[int] = None, max_id: Optional[int] = None) -> Iterator[Row]:
+        """Строки сегментов в порядке id, в которых участвуют все user_ids, в (min_id, max_id)."""
+        for segment in (reversed(segments) if descending else segments):
+            if (max_id is not None and segment.first_id >= max_id) or \
+                    (min_id is not None and segment.last_id <= min_id):
+                continue
+            reader = self._reader(segment.path)
+            numbers = range(len(reader.blocks))
+            for number in (reversed(numbers) if descending else numbers):
+                first, last, _, _, bloom = reader.blocks[number]
+                if (max_id is not None and first >= max_id) or (min_id is not None and last <= min_id):
+                    continue
+                if not all(_bloom_contains(bloom, user_id) for user_id in user_ids):
+                    continue
+                rows = self._block(segment.path, number)
+                for row in (reversed(rows) if descending else rows):
+                    if (max_id is not None and row[0] >= max_id) or (min_id is not None and row[0] <= min_id):
+                        continue
+                    if all(user_id in (row[1], row[2]) for user_id in user_ids):
+                        yield row
+
+    @staticmethod
+    def _message(row: Row) -> models.Message:
+        # Объект не привязан к сессии: используется только для формирования ответа
+        message_id, sender_id, receiver_id, content, timestamp = row[:5]
+        return models.Message(id=message_id, sender_id=sender_id, receiver_id=receiver_id,
+                              content=content, timestamp=datetime.fromisoformat(timestamp),
+                              attachment_id=row[5] if len(row) > 5 else None)
+
+    def conversation(self, db: Session, user_id: int, peer_id: int, before_id: Optional[int],
+                     after_id: Optional[int], limit: int, ascending: bool) -> List[models.Message]:
+        """Страница переписки из архива в порядке id (ascending) или от новых к старым."""
+        participants = (user_id,) if user_id == peer_id else (user_id, peer_id)
+        segments = self._segments(db, participants)
+        messages = []
+        for row in self._scan(segments, participants, not ascending, after_id, before_id):
+            # Переписка с собой: оба участника - один и тот же пользователь
+            if user_id == peer_id and row[1] != row[2]:
+                continue
+            messages.append(self._message(row))
+            if len(messages) == limit:
+                break
+        return messages
+
+    def count(self, db: Session, user_id: Optional[int] = None) -> int:
+        """Число архивных сообщений (пользователя, если указан) - без чтения сегментов."""
+        if user_id is None:
+            query = select(func.coalesce(func.sum(models.ArchiveSegment.message_count), 0))
+        else:
+            query = select(func.coalesce(func.sum(models.ArchiveSegmentUser.message_count), 0)).where(
+                models.ArchiveSegmentUser.user_id == user_id
+            )
+        return db.execute(query).scalar()
+
+    def user_messages(self, db: Session, user_id: Optional[int], offset: int, limit: int) -> List[models.Message]:
+        """Архивные сообщения (пользователя) от старых к новым со смещением; сегменты
+        целиком пропускаются по счётчикам archive_segment_users."""
+        if user_id is None:
+            segments = [(segment, segment.message_count) for segment in self._segments(db)]
+        else:
+            counts = dict(db.execute(
+                select(models.ArchiveSegmentUser.segment_id, models.ArchiveSegmentUser.message_count)
+                .where(models.ArchiveSegmentUser.user_id == user_id)
+            ).all())
+            segments = [(segment, counts[segment.id]) for segment in self._segments(db, (user_id,))]
+        participants = () if user_id is None else (user_id,)
+
+        messages = []
+        for segment, segment_count in segments:
+            if offset >= segment_count:
+                offset -= segment_count
+                continue
+            for row in self._scan([segment], participants, descending=False):
+                if offset:
+                    offset -= 1
+                    continue
+                messages.append(self._message(row))
+                if len(messages) == limit:
+                    return messages
+        return messages
+
+    def stats(self) -> dict:
+        return {
+            "open_segments": len(self._readers),
+            "cached_blocks": len(self._blocks),
+            "blocks_read": self.blocks_read,
+            "block_cache_hits": self.block_cache_hits,
+        }
+
+    # --- перенос в архив ---
+
+    def archive(self, db: Session, older_than: timedelta, now: Optional[datetime] = None) -> List[dict]:
+        """Переносит сообщения старше older_than в новые сегменты; возвращает описания сегментов."""
+        os.makedirs(self.directory, exist_ok=True)
+        cutoff = (now or datetime.utcnow()) - older_than
+        max_id = db.execute(select(func.max(models.Message.id))).scalar()
+        if max_id is None:
+            return []
+        # Граница по id: всё до первого сообщения не старше cutoff, но не самое новое
+        first_recent = db.execute(
+            select(func.min(models.Message.id)).where(models.Message.timestamp >= cutoff)
+        ).scalar()
+        upper = min(max_id - 1, first_recent - 1 if first_recent is not None else max_id)
+
+        # Сегменты пишутся по одному: в памяти не больше SEGMENT_MAX_MESSAGES строк
+        created = []
+        after_id = 0
+        while True:
+            batch = db.execute(
+                select(models.Message.id, models.Message.sender_id, models.Message.receiver_id,
+                       models.Message.content, models.Message.timestamp, models.Message.attachment_id)
+                .where(models.Message.id > after_id, models.Message.id <= upper)
+                .order_by(models.Message.id)
+                .limit(SEGMENT_MAX_MESSAGES)
+            ).all()
+            if not batch:
+                return created
+            # Сегмент не пересекает границу месяца
+            period = batch[0].timestamp.strftime("%Y-%m")
+            rows = []
+            for message_id, sender_id, receiver_id, content, timestamp, attachment_id in batch:
+                if timestamp.strftime("%Y-%m") != period:
+                    break
+                rows.append((message_id, sender_id, receiver_id, content, timestamp.isoformat(), attachment_id))
+            created.append(self._store_segment(db, period, rows))
+            after_id = rows[-1][0]
+
+    def _store_segment(self, db: Session, period: str, rows: List[Row]) -> dict:
+        first_id, last_id = rows[0][0], rows[-1][0]
+        path = f"messages-{period}-{first_id}.seg"
+        raw_bytes = write_segment(os.path.join(self.directory, path), rows)
+        users = Counter()
+        for _, sender_id, receiver_id, *_ in rows:
+            users[sender_id] += 1
+            if receiver_id != sender_id:
+                users[receiver_id] += 1
+
+        segment = models.ArchiveSegment(
+            period=period, path=path, first_id=first_id, last_id=last_id, message_count=len(rows),
+            size_bytes=os.path.getsize(os.path.join(self.directory, path)), raw_bytes=raw_bytes
+        )
+        db.add(segment)
+        db.flush()
+        db.execute(insert(models.ArchiveSegmentUser), [
+            {"segment_id": segment.id, "user_id": user_id, "message_count": count}
+            for user_id, count in users.items()
+        ])
+        db.execute(delete(models.Message).where(models.Message.id >= first_id, models.Message.id <= last_id))
+        db.commit()
+        return {"path": path, "period": period, "first_id": first_id, "last_id": last_id,
+                "messages": len(rows), "size_bytes": segment.size_bytes, "raw_bytes": raw_bytes}
+
+
+def storage_stats(db: Session) -> dict:
+    """Размеры горячего хранилища (таблица messages с индексами и FTS) и холодного архива."""
+    hot = {"messages": db.execute(select(func.count(models.Message.id))).scalar(), "bytes": None}
+    if db.get_bind().dialect.name == "sqlite":
+        try:
+            hot["bytes"] = db.execute(text(
+                "SELECT SUM(pgsize) FROM dbstat WHERE name = 'messages' OR name LIKE 'ix_messages%' "
+                "OR name LIKE 'messages_fts%' OR name LIKE 'sqlite_autoindex_messages%'"
+            )).scalar()
+        except Exception:  # SQLite собран без dbstat
+            pass
+    segments, messages, size_bytes, raw_bytes = db.execute(select(
+        func.count(models.ArchiveSegment.id),
+        func.coalesce(func.sum(models.ArchiveSegment.message_count), 0),
+        func.coalesce(func.sum(models.ArchiveSegment.size_bytes), 0),
+        func.coalesce(func.sum(models.ArchiveSegment.raw_bytes), 0),
+    )).one()
+    cold = {
+        "segments": segments,
+        "messages": messages,
+        "bytes": size_bytes,
+        "raw_bytes": raw_bytes,
+        "compression_ratio": round(raw_bytes / size_bytes, 2) if size_bytes else None,
+    }
+    return {"hot": hot, "cold": cold}
+
+
+def main():
+    from app.database import SessionLocal, engine
+    from app.migrations import run_migrations
+
+    parser = argparse.ArgumentParser(description="Cold message archive")
+    commands = parser.add_subparsers(dest="command", required=True)
+    archive_parser = commands.add_parser("archive", help="Move old messages into archive segments")
+    archive_parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    archive_parser.add_argument("--vacuum", action="store_true", help="VACUUM the SQLite database afterwards")
+    commands.add_parser("stats", help="Report hot vs. cold storage sizes")
+    args = parser.parse_args()
+
+    run_migrations(engine)
+    with SessionLocal() as db:
+        if args.command == "archive":
+            for segment in MessageArchive().archive(db, timedelta(days=args.older_than_days)):
+                print(json.dumps(segment))
+            if args.vacuum and engine.dialect.name == "sqlite":
+                # Освободившиеся страницы возвращаются файловой системе только после VACUUM
+                with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                    connection.execute(text("VACUUM"))
+        print(json.dumps(storage_stats(db), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+# app/backplane.py
+#
+# Доставка сообщений между воркерами uvicorn. Каждый воркер держит только свои
+# WebSocket-подключения; бэкплейн пересылает рассылку тем воркерам, у которых
+# подключены получатели. Протокол брокера - кадры JSON с префиксом длины.
+#
+# Запуск брокера:  python -m app.backplane tcp://127.0.0.1:8765
+#                  python -m app.backplane unix:///tmp/voicechat.sock
+
+import asyncio
+import json
+import logging
+import os
+import struct
+import sys
+from typing import Callable, Dict, Iterable, List, Optional, Set
+from urllib.parse import urlparse
+
+BACKPLANE_URL = os.environ.get("BACKPLANE_URL", "memory://")
+RECONNECT_DELAY = 1.0
+# Кадр протокола брокера: длина (uint32 big-endian) + JSON. Кадры больше лимита
+# отбрасываются без разрыва соединения (пакет из 5000 сообщений - несколько МиБ)
+MAX_FRAME_BYTES = int(os.environ.get("BACKPLANE_MAX_FRAME_BYTES", str(64 * 1024 * 1024)))
+# Сколько неотправленных байт брокер держит для одного воркера; сверх этого кадры
+# для медленного воркера отбрасываются, а не копятся в памяти брокера
+MAX_BUFFER_BYTES = int(os.environ.get("BACKPLANE_MAX_BUFFER_BYTES", str(32 * 1024 * 1024)))
+
+_LENGTH = struct.Struct(">I")
+
+logger = logging.getLogger(__name__)
+
+
+class Backplane:
+    """Базовый бэкплейн: доставляет сообщения только внутри текущего процесса."""
+
+    def __init__(self, deliver: Callable[[Iterable[int], dict], None],
+                 local_users: Callable[[], Iterable[int]]):
+        # deliver - локальная доставка в сокеты этого воркера,
+        # local_users - пользователи, подключённые к этому воркеру
+        self.deliver = deliver
+        self.local_users = local_users
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def subscribe(self, user_id: int):
+        pass
+
+    def unsubscribe(self, user_id: int):
+        pass
+
+    async def publish(self, user_ids: List[int], message: dict):
+        self.deliver(user_ids, message)
+
+
+class InProcessBackplane(Backplane):
+    pass
+
+
+def _encode(frame: dict) -> bytes:
+    payload = json.dumps(frame, separators=(",", ":")).encode()
+    return _LENGTH.pack(len(payload)) + payload
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> Optional[dict]:
+    """Следующий кадр; None - кадр больше MAX_FRAME_BYTES или не JSON, он пропущен.
+    При закрытии соединения бросает asyncio.IncompleteReadError."""
+    length, = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+    if length > MAX_FRAME_BYTES:
+        logger.warning("Backplane frame of %d bytes exceeds %d, dropped", length, MAX_FRAME_BYTES)
+        # Пропускаем тело по частям, не читая его в память целиком
+        while length:
+            length -= len(await reader.readexactly(min(length, 64 * 1024)))
+        return None
+    payload = await reader.readexactly(length)
+    try:
+        return json.loads(payload)
+    except ValueError:
+        logger.warning("Malformed backplane frame dropped")
+        return None
+
+
+async def _open_connection(url: str):
+    parsed = urlparse(url)
+    if parsed.scheme == "unix":
+        return await asyncio.open_unix_connection(parsed.path)
+    return await asyncio.open_connection(parsed.hostname, parsed.port)
+
+
+class BrokerBackplane(Backplane):
+    """Бэкплейн через локальный брокер (TCP или Unix-сокет), протокол - JSON-кадры с префиксом длины.
+
+    Получателям, подключённым к этому же воркеру, сообщение доставляется сразу,
+    брокер пересылает его только остальным воркерам.
+    """
+
+    def __init__(self, url: str, deliver, local_users):
+        super().__init__(deliver, local_users)
+        self.url = url
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.reader_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self.reader_task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.reader_task:
+            self.reader_task.cancel()
+        if self.writer:
+            self.writer.close()
+            self.writer = None
+
+    def subscribe(self, user_id: int):
+        self._send({"op": "sub", "user_id": user_id})
+
+    def unsubscribe(self, user_id: int):
+        self._send({"op": "unsub", "user_id": user_id})
+
+    async def publish(self, user_ids: List[int], message: dict):
+        self.deliver(user_ids, message)
+        if self.writer:
+            self._send({"op": "pub", "user_ids": list(user_ids), "message": message})
+            try:
+                await self.writer.drain()
+            except ConnectionError:
+                pass
+
+    def _send(self, frame: dict):
+        # Без соединения с брокером подписки восстановятся при переподключении
+        if self.writer and not self.writer.is_closing():
+            data = _encode(frame)
+            if len(data) - _LENGTH.size > MAX_FRAME_BYTES:
+                # Брокер такой кадр всё равно отбросит; локальные получатели его уже получили
+                logger.warning("Backplane frame of %d bytes exceeds %d, not published",
+                               len(data) - _LENGTH.size, MAX_FRAME_BYTES)
+                return
+            self.writer.write(data)
+
+    async def _run(self):
+        while True:
+            try:
+                reader, self.writer = await _open_connection(self.url)
+                for user_id in list(self.local_users()):
+                    self.subscribe(user_id)
+                while True:
+                    frame = await _read_frame(reader)
+                    if frame is not None and frame.get("op") == "msg":
+                        self.deliver(frame["user_ids"], frame["message"])
+            except asyncio.IncompleteReadError:
+                logger.warning("Backplane connection closed by broker")
+            except (OSError, ValueError) as e:
+                logger.warning("Backplane connection error: %s", e)
+            finally:
+                if self.writer:
+                    self.writer.close()
+                self.writer = None
+            await asyncio.sleep(RECONNECT_DELAY)
+
+
+class Broker:
+    """Маршрутизатор брокера: помнит, какой воркер подписан на какого пользователя."""
+
+    def __init__(self, max_buffer_bytes: int = MAX_BUFFER_BYTES):
+        self.subscribers: Dict[int, Set[asyncio.StreamWriter]] = {}
+        self.max_buffer_bytes = max_buffer_bytes
+        self.dropped = 0  # кадры, отброшенные для медленных воркеров
+        self._congested: Set[asyncio.StreamWriter] = set()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscriptions: Set[int] = set()
+        try:
+            while True:
+                frame = await _read_frame(reader)
+                if frame is None:
+                    continue
+                op = frame.get("op")
+                if op == "sub":
+                    subscriptions.add(frame["user_id"])
+                    self.subscribers.setdefault(frame["user_id"], set()).add(writer)
+                elif op == "unsub":
+                    subscriptions.discard(frame["user_id"])
+                    self._remove(frame["user_id"], writer)
+                elif op == "pub":
+                    self._route(frame["user_ids"], frame["message"], origin=writer)
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for user_id in subscriptions:
+                self._remove(user_id, writer)
+            self._congested.discard(writer)
+            writer.close()
+
+    def _route(self, user_ids: List[int], message: dict, origin: asyncio.StreamWriter):
+        # Группируем получателей по воркерам, чтобы каждому ушёл один кадр
+        targets: Dict[asyncio.StreamWriter, List[int]] = {}
+        for user_id in user_ids:
+            for writer in self.subscribers.get(user_id, ()):
+                if writer is not origin:
+                    targets.setdefault(writer, []).append(user_id)
+        for writer, worker_user_ids in targets.items():
+            if writer.is_closing():
+                continue
+            # Брокер не ждёт воркеров (drain): буфер каждого ограничен, лишнее отбрасывается
+            if writer.transport.get_write_buffer_size() > self.max_buffer_bytes:
+                self.dropped += 1
+                if writer not in self._congested:
+                    self._congested.add(writer)
+                    logger.warning("Backplane worker is not reading, dropping frames (%d dropped)", self.dropped)
+                continue
+            self._congested.discard(writer)
+            writer.write(_encode({"op": "msg", "user_ids": worker_user_ids, "message": message}))
+
+    def _remove(self, user_id: int, writer: asyncio.StreamWriter):
+        writers = self.subscribers.get(user_id)
+        if writers is not None:
+            writers.discard(writer)
+            if not writers:
+                del self.subscribers[user_id]
+
+
+async def start_broker(url: str) -> asyncio.AbstractServer:
+    broker = Broker()
+    parsed = urlparse(url)
+    if parsed.scheme == "unix":
+        return await asyncio.start_unix_server(broker.handle, parsed.path)
+    return await asyncio.start_server(broker.handle, parsed.hostname, parsed.port)
+
+
+def create_backplane(deliver: Callable[[Iterable[int], dict], None],
+                     local_users: Callable[[], Iterable[int]],
+                     url: str = BACKPLANE_URL) -> Backplane:
+    scheme = urlparse(url).scheme
+    if scheme in ("", "memory"):
+        return InProcessBackplane(deliver, local_users)
+    if scheme in ("tcp", "unix"):
+        return BrokerBackplane(url, deliver, local_users)
+    raise ValueError(f"Unsupported backplane URL: {url}")
+
+
+async def _serve(url: str):
+    server = await start_broker(url)
+    print(f"Backplane broker listening on {url}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    asyncio.run(_serve(sys.argv[1] if len(sys.argv) > 1 else "tcp://127.0.0.1:8765"))
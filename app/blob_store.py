@@ -0,0 +1,93 @@
+# app/blob_store.py
+#
+# Локальное хранилище вложений (голосовые сообщения и т.п.) с адресацией по
+# содержимому: имя файла - SHA-256 данных, раскладка BLOB_DIR/ab/cd/<sha256>.
+# Одинаковые файлы хранятся один раз, а готовый файл никогда не меняется.
+#
+# Загрузка потоковая: тело запроса пишется во временный файл по частям, хеш
+# считается на лету, так что в памяти не больше одного фрагмента независимо от
+# размера вложения. После fsync файл атомарно переименовывается в итоговое имя.
+
+import hashlib
+import os
+import re
+import uuid
+from typing import AsyncIterable, Tuple
+
+import anyio
+
+BLOB_DIR = os.environ.get("BLOB_DIR", "blobs")
+BLOB_MAX_BYTES = int(os.environ.get("BLOB_MAX_BYTES", str(20 * 1024 * 1024)))
+
+_BLOB_ID = re.compile(r"^[0-9a-f]{64}$")
+
+# Типы, которые отдаются как указал загрузивший: браузер не исполняет их как
+# страницу. Всё остальное (text/html, image/svg+xml, ...) - application/octet-stream
+SAFE_MEDIA_TYPES = ("audio/", "video/", "image/png", "image/jpeg", "image/gif", "image/webp")
+
+
+def safe_media_type(content_type: str) -> str:
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    if any(media_type.startswith(prefix) if prefix.endswith("/") else media_type == prefix
+           for prefix in SAFE_MEDIA_TYPES):
+        return media_type
+    return "application/octet-stream"
+
+
+class BlobTooLarge(ValueError):
+    """Вложение больше BLOB_MAX_BYTES."""
+
+
+class BlobStore:
+    def __init__(self, root: str = BLOB_DIR, max_bytes: int = BLOB_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.tmp_dir = os.path.join(root, "tmp")
+
+    @staticmethod
+    def is_valid_id(blob_id: str) -> bool:
+        return bool(_BLOB_ID.match(blob_id))
+
+    def path(self, blob_id: str) -> str:
+        if not self.is_valid_id(blob_id):
+            raise ValueError(f"Invalid blob id: {blob_id!r}")
+        return os.path.join(self.root, blob_id[:2], blob_id[2:4], blob_id)
+
+    def exists(self, blob_id: str) -> bool:
+        return self.is_valid_id(blob_id) and os.path.isfile(self.path(blob_id))
+
+    async def write_stream(self, chunks: AsyncIterable[bytes]) -> Tuple[str, int]:
+        """Сохраняет поток фрагментов и возвращает (blob_id, размер).
+
+        При превышении max_bytes бросает BlobTooLarge; временный файл удаляется.
+        """
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        tmp_path = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            async with await anyio.open_file(tmp_path, "wb") as file:
+                async for chunk in chunks:
+                    if not chunk:
+                        continue
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise BlobTooLarge(f"Blob exceeds {self.max_bytes} bytes")
+                    digest.update(chunk)
+                    await file.write(chunk)
+                await file.flush()
+                await anyio.to_thread.run_sync(os.fsync, file.wrapped.fileno())
+
+            blob_id = digest.hexdigest()
+            path = self.path(blob_id)
+            if os.path.exists(path):
+                # Такое содержимое уже хранится
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            return blob_id, size
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
@@ -0,0 +1,35 @@
+# app/change_log.py
+#
+# Журнал изменений (models.ChangeLog): строки пишутся в той же транзакции,
+# что и само изменение; GET /sync читает изменения пользователя после курсора.
+
+from typing import Iterable, List
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import models
+
+CHANGE_MESSAGE = "message"
+CHANGE_FRIEND_REQUEST = "friend_request"  # новый запрос или смена его статуса
+CHANGE_FRIENDSHIP = "friendship"
+
+
+def change_rows(kind: str, ref_id: int, user_ids: Iterable[int]) -> List[dict]:
+    """Строки для insert(models.ChangeLog), по одной на каждого (уникального) пользователя."""
+    return [{"user_id": user_id, "kind": kind, "ref_id": ref_id} for user_id in dict.fromkeys(user_ids)]
+
+
+def load_changes(db: Session, user_id: int, after_id: int, limit: int) -> list:
+    """Строки (id, kind, ref_id) журнала пользователя после курсора, по возрастанию id."""
+    return db.execute(
+        select(models.ChangeLog.id, models.ChangeLog.kind, models.ChangeLog.ref_id)
+        .where(models.ChangeLog.user_id == user_id, models.ChangeLog.id > after_id)
+        .order_by(models.ChangeLog.id)
+        .limit(limit)
+    ).all()
+
+
+def head(db: Session) -> int:
+    """Текущая позиция журнала: id последней записи."""
+    return db.scalar(select(models.ChangeLog.id).order_by(models.ChangeLog.id.desc()).limit(1)) or 0
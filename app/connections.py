@@ -0,0 +1,122 @@
+# app/connections.py
+
+import asyncio
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from fastapi import WebSocket
+
+from app.wire import DEFAULT_CODEC, Codec
+
+# Сколько неотправленных кадров может накопиться у одного сокета,
+# прежде чем он будет считаться медленным и отключён
+MAX_QUEUE_SIZE = 256
+
+
+class UserConnection:
+    """Одно WebSocket-подключение со своей очередью исходящих кадров и задачей-писателем."""
+
+    def __init__(self, websocket: WebSocket, user_id: int, max_queue_size: int, codec: Codec = DEFAULT_CODEC):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.codec = codec
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self.writer_task = None
+        self.closed = False
+
+
+class ConnectionManager:
+    def __init__(self, max_queue_size: int = MAX_QUEUE_SIZE):
+        self.max_queue_size = max_queue_size
+        self.user_connections: Dict[int, List[UserConnection]] = {}
+        self.evictions = 0
+        self.send_failures = 0
+        self.overflows = 0
+        self._close_tasks = set()
+        # Вызываются при первом подключении пользователя и при закрытии последнего
+        self.on_user_online: Optional[Callable[[int], None]] = None
+        self.on_user_offline: Optional[Callable[[int], None]] = None
+        # Вызывается после записи кадра в сокет со временем от постановки в очередь (с)
+        self.on_frame_sent: Optional[Callable[[float], None]] = None
+
+    async def connect(self, websocket: WebSocket, user_id: int, codec: Codec = DEFAULT_CODEC) -> UserConnection:
+        await websocket.accept(subprotocol=codec.subprotocol)
+        connection = UserConnection(websocket, user_id, self.max_queue_size, codec)
+        connection.writer_task = asyncio.create_task(self._writer(connection))
+        connections = self.user_connections.setdefault(user_id, [])
+        connections.append(connection)
+        if len(connections) == 1 and self.on_user_online:
+            self.on_user_online(user_id)
+        return connection
+
+    def disconnect(self, connection: UserConnection):
+        # Может вызываться повторно (после вытеснения и затем WebSocketDisconnect)
+        connections = self.user_connections.get(connection.user_id)
+        if connections and connection in connections:
+            connections.remove(connection)
+            if not connections:  # Если у пользователя нет активных подключений
+                del self.user_connections[connection.user_id]
+                if self.on_user_offline:
+                    self.on_user_offline(connection.user_id)
+        connection.closed = True
+        if connection.writer_task and connection.writer_task is not asyncio.current_task():
+            connection.writer_task.cancel()
+
+    def broadcast(self, user_ids: Iterable[int], message: dict):
+        """Ставит сообщение в очереди всех сокетов пользователей, не дожидаясь доставки."""
+        payloads = {}  # Сериализация один раз на рассылку для каждого формата
+        queued_at = time.monotonic()
+        for user_id in set(user_ids):
+            for connection in list(self.user_connections.get(user_id, ())):
+                payload = payloads.get(connection.codec)
+                if payload is None:
+                    payload = payloads[connection.codec] = connection.codec.encode(message)
+                try:
+                    connection.queue.put_nowait((queued_at, payload))
+                except asyncio.QueueFull:
+                    self.overflows += 1
+                    self._evict(connection)
+
+    def stats(self) -> dict:
+        depths = [connection.queue.qsize() for connections in self.user_connections.values()
+                  for connection in connections]
+        return {
+            "users": len(self.user_connections),
+            "connections": len(depths),
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+            "evictions": self.evictions,
+            "overflows": self.overflows,
+            "send_failures": self.send_failures,
+        }
+
+    async def _writer(self, connection: UserConnection):
+        while True:
+            queued_at, payload = await connection.queue.get()
+            try:
+                if connection.codec.binary:
+                    await connection.websocket.send_bytes(payload)
+                else:
+                    await connection.websocket.send_text(payload)
+            except Exception:
+                self.send_failures += 1
+                self._evict(connection)
+                return
+            if self.on_frame_sent:
+                self.on_frame_sent(time.monotonic() - queued_at)
+
+    def _evict(self, connection: UserConnection):
+        if connection.closed:
+            return
+        self.evictions += 1
+        self.disconnect(connection)
+        task = asyncio.create_task(self._close(connection.websocket))
+        self._close_tasks.add(task)
+        task.add_done_callback(self._close_tasks.discard)
+
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        try:
+            await websocket.close(code=1013)  # Try Again Later
+        except Exception:
+            pass
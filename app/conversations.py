@@ -0,0 +1,98 @@
+# app/conversations.py
+#
+# Сводки переписок (models.ConversationSummary) для списка диалогов: последнее
+# сообщение, его начало и число непрочитанных для каждой стороны. MessageWriter
+# обновляет сводки в той же транзакции, что и вставку пачки сообщений, так что
+# GET /users/{id}/conversations - один запрос по индексу независимо от объёма истории.
+
+import os
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app import models
+
+SNIPPET_LENGTH = int(os.environ.get("CONVERSATION_SNIPPET_LENGTH", "100"))
+
+
+def summary_rows(rows: List[dict], ids: List[int]) -> List[dict]:
+    """Строки для upsert_statement по пачке сообщений (в порядке возрастания id):
+    для каждой стороны переписки - последнее сообщение и число новых входящих."""
+    summaries: Dict[Tuple[int, int], dict] = {}
+    for row, message_id in zip(rows, ids):
+        sender_id, receiver_id = row["sender_id"], row["receiver_id"]
+        for user_id, peer_id in dict.fromkeys(((sender_id, receiver_id), (receiver_id, sender_id))):
+            summary = summaries.get((user_id, peer_id))
+            unread = summary["unread_count"] if summary else 0
+            summaries[(user_id, peer_id)] = {
+                "user_id": user_id,
+                "peer_id": peer_id,
+                "last_message_id": message_id,
+                "last_sender_id": sender_id,
+                "last_snippet": row["content"][:SNIPPET_LENGTH],
+                "last_timestamp": row["timestamp"],
+                "unread_count": unread + (1 if user_id == receiver_id and sender_id != receiver_id else 0),
+                "last_read_id": 0,
+            }
+    return list(summaries.values())
+
+
+def upsert_statement(dialect_name: str):
+    """INSERT ... ON CONFLICT для сводок: последнее сообщение заменяется, непрочитанные суммируются.
+
+    Транзакции записи в SQLite выполняются по очереди, поэтому id сообщений
+    следующей пачки всегда больше уже записанных.
+    """
+    dialect = postgresql if dialect_name == "postgresql" else sqlite
+    table = models.ConversationSummary.__table__
+    statement = dialect.insert(table)
+    excluded = statement.excluded
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.peer_id],
+        set_={
+            "last_message_id": excluded.last_message_id,
+            "last_sender_id": excluded.last_sender_id,
+            "last_snippet": excluded.last_snippet,
+            "last_timestamp": excluded.last_timestamp,
+            "unread_count": table.c.unread_count + excluded.unread_count,
+        }
+    )
+
+
+def load_conversations(db: Session, user_id: int, limit: int,
+                       before_message_id: Optional[int] = None) -> List[models.ConversationSummary]:
+    """Переписки пользователя от самой свежей; страница - по индексу ix_conversation_summaries_user."""
+    query = select(models.ConversationSummary).where(models.ConversationSummary.user_id == user_id)
+    if before_message_id is not None:
+        query = query.where(models.ConversationSummary.last_message_id < before_message_id)
+    query = query.order_by(models.ConversationSummary.last_message_id.desc()).limit(limit)
+    return list(db.scalars(query))
+
+
+def mark_read(db: Session, user_id: int, peer_id: int,
+              message_id: Optional[int] = None) -> Optional[models.ConversationSummary]:
+    """Сдвигает отметку прочтения до message_id (по умолчанию - до последнего сообщения)
+    и пересчитывает непрочитанные. Отметка назад не двигается."""
+    summary = db.get(models.ConversationSummary, (user_id, peer_id))
+    if summary is None:
+        return None
+    read_id = summary.last_message_id if message_id is None else min(message_id, summary.last_message_id)
+    read_id = max(read_id, summary.last_read_id)
+
+    # Входящие после отметки считаются в том же запросе: сообщения, записанные
+    # после чтения сводки, останутся непрочитанными
+    unread = select(func.count()).select_from(models.Message).where(
+        models.Message.sender_id == peer_id,
+        models.Message.receiver_id == user_id,
+        models.Message.id > read_id
+    ).scalar_subquery() if user_id != peer_id else 0
+    db.execute(
+        update(models.ConversationSummary)
+        .where(models.ConversationSummary.user_id == user_id, models.ConversationSummary.peer_id == peer_id)
+        .values(last_read_id=read_id, unread_count=unread)
+    )
+    db.commit()
+    db.refresh(summary)
+    return summary
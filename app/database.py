@@ -1,11 +1,90 @@
 # app/database.py
 
-from sqlalchemy import create_engine, MetaData
+import os
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-DATABASE_URL = "sqlite:///./database.db"
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./database.db")
+# Необязательная отдельная база/движок только для чтения, например
+# sqlite:///file:./database.db?mode=ro&uri=true или URL реплики
+DATABASE_READ_URL = os.environ.get("DATABASE_READ_URL")
+
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "20"))
+
+# PRAGMA, применяемые к каждому новому подключению SQLite
+SQLITE_PRAGMAS = {
+    "journal_mode": os.environ.get("DB_JOURNAL_MODE", "WAL"),
+    "synchronous": os.environ.get("DB_SYNCHRONOUS", "NORMAL"),
+    "cache_size": int(os.environ.get("DB_CACHE_SIZE", "-65536")),  # отрицательное значение - в КиБ
+    "mmap_size": int(os.environ.get("DB_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "busy_timeout": int(os.environ.get("DB_BUSY_TIMEOUT", "5000")),  # мс
+}
+
+# Асинхронные драйверы для тех же баз
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+
+def async_url(url: str) -> str:
+    parsed = make_url(url)
+    drivername = ASYNC_DRIVERS.get(parsed.get_backend_name(), parsed.drivername)
+    return parsed.set(drivername=drivername).render_as_string(hide_password=False)
+
+
+def _is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+def _engine_options(url: str) -> dict:
+    options = {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_pre_ping": not _is_sqlite(url)}
+    if _is_sqlite(url) and make_url(url).database in (None, "", ":memory:"):
+        # База в памяти не может использовать пул с несколькими подключениями
+        options = {}
+    return options
+
+
+def _apply_sqlite_pragmas(sync_engine, read_only: bool = False):
+    @event.listens_for(sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            if read_only and name == "journal_mode":
+                continue  # Режим журнала хранится в файле базы, его задаёт движок записи
+            cursor.execute(f"PRAGMA {name}={value}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+
+def _create_engine(url: str, read_only: bool = False):
+    connect_args = {"check_same_thread": False} if _is_sqlite(url) else {}
+    db_engine = create_engine(url, connect_args=connect_args, **_engine_options(url))
+    if _is_sqlite(url):
+        _apply_sqlite_pragmas(db_engine, read_only)
+    return db_engine
+
+
+engine = _create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
\ No newline at end of file
+
+# Тяжёлые чтения (история сообщений, поиск, друзья) идут через отдельный движок,
+# чтобы не конкурировать за подключения с записью сообщений
+read_engine = _create_engine(DATABASE_READ_URL, read_only=True) if DATABASE_READ_URL else engine
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# Та же база, но через асинхронный драйвер - для async-эндпоинтов и WebSocket
+ASYNC_DATABASE_URL = os.environ.get("ASYNC_DATABASE_URL", async_url(DATABASE_URL))
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_options(ASYNC_DATABASE_URL))
+if _is_sqlite(ASYNC_DATABASE_URL):
+    _apply_sqlite_pragmas(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+Base = declarative_base()
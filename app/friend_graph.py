@@ -0,0 +1,105 @@
+# app/friend_graph.py
+#
+# Индекс графа дружбы в памяти: для каждого пользователя - отсортированный
+# массив id друзей. Таблица friendships только дополняется, поэтому индекс
+# догружает новые строки по возрастанию id (sync), что заодно подхватывает
+# дружбы, созданные другими воркерами.
+
+import os
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import models
+
+# Сколько друзей пользователя просматривается при подборе рекомендаций:
+# ограничивает работу для пользователей с тысячами друзей
+SUGGESTION_FANOUT = int(os.environ.get("SUGGESTION_FANOUT", "50"))
+# Во сколько раз больше кандидатов, чем нужно, получают точный подсчёт общих друзей
+SUGGESTION_SHORTLIST_FACTOR = 5
+
+_EMPTY = array("q")
+
+
+class FriendGraph:
+    def __init__(self):
+        self._adjacency: Dict[int, array] = {}
+        self._lock = threading.Lock()
+        self.last_friendship_id = 0
+
+    def sync(self, db: Session):
+        """Догружает строки friendships, появившиеся после последней синхронизации."""
+        rows = db.execute(
+            select(models.Friendship.id, models.Friendship.user_id, models.Friendship.friend_id)
+            .where(models.Friendship.id > self.last_friendship_id)
+            .order_by(models.Friendship.id)
+        ).all()
+        if rows:
+            self._add_edges(rows)
+
+    def _add_edges(self, rows: List[Tuple[int, int, int]]):
+        with self._lock:
+            added: Dict[int, set] = {}
+            for friendship_id, user_id, friend_id in rows:
+                if friendship_id <= self.last_friendship_id:
+                    continue  # Уже загружено параллельным вызовом
+                added.setdefault(user_id, set()).add(friend_id)
+                added.setdefault(friend_id, set()).add(user_id)
+                self.last_friendship_id = friendship_id
+            # Копирование при записи: читатели без блокировки видят целый массив
+            for user_id, friend_ids in added.items():
+                current = self._adjacency.get(user_id, _EMPTY)
+                self._adjacency[user_id] = array("q", sorted(friend_ids.union(current)))
+
+    def friends(self, user_id: int) -> array:
+        return self._adjacency.get(user_id, _EMPTY)
+
+    def are_friends(self, user_id: int, other_id: int) -> bool:
+        friend_ids = self.friends(user_id)
+        i = bisect_left(friend_ids, other_id)
+        return i < len(friend_ids) and friend_ids[i] == other_id
+
+    def mutual(self, user_id: int, other_id: int) -> List[int]:
+        a, b = self.friends(user_id), self.friends(other_id)
+        if len(a) > len(b):
+            a, b = b, a
+        return sorted(set(a).intersection(b))
+
+    def suggestions(self, user_id: int, limit: int = 10, fanout: int = SUGGESTION_FANOUT) -> List[Tuple[int, int]]:
+        """Друзья друзей, упорядоченные по числу общих друзей: [(id, mutual_count), ...].
+
+        Если друзей больше fanout, кандидаты собираются по равномерной выборке друзей
+        (каждый k-й, а не первые по id), а для лучших из них число общих друзей
+        считается точно пересечением списков - в ответе не бывает заниженных чисел.
+        """
+        friend_ids = self.friends(user_id)
+        step = -(-len(friend_ids) // fanout) if fanout > 0 else 1
+        candidates = Counter()
+        for friend_id in friend_ids[::step]:
+            candidates.update(self.friends(friend_id))
+        candidates.pop(user_id, None)
+        for friend_id in friend_ids:
+            candidates.pop(friend_id, None)
+        if step == 1:
+            return candidates.most_common(limit)  # Просмотрены все друзья: числа точные
+
+        friend_set = set(friend_ids)
+        shortlist = candidates.most_common(limit * SUGGESTION_SHORTLIST_FACTOR)
+        exact = [
+            (candidate_id, sum(1 for friend_id in self.friends(candidate_id) if friend_id in friend_set))
+            for candidate_id, _ in shortlist
+        ]
+        exact.sort(key=lambda item: item[1], reverse=True)
+        return exact[:limit]
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._adjacency),
+            "edges": sum(len(friend_ids) for friend_ids in self._adjacency.values()) // 2,
+            "last_friendship_id": self.last_friendship_id,
+        }
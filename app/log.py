@@ -0,0 +1,27 @@
+# app/log.py
+#
+# Неблокирующее логирование: логгеры приложения ("app.*") только кладут записи
+# в очередь, форматирование и запись в stdout выполняет поток QueueListener,
+# так что медленный stdout не задерживает цикл событий.
+
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+def setup_logging(level: str = LOG_LEVEL) -> QueueListener:
+    """Направляет логгер "app" в очередь и возвращает ещё не запущенный поток-писатель."""
+    log_queue = queue.SimpleQueue()
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    logger = logging.getLogger("app")
+    logger.setLevel(level)
+    logger.handlers = [QueueHandler(log_queue)]
+    logger.propagate = False
+    return QueueListener(log_queue, handler, respect_handler_level=True)
@@ -1,49 +1,108 @@
 # app/main.py
 
-import json
-from fastapi import FastAPI, Depends, HTTPException, WebSocket, WebSocketDisconnect, Query
+import anyio
+import logging
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, HTTPException, WebSocket, WebSocketDisconnect, Query, Request, Response
+from fastapi.responses import FileResponse
+from sqlalchemy import insert, select, union_all
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from . import models, schemas
-from .database import SessionLocal, engine, Base
+from . import archive, change_log, conversations, message_search, models, schemas, user_search, wire
+from .backplane import create_backplane
+from .blob_store import BlobStore, BlobTooLarge, safe_media_type
+from .connections import ConnectionManager, UserConnection
+from .friend_graph import FriendGraph
+from .database import SessionLocal, ReadSessionLocal, AsyncSessionLocal, async_engine, engine, read_engine
+from .log import setup_logging
+from .message_writer import MessageWriter
+from .metrics import CONTENT_TYPE, ChatMetrics, MetricsMiddleware
+from .pagination import decode_cursor, encode_cursor
+from .user_directory import UserDirectory
+from .voice import VoiceRelay
 from passlib.context import CryptContext
-from datetime import datetime
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+# Логи пишутся в stdout отдельным потоком (см. app/log.py)
+log_listener = setup_logging()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    log_listener.start()
+    with SessionLocal() as db:
+        friend_graph.sync(db)
+    await backplane.start()
+    message_writer.start()
+    yield
+    await message_writer.stop()
+    await backplane.stop()
+    log_listener.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+# Метрики для GET /metrics: задержки по маршрутам, SQL-запросы, WebSocket, рассылка, bcrypt
+metrics = ChatMetrics()
+app.add_middleware(MetricsMiddleware, metrics=metrics)
+metrics.instrument_engine(engine, "write")
+if read_engine is not engine:
+    metrics.instrument_engine(read_engine, "read")
+metrics.instrument_engine(async_engine.sync_engine, "async")
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-user_connections = {}
-
-Base.metadata.create_all(bind=engine)
+connection_manager = ConnectionManager()
+user_connections = connection_manager.user_connections
+# Рассылка между воркерами: BACKPLANE_URL=memory:// (по умолчанию), tcp://host:port или unix:///path
+backplane = create_backplane(connection_manager.broadcast, lambda: list(user_connections))
+connection_manager.on_user_online = backplane.subscribe
+connection_manager.on_user_offline = backplane.unsubscribe
+connection_manager.on_frame_sent = metrics.websocket_send_delay.observe
+metrics.track_websockets(lambda: user_connections)
+# Новые сообщения записываются пачками в фоновой задаче
+message_writer = MessageWriter(async_engine, AsyncSessionLocal)
+# Кэш id -> username для горячих путей
+user_directory = UserDirectory()
+# Граф дружбы в памяти для списка друзей, общих друзей и рекомендаций
+friend_graph = FriendGraph()
+# Холодный архив старых сообщений (см. app/archive.py)
+message_archive = archive.MessageArchive()
+# Ретрансляция голосовых кадров между участниками звонков
+voice_relay = VoiceRelay()
+# Файлы вложений (голосовые сообщения) с адресацией по содержимому
+blob_store = BlobStore()
+
+# Схема базы обновляется один раз до запуска воркеров: python -m app.migrations (см. run_api.py)
 
 
 # Функция для подключения WebSocket
 async def connect_websocket(websocket: WebSocket, user_id: int):
-    await websocket.accept()
-    if user_id not in user_connections:
-        user_connections[user_id] = []
-    user_connections[user_id].append(websocket)
-    print(f"User {user_id} connected")
+    # Формат кадров выбирается по подпротоколу, предложенному клиентом
+    codec = wire.negotiate(websocket.scope.get("subprotocols", []))
+    connection = await connection_manager.connect(websocket, user_id, codec)
+    logger.info("User %s connected", user_id)
+    return connection
 
 
 # Функция для отключения WebSocket
-def disconnect_websocket(websocket: WebSocket, user_id: int):
-    if user_id in user_connections:
-        user_connections[user_id].remove(websocket)
-        if not user_connections[user_id]:  # Если у пользователя нет активных подключений
-            del user_connections[user_id]
-    print(f"User {user_id} disconnected")
+def disconnect_websocket(connection: UserConnection):
+    connection_manager.disconnect(connection)
+    logger.info("User %s disconnected", connection.user_id)
 
 
-# Функция для отправки сообщения пользователю через WebSocket
+# Функция для отправки сообщения пользователям через WebSocket.
+# Бэкплейн доставляет сообщение воркерам, где подключены получатели;
+# там оно только ставится в очереди сокетов, отправку выполняют задачи-писатели
 async def broadcast_message_to_user(user_id: int, message: dict):
-    if user_id in user_connections:
-        for connection in user_connections[user_id]:
-            try:
-                await connection.send_json(message)
-                print(f"Message sent to user {user_id}: {message}")
-            except Exception as e:
-                print(f"Error sending message to user {user_id}: {e}")
+    await broadcast_message_to_users([user_id], message)
+
+
+async def broadcast_message_to_users(user_ids: List[int], message: dict):
+    started = time.perf_counter()
+    await backplane.publish(user_ids, message)
+    metrics.fanout_seconds.observe(time.perf_counter() - started)
 
 
 # Получение сессии базы данных
@@ -55,13 +114,34 @@ def get_db():
         db.close()
 
 
+# Сессия для тяжёлых чтений (движок только для чтения, если задан DATABASE_READ_URL)
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# Асинхронная сессия для async-эндпоинтов: не блокирует цикл событий
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 # Функции хеширования паролей
 def hash_password(password: str):
-    return pwd_context.hash(password)
+    started = time.perf_counter()
+    hashed = pwd_context.hash(password)
+    metrics.password_hash_seconds.observe(time.perf_counter() - started, ("hash",))
+    return hashed
 
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    started = time.perf_counter()
+    verified = pwd_context.verify(plain_password, hashed_password)
+    metrics.password_hash_seconds.observe(time.perf_counter() - started, ("verify",))
+    return verified
 
 
 # Создание пользователя
@@ -76,6 +156,8 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    # SQLite может повторно выдать id удалённого пользователя
+    user_directory.invalidate(db_user.id)
     return db_user
 
 
@@ -94,7 +176,7 @@ def add_friend(user_id: int, friend_id: int, db: Session = Depends(get_db)):
     friend = db.query(models.User).filter(models.User.id == friend_id).first()
 
     if not user or not friend:
-        print(f"User {user_id} or friend {friend_id} not found in database.")
+        logger.info("User %s or friend %s not found in database", user_id, friend_id)
         raise HTTPException(status_code=404, detail="User not found")
 
     existing_friendship = db.query(models.Friendship).filter(
@@ -102,124 +184,303 @@ def add_friend(user_id: int, friend_id: int, db: Session = Depends(get_db)):
         models.Friendship.friend_id == friend_id
     ).first()
     if existing_friendship:
-        print(f"User {user_id} and friend {friend_id} are already friends.")
+        logger.info("User %s and friend %s are already friends", user_id, friend_id)
         raise HTTPException(status_code=400, detail="Already friends")
 
     friendship = models.Friendship(user_id=user_id, friend_id=friend_id)
     db.add(friendship)
+    db.flush()
+    db.execute(insert(models.ChangeLog),
+               change_log.change_rows(change_log.CHANGE_FRIENDSHIP, friendship.id, (user_id, friend_id)))
     db.commit()
+    friend_graph.sync(db)
     return {"message": "Friend added successfully"}
 
 @app.post("/friend_requests/")
-async def send_friend_request(request: schemas.FriendRequestCreate, db: Session = Depends(get_db)):
+async def send_friend_request(request: schemas.FriendRequestCreate, db: AsyncSession = Depends(get_async_db)):
     # Проверка существующего запроса
-    existing_request = db.query(models.FriendRequest).filter(
+    existing_request = await db.scalar(select(models.FriendRequest.id).where(
         models.FriendRequest.sender_id == request.sender_id,
         models.FriendRequest.receiver_id == request.receiver_id,
         models.FriendRequest.status == "pending"
-    ).first()
+    ).limit(1))
     if existing_request:
         raise HTTPException(status_code=400, detail="Friend request already sent")
 
     # Создание запроса на дружбу
     friend_request = models.FriendRequest(sender_id=request.sender_id, receiver_id=request.receiver_id)
     db.add(friend_request)
-    db.commit()
-    db.refresh(friend_request)
+    await db.flush()
+    await db.execute(insert(models.ChangeLog), change_log.change_rows(
+        change_log.CHANGE_FRIEND_REQUEST, friend_request.id, (request.receiver_id, request.sender_id)
+    ))
+    await db.commit()
 
     # Отправка уведомления через WebSocket пользователю-получателю
     message_data = {
         "type": "friend_request",
+        "request_id": friend_request.id,
         "sender_id": request.sender_id,
         "receiver_id": request.receiver_id,
-        "sender_username": db.query(models.User).filter(models.User.id == request.sender_id).first().username,
+        "sender_username": (await user_directory.get_usernames_async(db, [request.sender_id])).get(request.sender_id),
         "message": "You have a new friend request"
     }
     await broadcast_message_to_user(request.receiver_id, message_data)
 
     return {"message": "Friend request sent successfully"}
 
-    # Добавление в таблицу Friendship
-    friendship = models.Friendship(user_id=user_id, friend_id=friend_id)
-    db.add(friendship)
-    db.commit()
-    return {"message": "Friend added successfully"}
+def _attachment_data(attachment: models.Attachment) -> dict:
+    return {"id": attachment.id, "content_type": attachment.content_type, "size": attachment.size}
+
+
+# Метаданные вложений по id; если какого-то вложения нет - 404
+async def _load_attachments_async(db: AsyncSession, attachment_ids) -> dict:
+    ids = {attachment_id for attachment_id in attachment_ids if attachment_id is not None}
+    if not ids:
+        return {}
+    result = await db.execute(select(models.Attachment).where(models.Attachment.id.in_(ids)))
+    attachments = {attachment.id: _attachment_data(attachment) for attachment in result.scalars()}
+    if len(attachments) != len(ids):
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    return attachments
+
+
+# Потоковая загрузка вложения: тело запроса - сами данные (можно Transfer-Encoding: chunked),
+# тип берётся из Content-Type. Тело пишется на диск по фрагментам, в память целиком не читается.
+# Возвращает метаданные; id затем передаётся в attachment_id сообщения.
+@app.post("/attachments/", response_model=schemas.AttachmentResponse)
+async def upload_attachment(request: Request, user_id: int, db: AsyncSession = Depends(get_async_db)):
+    if not await user_directory.get_usernames_async(db, [user_id]):
+        raise HTTPException(status_code=404, detail="User not found")
+    content_length = request.headers.get("content-length")
+    if content_length is not None and content_length.isdigit() and int(content_length) > blob_store.max_bytes:
+        raise HTTPException(status_code=413, detail="Attachment too large")
+
+    try:
+        blob_id, size = await blob_store.write_stream(request.stream())
+    except BlobTooLarge:
+        raise HTTPException(status_code=413, detail="Attachment too large")
+
+    # Одинаковое содержимое - одно вложение: повторная загрузка возвращает существующую запись
+    attachment = await db.get(models.Attachment, blob_id)
+    if attachment is None:
+        attachment = models.Attachment(
+            id=blob_id,
+            content_type=request.headers.get("content-type", "application/octet-stream"),
+            size=size,
+            uploader_id=user_id
+        )
+        db.add(attachment)
+        try:
+            await db.commit()
+        except IntegrityError:
+            # Такое же содержимое одновременно загрузили в другом запросе
+            await db.rollback()
+            attachment = await db.get(models.Attachment, blob_id)
+    return _attachment_data(attachment)
+
+
+# Скачивание вложения, в том числе по частям (Range -> 206 Partial Content) для перемотки.
+# Файл отдаётся с диска фрагментами без чтения целиком; сервер с расширением ASGI
+# http.response.pathsend отправляет файл целиком через sendfile.
+@app.get("/attachments/{attachment_id}")
+def download_attachment(attachment_id: str, db: Session = Depends(get_read_db)):
+    attachment = db.get(models.Attachment, attachment_id)
+    if attachment is None or not blob_store.exists(attachment_id):
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    # Содержимое по id никогда не меняется. Тип от загрузившего не доверяется: вне
+    # списка безопасных - octet-stream, и браузер только скачивает файл, не открывая
+    # его на домене API
+    return FileResponse(
+        blob_store.path(attachment_id),
+        media_type=safe_media_type(attachment.content_type),
+        headers={
+            "Cache-Control": "private, max-age=31536000, immutable",
+            "Content-Disposition": "attachment",
+            "X-Content-Type-Options": "nosniff",
+        }
+    )
+
 
 @app.post("/messages/", response_model=schemas.MessageResponse)
-async def send_message(message: schemas.MessageCreate, db: Session = Depends(get_db)):
-    # Проверка существования отправителя и получателя
-    db_sender = db.query(models.User).filter(models.User.id == message.sender_id).first()
-    db_receiver = db.query(models.User).filter(models.User.id == message.receiver_id).first()
+async def send_message(message: schemas.MessageCreate, db: AsyncSession = Depends(get_async_db)):
+    # Проверка существования отправителя и получателя через кэш имён (при промахе - один запрос)
+    usernames = await user_directory.get_usernames_async(db, [message.sender_id, message.receiver_id])
 
-    if not db_sender or not db_receiver:
+    if message.sender_id not in usernames or message.receiver_id not in usernames:
         raise HTTPException(status_code=404, detail="User not found")
+    attachments = await _load_attachments_async(db, [message.attachment_id])
 
-    # Создание и сохранение сообщения
-    db_message = models.Message(
-        sender_id=message.sender_id,
-        receiver_id=message.receiver_id,
-        content=message.content,
-        timestamp=datetime.utcnow()
+    # Сохранение сообщения: ожидаем фиксации пачки, в которую оно попало
+    message_id, timestamp = await message_writer.write(
+        message.sender_id, message.receiver_id, message.content, message.attachment_id
     )
-    db.add(db_message)
-    db.commit()
-    db.refresh(db_message)
 
     # Данные для WebSocket
     message_data = {
-        "id": db_message.id,
-        "sender_id": db_message.sender_id,
-        "receiver_id": db_message.receiver_id,
-        "content": db_message.content,
-        "timestamp": db_message.timestamp.isoformat(),
-        "sender_username": db_sender.username,
-        "receiver_username": db_receiver.username
+        "id": message_id,
+        "sender_id": message.sender_id,
+        "receiver_id": message.receiver_id,
+        "content": message.content,
+        "timestamp": timestamp.isoformat(),
+        "sender_username": usernames[message.sender_id],
+        "receiver_username": usernames[message.receiver_id],
+        "attachment": attachments.get(message.attachment_id)
     }
 
     # Отправка сообщения отправителю и получателю через WebSocket
-    try:
-        await broadcast_message_to_user(message.sender_id, message_data)
-        await broadcast_message_to_user(message.receiver_id, message_data)
-    except Exception as e:
-        print("WebSocket error:", e)
+    await broadcast_message_to_users([message.sender_id, message.receiver_id], message_data)
 
     return message_data
 
+# Пакетная отправка: проверка пользователей одним набором, вставка одной транзакцией,
+# доставка одним кадром "message_batch" на каждого получателя
+@app.post("/messages/batch", response_model=List[schemas.MessageResponse])
+async def send_message_batch(batch: schemas.MessageBatchCreate, db: AsyncSession = Depends(get_async_db)):
+    messages = batch.messages
+    user_ids = {m.sender_id for m in messages} | {m.receiver_id for m in messages}
+    usernames = await user_directory.get_usernames_async(db, user_ids)
+    if len(usernames) != len(user_ids):
+        raise HTTPException(status_code=404, detail="User not found")
+    attachments = await _load_attachments_async(db, [m.attachment_id for m in messages])
+
+    saved = await message_writer.write_many(
+        [(m.sender_id, m.receiver_id, m.content, m.attachment_id) for m in messages]
+    )
+
+    messages_data = []
+    deliveries = {}
+    for message, (message_id, timestamp) in zip(messages, saved):
+        message_data = {
+            "id": message_id,
+            "sender_id": message.sender_id,
+            "receiver_id": message.receiver_id,
+            "content": message.content,
+            "timestamp": timestamp.isoformat(),
+            "sender_username": usernames[message.sender_id],
+            "receiver_username": usernames[message.receiver_id],
+            "attachment": attachments.get(message.attachment_id)
+        }
+        messages_data.append(message_data)
+        deliveries.setdefault(message.sender_id, []).append(message_data)
+        if message.receiver_id != message.sender_id:
+            deliveries.setdefault(message.receiver_id, []).append(message_data)
+
+    for user_id, user_messages in deliveries.items():
+        await broadcast_message_to_user(user_id, {"type": "message_batch", "messages": user_messages})
+
+    return messages_data
+
 # WebSocket для чата
 @app.websocket("/ws/chat/{user_id}")
 async def websocket_endpoint(websocket: WebSocket, user_id: int):
-    await connect_websocket(websocket, user_id)
+    connection = await connect_websocket(websocket, user_id)
     try:
         while True:
             # Получение сообщения через WebSocket
-            message_text = await websocket.receive_text()
-            print(f"Message received from user {user_id}: {message_text}")
+            if connection.codec.binary:
+                payload = await websocket.receive_bytes()
+            else:
+                payload = await websocket.receive_text()
+            logger.debug("Message received from user %s: %r", user_id, payload)
 
-            # Парсим сообщение и отправляем его
+            # Декодируем кадр и отправляем сообщение (или пакет); сессия закрывается после каждого кадра
             try:
-                message_data = json.loads(message_text)
-                await send_message(schemas.MessageCreate(**message_data), db=SessionLocal())
+                message_data = connection.codec.decode(payload)
+                async with AsyncSessionLocal() as db:
+                    if message_data.get("type") == "message_batch":
+                        await send_message_batch(schemas.MessageBatchCreate(**message_data), db=db)
+                    else:
+                        await send_message(schemas.MessageCreate(**message_data), db=db)
             except Exception as e:
-                print("Failed to process WebSocket message:", e)
+                logger.warning("Failed to process WebSocket message from user %s: %s", user_id, e)
     except WebSocketDisconnect:
-        disconnect_websocket(websocket, user_id)
+        pass
+    finally:
+        # В том числе при кадре не того типа (текст вместо бинарного и наоборот)
+        disconnect_websocket(connection)
+
+
+# Голосовой канал звонка: бинарные кадры участника пересылаются остальным как есть
+@app.websocket("/ws/voice/{call_id}")
+async def voice_endpoint(websocket: WebSocket, call_id: str, user_id: int):
+    participant = await voice_relay.join(websocket, call_id, user_id)
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            frame = message.get("bytes")
+            if frame is not None:  # Текстовые кадры (например, пинги клиента) игнорируются
+                voice_relay.relay(participant, frame)
+    finally:
+        voice_relay.leave(participant)
+
+
+# Метрики в текстовом формате Prometheus (по процессу; при нескольких воркерах - с каждого)
+@app.get("/metrics")
+def get_metrics():
+    return Response(metrics.render(), media_type=CONTENT_TYPE)
+
+
+# Звонки, участники и потери кадров голосового канала
+@app.get("/stats/voice")
+def voice_stats():
+    return voice_relay.stats()
+
+
+# Глубина очередей и число отключённых медленных клиентов
+@app.get("/stats/websocket")
+def websocket_stats():
+    return connection_manager.stats()
+
+
+# Размер кэша имён пользователей и счётчики попаданий/промахов
+@app.get("/stats/user_directory")
+def user_directory_stats():
+    return user_directory.stats()
+
+
+@app.get("/stats/friend_graph")
+def friend_graph_stats():
+    return friend_graph.stats()
+
+
+@app.get("/stats/archive")
+def archive_stats(db: Session = Depends(get_read_db)):
+    stats = archive.storage_stats(db)
+    stats["reader"] = message_archive.stats()
+    return stats
 
 
 # Получение списка пользователей
 @app.get("/users/", response_model=List[schemas.UserResponse])
-def search_users(query: Optional[str] = None, db: Session = Depends(get_db)):
-    if query:
-        users = db.query(models.User).filter(models.User.username.contains(query)).all()
-    else:
-        users = db.query(models.User).all()
+def search_users(
+        response: Response,
+        query: Optional[str] = None,
+        limit: int = Query(20, ge=1, le=100, description="Limit the number of users returned"),
+        cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+        db: Session = Depends(get_read_db)
+):
+    users, next_cursor = user_search.search_users(db, query, limit, cursor)
+    # Тело ответа остаётся списком, курсор следующей страницы передаётся в заголовке
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return users
 
 
+# Профили по списку id одним запросом (имена - из кэша, за промахами - один SELECT);
+# порядок ответа совпадает с запросом, несуществующие id пропускаются
+@app.post("/users/lookup", response_model=List[schemas.UserResponse])
+def lookup_users(request: schemas.UserLookupRequest, db: Session = Depends(get_read_db)):
+    return _user_responses(db, list(dict.fromkeys(request.ids)))
+
+
 @app.get("/messages/", response_model=List[schemas.MessageResponse])
 def get_messages(
         user_id: Optional[int] = Query(None, description="User ID for filtering messages"),
         # Устанавливаем user_id как необязательный
-        db: Session = Depends(get_db),
+        db: Session = Depends(get_read_db),
         limit: int = Query(100, description="Limit the number of messages returned"),
         offset: int = Query(0, description="Offset for pagination")
 ):
@@ -231,40 +492,212 @@ def get_messages(
             (models.Message.sender_id == user_id) | (models.Message.receiver_id == user_id)
         )
 
-    messages = query.offset(offset).limit(limit).all()
-
-    # Формируем ответы с именами отправителя и получателя
-    message_responses = []
-    for message in messages:
-        sender = db.query(models.User).filter(models.User.id == message.sender_id).first()
-        receiver = db.query(models.User).filter(models.User.id == message.receiver_id).first()
-
-        message_responses.append(
-            schemas.MessageResponse(
-                id=message.id,
-                sender_id=message.sender_id,
-                receiver_id=message.receiver_id,
-                content=message.content,
-                timestamp=message.timestamp,
-                sender_username=sender.username if sender else "Unknown",
-                receiver_username=receiver.username if receiver else "Unknown"
-            )
+    # Архивные сообщения старше горячих и идут первыми; сегменты читаются,
+    # только если смещение попадает в архивную часть
+    archived = message_archive.count(db, user_id or None)
+    if offset >= archived:
+        messages = query.offset(offset - archived).limit(limit).all()
+    else:
+        messages = message_archive.user_messages(db, user_id or None, offset, limit)
+        if len(messages) < limit:
+            messages += query.limit(limit - len(messages)).all()
+    return _message_responses(db, messages)
+
+
+# Полнотекстовый поиск по переписке пользователя (или только с peer_id): страницы
+# от новых совпадений к старым, внутри страницы - по релевантности
+@app.get("/messages/search", response_model=List[schemas.MessageSearchResponse])
+def search_messages(
+        response: Response,
+        user_id: int,
+        q: str = Query(..., min_length=1, description="Words to search for"),
+        peer_id: Optional[int] = Query(None, description="Restrict search to the conversation with this user"),
+        limit: int = Query(20, ge=1, le=100, description="Limit the number of messages returned"),
+        cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+        db: Session = Depends(get_read_db)
+):
+    rows, next_cursor = message_search.search_messages(db, user_id, q, limit, peer_id, cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    usernames = user_directory.get_usernames(db, [r.sender_id for r in rows] + [r.receiver_id for r in rows])
+    return [
+        schemas.MessageSearchResponse(
+            id=row.id,
+            sender_id=row.sender_id,
+            receiver_id=row.receiver_id,
+            content=row.content,
+            timestamp=row.timestamp,
+            sender_username=usernames.get(row.sender_id, "Unknown"),
+            receiver_username=usernames.get(row.receiver_id, "Unknown"),
+            snippet=row.snippet
         )
+        for row in rows
+    ]
+
+
+# Формируем ответы с именами отправителя и получателя; имена берутся из кэша,
+# промахи догружаются одним запросом на всю страницу
+def _message_responses(db: Session, messages: List[models.Message]) -> List[schemas.MessageResponse]:
+    usernames = user_directory.get_usernames(
+        db, [m.sender_id for m in messages] + [m.receiver_id for m in messages]
+    )
+    attachment_ids = {m.attachment_id for m in messages if m.attachment_id is not None}
+    attachments = {
+        attachment.id: _attachment_data(attachment)
+        for attachment in db.query(models.Attachment).filter(models.Attachment.id.in_(attachment_ids))
+    } if attachment_ids else {}
+    return [
+        schemas.MessageResponse(
+            id=message.id,
+            sender_id=message.sender_id,
+            receiver_id=message.receiver_id,
+            content=message.content,
+            timestamp=message.timestamp,
+            sender_username=usernames.get(message.sender_id, "Unknown"),
+            receiver_username=usernames.get(message.receiver_id, "Unknown"),
+            attachment=attachments.get(message.attachment_id)
+        )
+        for message in messages
+    ]
+
+# Одна сторона переписки (sender -> receiver), ограниченная курсором и лимитом.
+# Каждая ветка обслуживается индексом ix_messages_conversation.
+def _conversation_branch(sender_id: int, receiver_id: int, before_id: Optional[int], after_id: Optional[int],
+                         limit: int, ascending: bool):
+    query = select(models.Message.id).where(
+        models.Message.sender_id == sender_id,
+        models.Message.receiver_id == receiver_id
+    )
+    if before_id is not None:
+        query = query.where(models.Message.id < before_id)
+    if after_id is not None:
+        query = query.where(models.Message.id > after_id)
+    order = models.Message.id.asc() if ascending else models.Message.id.desc()
+    return select(query.order_by(order).limit(limit).subquery().c.id)
+
+
+@app.get("/users/{user_id}/conversations/{peer_id}/messages", response_model=List[schemas.MessageResponse])
+def get_conversation_messages(
+        user_id: int,
+        peer_id: int,
+        before_id: Optional[int] = Query(None, description="Return messages older than this message ID"),
+        after_id: Optional[int] = Query(None, description="Return messages newer than this message ID"),
+        limit: int = Query(50, ge=1, le=500, description="Limit the number of messages returned"),
+        db: Session = Depends(get_read_db)
+):
+    # Без курсора или с before_id отдаём самую свежую страницу, с одним after_id - следующую за курсором
+    ascending = after_id is not None and before_id is None
+    page_ids = union_all(
+        _conversation_branch(user_id, peer_id, before_id, after_id, limit, ascending),
+        _conversation_branch(peer_id, user_id, before_id, after_id, limit, ascending)
+    ).subquery()
+
+    order = models.Message.id.asc() if ascending else models.Message.id.desc()
+    messages = db.query(models.Message).filter(
+        models.Message.id.in_(select(page_ids.c.id))
+    ).order_by(order).limit(limit).all()
+    if not ascending:
+        messages.reverse()
+
+    # Страница уходит за границу архива: недостающее дочитываем из сегментов
+    if ascending:
+        archive_last_id = message_archive.last_id(db)
+        if archive_last_id is not None and after_id < archive_last_id:
+            archived = message_archive.conversation(db, user_id, peer_id, before_id, after_id, limit, ascending)
+            messages = (archived + messages)[:limit]
+    elif len(messages) < limit and message_archive.last_id(db) is not None:
+        oldest_id = messages[0].id if messages else before_id
+        archived = message_archive.conversation(db, user_id, peer_id, oldest_id, after_id, limit - len(messages), ascending)
+        messages = archived[::-1] + messages
+
+    return _message_responses(db, messages)
+
+def _conversation_responses(db: Session, summaries: List[models.ConversationSummary]) -> List[schemas.ConversationResponse]:
+    usernames = user_directory.get_usernames(db, [summary.peer_id for summary in summaries])
+    return [
+        schemas.ConversationResponse(
+            peer_id=summary.peer_id,
+            peer_username=usernames.get(summary.peer_id, "Unknown"),
+            last_message_id=summary.last_message_id,
+            last_sender_id=summary.last_sender_id,
+            last_snippet=summary.last_snippet,
+            last_timestamp=summary.last_timestamp,
+            unread_count=summary.unread_count,
+            last_read_id=summary.last_read_id
+        )
+        for summary in summaries
+    ]
+
+
+# Список диалогов с последним сообщением и числом непрочитанных, от самого свежего.
+# Читается из сводок conversation_summaries одним запросом по индексу.
+@app.get("/users/{user_id}/conversations", response_model=List[schemas.ConversationResponse])
+def get_conversations(
+        response: Response,
+        user_id: int,
+        limit: int = Query(50, ge=1, le=200, description="Limit the number of conversations returned"),
+        cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+        db: Session = Depends(get_read_db)
+):
+    after = decode_cursor(cursor)
+    if after is not None and (len(after) != 1 or not isinstance(after[0], int)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    summaries = conversations.load_conversations(db, user_id, limit + 1, after[0] if after else None)
+    if len(summaries) > limit:
+        summaries = summaries[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor([summaries[-1].last_message_id])
+    return _conversation_responses(db, summaries)
+
+
+# Отметка прочтения переписки до message_id (по умолчанию - до последнего сообщения)
+@app.put("/users/{user_id}/conversations/{peer_id}/read", response_model=schemas.ConversationResponse)
+def mark_conversation_read(
+        user_id: int,
+        peer_id: int,
+        message_id: Optional[int] = Query(None, description="Last read message ID"),
+        db: Session = Depends(get_db)
+):
+    summary = conversations.mark_read(db, user_id, peer_id, message_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return _conversation_responses(db, [summary])[0]
 
-    return message_responses
 
 @app.get("/users/{user_id}/friends/", response_model=List[schemas.UserResponse])
-def get_friends(user_id: int, db: Session = Depends(get_db)):
-    # Получаем всех друзей для заданного user_id
-    friendships = db.query(models.Friendship).filter(
-        (models.Friendship.user_id == user_id) | (models.Friendship.friend_id == user_id)
-    ).all()
+def get_friends(user_id: int, db: Session = Depends(get_read_db)):
+    # Друзья берутся из графа в памяти (с догрузкой новых дружб), имена - из кэша
+    friend_graph.sync(db)
+    return _user_responses(db, friend_graph.friends(user_id))
+
+
+def _user_responses(db: Session, user_ids) -> List[schemas.UserResponse]:
+    usernames = user_directory.get_usernames(db, user_ids)
+    return [
+        schemas.UserResponse(id=user_id, username=usernames[user_id])
+        for user_id in user_ids if user_id in usernames
+    ]
 
-    # Извлекаем ID друзей
-    friend_ids = [f.friend_id if f.user_id == user_id else f.user_id for f in friendships]
-    friends = db.query(models.User).filter(models.User.id.in_(friend_ids)).all()
 
-    return friends
+@app.get("/users/{user_id}/mutual/{other_id}", response_model=List[schemas.UserResponse])
+def get_mutual_friends(user_id: int, other_id: int, db: Session = Depends(get_read_db)):
+    friend_graph.sync(db)
+    return _user_responses(db, friend_graph.mutual(user_id, other_id))
+
+
+# Рекомендации: друзья друзей, упорядоченные по числу общих друзей
+@app.get("/users/{user_id}/suggestions", response_model=List[schemas.FriendSuggestionResponse])
+def get_friend_suggestions(
+        user_id: int,
+        limit: int = Query(10, ge=1, le=100, description="Limit the number of suggestions returned"),
+        db: Session = Depends(get_read_db)
+):
+    friend_graph.sync(db)
+    suggestions = friend_graph.suggestions(user_id, limit)
+    usernames = user_directory.get_usernames(db, [candidate_id for candidate_id, _ in suggestions])
+    return [
+        schemas.FriendSuggestionResponse(id=candidate_id, username=usernames[candidate_id], mutual_friends=count)
+        for candidate_id, count in suggestions if candidate_id in usernames
+    ]
 
 
 @app.get("/friend_requests/{user_id}", response_model=List[schemas.FriendRequestResponse])
@@ -275,19 +708,20 @@ def get_friend_requests(user_id: int, db: Session = Depends(get_db)):
         models.FriendRequest.status == "pending"
     ).all()
 
-    # Добавление имен отправителя и получателя
+    # Добавление имен отправителя и получателя (из кэша, промахи - одним запросом)
+    usernames = user_directory.get_usernames(
+        db, [r.sender_id for r in friend_requests] + [r.receiver_id for r in friend_requests]
+    )
     friend_request_responses = []
     for request in friend_requests:
-        sender = db.query(models.User).filter(models.User.id == request.sender_id).first()
-        receiver = db.query(models.User).filter(models.User.id == request.receiver_id).first()
         friend_request_responses.append(schemas.FriendRequestResponse(
             id=request.id,
             sender_id=request.sender_id,
             receiver_id=request.receiver_id,
             status=request.status,
             timestamp=request.timestamp,
-            sender_username=sender.username if sender else "Unknown",
-            receiver_username=receiver.username if receiver else "Unknown"
+            sender_username=usernames.get(request.sender_id, "Unknown"),
+            receiver_username=usernames.get(request.receiver_id, "Unknown")
         ))
     return friend_request_responses
 
@@ -302,8 +736,11 @@ def respond_to_friend_request(request_id: int, status: str, db: Session = Depend
     if status not in ["accepted", "rejected"]:
         raise HTTPException(status_code=400, detail="Invalid status")
 
-    # Обновление статуса запроса
+    # Обновление статуса запроса (и запись в журнал изменений для обоих участников)
     friend_request.status = status
+    db.execute(insert(models.ChangeLog), change_log.change_rows(
+        change_log.CHANGE_FRIEND_REQUEST, friend_request.id, (friend_request.sender_id, friend_request.receiver_id)
+    ))
     db.commit()
 
     # Если запрос принят, добавляем запись в таблицу Friendship
@@ -318,10 +755,96 @@ def respond_to_friend_request(request_id: int, status: str, db: Session = Depend
             friend_id=friend_request.sender_id
         )
         db.add_all([friendship1, friendship2])
+        db.flush()
+        db.execute(insert(models.ChangeLog), [
+            change
+            for friendship in (friendship1, friendship2)
+            for change in change_log.change_rows(change_log.CHANGE_FRIENDSHIP, friendship.id, (friendship.user_id,))
+        ])
         db.commit()
+        friend_graph.sync(db)
+
+    # Уведомление обоих участников: отправитель узнаёт об ответе,
+    # другие клиенты получателя убирают запрос из интерфейса
+    participants = [friend_request.sender_id, friend_request.receiver_id]
+    usernames = user_directory.get_usernames(db, participants)
+    message_data = {
+        "type": f"request_{status}",
+        "request_id": friend_request.id,
+        "sender_id": friend_request.sender_id,
+        "receiver_id": friend_request.receiver_id,
+        "sender_username": usernames.get(friend_request.sender_id),
+        "receiver_username": usernames.get(friend_request.receiver_id),
+    }
+    # Эндпоинт синхронный и выполняется в пуле потоков - публикация через цикл событий
+    anyio.from_thread.run(broadcast_message_to_users, participants, message_data)
+
+    if status == "accepted":
         return {"message": "Friend request accepted, friendship created"}
 
     # Если запрос отклонен, возвращаем сообщение об успешном отклонении
     return {"message": f"Friend request {status}"}
 
 
+# Изменения для пользователя после курсора: новые сообщения, новые запросы в друзья
+# и смена их статуса, новые друзья. Без курсора возвращается только текущая позиция -
+# клиент загружает полное состояние один раз и дальше опрашивает /sync с курсором.
+@app.get("/sync", response_model=schemas.SyncResponse)
+def sync_changes(
+        user_id: int,
+        cursor: Optional[str] = Query(None, description="Cursor returned by the previous /sync call"),
+        limit: int = Query(500, ge=1, le=5000, description="Maximum number of changes per response"),
+        db: Session = Depends(get_read_db)
+):
+    after = decode_cursor(cursor)
+    if after is None:
+        return schemas.SyncResponse(cursor=encode_cursor([change_log.head(db)]), has_more=False)
+    if len(after) != 1 or not isinstance(after[0], int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    changes = change_log.load_changes(db, user_id, after[0], limit + 1)
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    if not changes:
+        # Ничего не изменилось: одно обращение к индексу журнала
+        return schemas.SyncResponse(cursor=cursor, has_more=False)
+
+    refs = {kind: [] for kind in (change_log.CHANGE_MESSAGE, change_log.CHANGE_FRIEND_REQUEST,
+                                  change_log.CHANGE_FRIENDSHIP)}
+    for change in changes:
+        refs[change.kind].append(change.ref_id)
+
+    messages = db.query(models.Message).filter(
+        models.Message.id.in_(set(refs[change_log.CHANGE_MESSAGE]))
+    ).order_by(models.Message.id).all() if refs[change_log.CHANGE_MESSAGE] else []
+    friend_requests = db.query(models.FriendRequest).filter(
+        models.FriendRequest.id.in_(set(refs[change_log.CHANGE_FRIEND_REQUEST]))
+    ).order_by(models.FriendRequest.id).all() if refs[change_log.CHANGE_FRIEND_REQUEST] else []
+    friendships = db.query(models.Friendship).filter(
+        models.Friendship.id.in_(set(refs[change_log.CHANGE_FRIENDSHIP]))
+    ).all() if refs[change_log.CHANGE_FRIENDSHIP] else []
+    friend_ids = sorted({f.friend_id if f.user_id == user_id else f.user_id for f in friendships})
+
+    usernames = user_directory.get_usernames(
+        db,
+        [r.sender_id for r in friend_requests] + [r.receiver_id for r in friend_requests] + friend_ids
+    )
+    return schemas.SyncResponse(
+        cursor=encode_cursor([changes[-1].id]),
+        has_more=has_more,
+        messages=_message_responses(db, messages),
+        friend_requests=[
+            schemas.FriendRequestResponse(
+                id=request.id,
+                sender_id=request.sender_id,
+                receiver_id=request.receiver_id,
+                status=request.status,
+                timestamp=request.timestamp,
+                sender_username=usernames.get(request.sender_id, "Unknown"),
+                receiver_username=usernames.get(request.receiver_id, "Unknown")
+            )
+            for request in friend_requests
+        ],
+        friends=[schemas.UserResponse(id=friend_id, username=usernames[friend_id])
+                 for friend_id in friend_ids if friend_id in usernames]
+    )
@@ -0,0 +1,68 @@
+# app/message_search.py
+#
+# Полнотекстовый поиск по истории сообщений через индекс messages_fts
+# (см. migrations._create_message_search_index). Поиск ограничен перепиской
+# пользователя. Страницы идут от новых сообщений к старым (курсор - id последнего
+# сообщения страницы), внутри страницы строки упорядочены по bm25.
+#
+# Ранг bm25 зависит от статистики всего индекса и меняется с каждым новым
+# сообщением, поэтому курсор по рангу пропускал или повторял строки между
+# страницами. id не меняется: сообщения, добавленные после первой страницы,
+# не попадают в уже начатый обход, и ни одно совпадение не теряется.
+
+import re
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.pagination import decode_cursor, encode_cursor
+
+SNIPPET_TOKENS = 12
+_WORD = re.compile(r"\w+")
+
+
+def build_match(query: str, user_id: int, peer_id: Optional[int] = None) -> Optional[str]:
+    """Выражение MATCH: все слова запроса в тексте и пользователь среди участников."""
+    words = _WORD.findall(query)
+    if not words:
+        return None
+    phrase = " ".join(f'"{word}"' for word in words)
+    participants = f"u{user_id}" if peer_id is None else f"(u{user_id} AND u{peer_id})"
+    return f"content:({phrase}) AND participants:{participants}"
+
+
+def search_messages(db: Session, user_id: int, query: str, limit: int, peer_id: Optional[int] = None,
+                    cursor: Optional[str] = None) -> Tuple[list, Optional[str]]:
+    """Строки (id, sender_id, receiver_id, content, timestamp, snippet, score) и курсор следующей страницы.
+
+    Страница - следующие limit совпадений по убыванию id, отсортированные по рангу.
+    """
+    match = build_match(query, user_id, peer_id)
+    if match is None:
+        raise HTTPException(status_code=400, detail="Search query must contain at least one word")
+    if db.get_bind().dialect.name != "sqlite":
+        raise HTTPException(status_code=501, detail="Message search requires SQLite FTS5")
+
+    # Колонка participants не влияет на ранг (вес 0)
+    sql = (
+        "SELECT m.id, m.sender_id, m.receiver_id, m.content, m.timestamp,"
+        "       snippet(messages_fts, 0, '[', ']', '…', :snippet_tokens) AS snippet,"
+        "       bm25(messages_fts, 1.0, 0.0) AS score"
+        " FROM messages_fts JOIN messages AS m ON m.id = messages_fts.rowid"
+        " WHERE messages_fts MATCH :match "
+    )
+    params = {"match": match, "snippet_tokens": SNIPPET_TOKENS, "limit": limit}
+    after = decode_cursor(cursor)
+    if after:
+        if len(after) != 1:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        # Ограничение по rowid FTS5 применяет при обходе индекса
+        sql += "AND messages_fts.rowid < :after_id "
+        params["after_id"] = after[0]
+    sql += "ORDER BY messages_fts.rowid DESC LIMIT :limit"
+    rows = db.execute(text(sql), params).all()
+
+    next_cursor = encode_cursor([rows[-1].id]) if len(rows) == limit else None
+    return sorted(rows, key=lambda row: (row.score, -row.id)), next_cursor
@@ -0,0 +1,151 @@
+# app/message_writer.py
+#
+# Групповая запись сообщений: вставки из POST /messages/ и WebSocket собираются
+# в небольшие пачки (по размеру или по времени) и фиксируются одной транзакцией,
+# так что SQLite делает один fsync на пачку, а не на каждое сообщение.
+
+import asyncio
+import os
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import insert
+
+from app import conversations, models
+from app.change_log import CHANGE_MESSAGE, change_rows
+from app.database import SQLITE_PRAGMAS
+
+MAX_BATCH_SIZE = int(os.environ.get("MESSAGE_BATCH_SIZE", "128"))
+MAX_BATCH_DELAY = float(os.environ.get("MESSAGE_BATCH_DELAY", "0.002"))  # секунды
+# Гарантия сохранности на пачку (PRAGMA synchronous): FULL - каждая пачка
+# переживает отключение питания, NORMAL/OFF - быстрее, но последние пачки
+# могут потеряться при сбое ОС. Если не задано, действует DB_SYNCHRONOUS движка.
+# Размер пачки 1 и задержка 0 дают прежнее поведение "одна транзакция на сообщение".
+MESSAGE_SYNCHRONOUS = os.environ.get("MESSAGE_SYNCHRONOUS")
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+
+class MessageWriter:
+    def __init__(self, engine, session_factory, max_batch_size: int = MAX_BATCH_SIZE,
+                 max_batch_delay: float = MAX_BATCH_DELAY, synchronous: Optional[str] = MESSAGE_SYNCHRONOUS):
+        if synchronous is not None:
+            synchronous = synchronous.upper()
+        if synchronous is not None and synchronous not in SYNCHRONOUS_MODES:
+            raise ValueError(f"Unsupported synchronous mode: {synchronous}")
+        # Движок - для подключения, которое держится всю пачку; сессии привязываются к нему
+        self.engine = engine
+        self.session_factory = session_factory
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay
+        self.synchronous = synchronous
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.messages = 0
+
+    def start(self):
+        if self.task is None:
+            self.queue = asyncio.Queue()
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Дожидаемся записи уже принятых сообщений
+        if self.task is not None:
+            await self.queue.join()
+            self.task.cancel()
+            self.task = None
+
+    async def write(self, sender_id: int, receiver_id: int, content: str,
+                    attachment_id: Optional[str] = None) -> Tuple[int, datetime]:
+        """Ставит сообщение в очередь и возвращает (id, timestamp) после фиксации его пачки."""
+        return (await self.write_many([(sender_id, receiver_id, content, attachment_id)]))[0]
+
+    async def write_many(self, messages: List[Tuple[int, int, str, Optional[str]]]) -> List[Tuple[int, datetime]]:
+        """Записывает несколько сообщений (sender_id, receiver_id, content, attachment_id) в одной транзакции."""
+        self.start()
+        timestamp = datetime.utcnow()
+        rows = [
+            {"sender_id": sender_id, "receiver_id": receiver_id, "content": content,
+             "attachment_id": attachment_id, "timestamp": timestamp}
+            for sender_id, receiver_id, content, attachment_id in messages
+        ]
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((rows, future))
+        ids = await future
+        return [(message_id, timestamp) for message_id in ids]
+
+    async def _collect(self) -> List[tuple]:
+        # Элемент очереди (строки, future) не делится между пачками,
+        # поэтому пачка может превысить max_batch_size на размер одного элемента
+        batch = [await self.queue.get()]
+        size = len(batch[0][0])
+        deadline = asyncio.get_running_loop().time() + self.max_batch_delay
+        while size < self.max_batch_size:
+            if not self.queue.empty():
+                item = self.queue.get_nowait()
+            else:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            try:
+                ids = await self._insert([row for rows, _ in batch for row in rows])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                self.batches += 1
+                self.messages += len(ids)
+                position = 0
+                for rows, future in batch:
+                    if not future.done():
+                        future.set_result(ids[position:position + len(rows)])
+                    position += len(rows)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _insert(self, rows: List[dict]) -> List[int]:
+        # PRAGMA synchronous действует на подключение, а сессия после commit возвращает
+        # своё в пул: сессия привязывается к одному подключению, чтобы значение движка
+        # восстанавливалось на нём же - и при ошибке записи тоже
+        async with self.engine.connect() as connection:
+            override = self.synchronous is not None and connection.dialect.name == "sqlite"
+            if override:
+                await connection.exec_driver_sql(f"PRAGMA synchronous={self.synchronous}")
+                await connection.commit()
+            try:
+                async with self.session_factory(bind=connection) as db:
+                    result = await db.execute(
+                        insert(models.Message).returning(models.Message.id, sort_by_parameter_order=True),
+                        rows
+                    )
+                    ids = list(result.scalars())
+                    # Записи журнала изменений для отправителя и получателя - в той же транзакции
+                    changes = [
+                        change
+                        for row, message_id in zip(rows, ids)
+                        for change in change_rows(CHANGE_MESSAGE, message_id, (row["sender_id"], row["receiver_id"]))
+                    ]
+                    await db.execute(insert(models.ChangeLog), changes)
+                    # Сводки для списка диалогов - тоже в той же транзакции
+                    await db.execute(conversations.upsert_statement(connection.dialect.name),
+                                     conversations.summary_rows(rows, ids))
+                    await db.commit()
+            finally:
+                if override:
+                    await connection.rollback()
+                    await connection.exec_driver_sql(f"PRAGMA synchronous={SQLITE_PRAGMAS['synchronous']}")
+                    await connection.commit()
+            return ids
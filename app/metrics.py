@@ -0,0 +1,246 @@
+# app/metrics.py
+#
+# Метрики для GET /metrics в текстовом формате Prometheus (version 0.0.4):
+# счётчики, gauge и гистограммы с метками, без внешних зависимостей.
+#
+# Метрики считаются в каждом процессе отдельно: при нескольких воркерах uvicorn
+# Prometheus должен опрашивать каждый воркер (или суммировать по instance).
+#
+# SQL-запросы считаются через события движка SQLAlchemy и относятся к HTTP-запросу,
+# в рамках которого выполнены (contextvar, выставляемый MetricsMiddleware), так что
+# рост числа запросов к базе на один вызов эндпоинта (N+1) виден по гистограмме.
+
+import contextvars
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()  # Синхронные эндпоинты выполняются в пуле потоков
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, labels: Labels = ()):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Gauge(Metric):
+    """Значение задаётся через set() или вычисляется при опросе функцией function."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, function: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation)
+        self.function = function
+        self._value = 0.0
+
+    def set(self, value: float):
+        self._value = value
+
+    def _samples(self):
+        value = self.function() if self.function is not None else self._value
+        yield f"{self.name} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # метки -> [счётчики по корзинам (не накопительные), сумма]
+        self._series: Dict[Labels, list] = {}
+
+    def observe(self, value: float, labels: Labels = ()):
+        index = 0
+        while value > self.buckets[index]:
+            index += 1
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def _samples(self):
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        names = self.labelnames + ("le",)
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(names, labels + (_format_value(bound),))} {cumulative}"
+            label_text = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{label_text} {_format_value(total)}"
+            yield f"{self.name}_count{label_text} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+
+class RequestStats:
+    """SQL-запросы, выполненные в рамках одного HTTP-запроса."""
+    __slots__ = ("statements", "seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.seconds = 0.0
+
+
+_request_stats: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("request_stats",
+                                                                                         default=None)
+
+
+class ChatMetrics(Registry):
+    def __init__(self):
+        super().__init__()
+        self.request_seconds = self.register(Histogram(
+            "http_request_duration_seconds", "HTTP request latency by route template.",
+            ("method", "route", "status")))
+        self.request_db_statements = self.register(Histogram(
+            "http_request_db_statements", "SQL statements executed per HTTP request.",
+            ("method", "route"), buckets=STATEMENT_BUCKETS))
+        self.request_db_seconds = self.register(Histogram(
+            "http_request_db_seconds", "Time spent in SQL statements per HTTP request.", ("method", "route")))
+        self.db_statements = self.register(Counter(
+            "db_statements_total", "SQL statements executed, including background writers.", ("engine",)))
+        self.db_seconds = self.register(Counter(
+            "db_statement_seconds_total", "Time spent executing SQL statements.", ("engine",)))
+        self.fanout_seconds = self.register(Histogram(
+            "chat_fanout_seconds", "Time to publish one broadcast to the backplane and local socket queues."))
+        self.websocket_send_delay = self.register(Histogram(
+            "chat_websocket_send_delay_seconds", "Time from queueing a frame for a socket to writing it."))
+        self.password_hash_seconds = self.register(Histogram(
+            "chat_password_hash_seconds", "bcrypt hashing time.", ("operation",)))
+
+    def track_websockets(self, connections: Callable[[], Dict[int, list]]):
+        """Gauge по открытым WebSocket-подключениям; connections - словарь user_id -> сокеты."""
+        def sockets_per_user_max():
+            return max((len(sockets) for sockets in list(connections().values())), default=0)
+
+        self.register(Gauge("chat_websocket_connections", "Open chat WebSocket connections.",
+                            lambda: sum(len(sockets) for sockets in list(connections().values()))))
+        self.register(Gauge("chat_websocket_users", "Users with at least one open chat WebSocket.",
+                            lambda: len(connections())))
+        self.register(Gauge("chat_websocket_sockets_per_user_max", "Most chat WebSockets held by one user.",
+                            sockets_per_user_max))
+
+    def instrument_engine(self, engine, name: str):
+        """Считает SQL-запросы синхронного движка (для асинхронного - engine.sync_engine)."""
+        labels = (name,)
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            elapsed = time.perf_counter() - conn.info["query_started"].pop()
+            self.db_statements.inc(1, labels)
+            self.db_seconds.inc(elapsed, labels)
+            stats = _request_stats.get()
+            if stats is not None:
+                stats.statements += 1
+                stats.seconds += elapsed
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: задержка HTTP-запросов по шаблону маршрута и SQL-запросы на запрос."""
+
+    def __init__(self, app, metrics: ChatMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_stats.reset(token)
+            # Шаблон пути (/users/{user_id}/friends/), а не сам путь: число серий ограничено
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            self.metrics.request_seconds.observe(elapsed, (method, route_path, str(status)))
+            self.metrics.request_db_statements.observe(stats.statements, (method, route_path))
+            self.metrics.request_db_seconds.observe(stats.seconds, (method, route_path))
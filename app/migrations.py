@@ -0,0 +1,210 @@
+# app/migrations.py
+#
+# Версионированные миграции схемы. Выполняются один раз до запуска воркеров:
+#   python -m app.migrations
+# (run_api.py делает это сам). Параллельные вызовы безопасны: миграция идёт под
+# блокировкой записи базы, остальные процессы ждут её и видят уже новую версию.
+
+import os
+
+from sqlalchemy import CheckConstraint, Column, Integer, MetaData, Table, inspect, select, text
+
+from app import conversations, models
+from app.database import SQLITE_PRAGMAS, Base
+
+# Сколько процесс ждёт блокировки, пока другой процесс применяет миграции (мс)
+MIGRATION_LOCK_TIMEOUT = int(os.environ.get("MIGRATION_LOCK_TIMEOUT", str(10 * 60 * 1000)))
+# Ключ pg_advisory_xact_lock для PostgreSQL
+_ADVISORY_LOCK_KEY = 0x6d696772
+
+# Отдельная таблица с номером версии схемы (не входит в Base.metadata); ровно одна строка
+_version_metadata = MetaData()
+schema_version = Table(
+    "schema_version", _version_metadata,
+    Column("id", Integer, primary_key=True, autoincrement=False),
+    Column("version", Integer, nullable=False),
+    CheckConstraint("id = 1", name="ck_schema_version_single_row"),
+)
+
+
+def _create_tables(connection):
+    Base.metadata.create_all(bind=connection)
+
+
+def _add_message_indexes(connection):
+    # Для баз, созданных до появления составных индексов в models.Message
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_messages_conversation ON messages (sender_id, receiver_id, id)"
+    ))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_messages_receiver ON messages (receiver_id, id)"
+    ))
+
+
+def _create_user_search_index(connection):
+    # Триграммный FTS5-индекс по именам для поиска по подстроке (только SQLite).
+    # Внешнее содержимое - таблица users, синхронизация триггерами.
+    if connection.dialect.name != "sqlite":
+        return
+    connection.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5("
+        "username, content='users', content_rowid='id', tokenize='trigram')"
+    ))
+    connection.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN "
+        "INSERT INTO users_fts(rowid, username) VALUES (new.id, new.username); END"
+    ))
+    connection.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN "
+        "INSERT INTO users_fts(users_fts, rowid, username) VALUES ('delete', old.id, old.username); END"
+    ))
+    connection.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE OF username ON users BEGIN "
+        "INSERT INTO users_fts(users_fts, rowid, username) VALUES ('delete', old.id, old.username); "
+        "INSERT INTO users_fts(rowid, username) VALUES (new.id, new.username); END"
+    ))
+    connection.execute(text("INSERT INTO users_fts(users_fts) VALUES ('rebuild')"))
+
+
+def _create_message_search_index(connection):
+    # Полнотекстовый индекс по сообщениям (только SQLite). Колонка participants
+    # содержит токены "u<sender_id> u<receiver_id>", так что ограничение поиска
+    # перепиской пользователя выполняется самим FTS5, а не фильтром после MATCH.
+    if connection.dialect.name != "sqlite":
+        return
+    connection.execute(text(
+        "CREATE VIEW IF NOT EXISTS messages_fts_source AS "
+        "SELECT id, content, 'u' || sender_id || ' u' || receiver_id AS participants FROM messages"
+    ))
+    connection.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+        "content, participants, content='messages_fts_source', content_rowid='id')"
+    ))
+    connection.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN "
+        "INSERT INTO messages_fts(rowid, content, participants) "
+        "VALUES (new.id, new.content, 'u' || new.sender_id || ' u' || new.receiver_id); END"
+    ))
+    connection.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN "
+        "INSERT INTO messages_fts(messages_fts, rowid, content, participants) "
+        "VALUES ('delete', old.id, old.content, 'u' || old.sender_id || ' u' || old.receiver_id); END"
+    ))
+    connection.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE ON messages BEGIN "
+        "INSERT INTO messages_fts(messages_fts, rowid, content, participants) "
+        "VALUES ('delete', old.id, old.content, 'u' || old.sender_id || ' u' || old.receiver_id); "
+        "INSERT INTO messages_fts(rowid, content, participants) "
+        "VALUES (new.id, new.content, 'u' || new.sender_id || ' u' || new.receiver_id); END"
+    ))
+    connection.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')"))
+
+
+def _create_change_log(connection):
+    models.ChangeLog.__table__.create(bind=connection, checkfirst=True)
+
+
+def _create_archive_tables(connection):
+    models.ArchiveSegment.__table__.create(bind=connection, checkfirst=True)
+    models.ArchiveSegmentUser.__table__.create(bind=connection, checkfirst=True)
+
+
+def _create_attachments(connection):
+    models.Attachment.__table__.create(bind=connection, checkfirst=True)
+    columns = {column["name"] for column in inspect(connection).get_columns("messages")}
+    if "attachment_id" not in columns:
+        connection.execute(text(
+            "ALTER TABLE messages ADD COLUMN attachment_id VARCHAR REFERENCES attachments (id)"
+        ))
+
+
+def _create_conversation_summaries(connection):
+    # Сводки для уже существующих переписок: последнее сообщение каждой стороны,
+    # вся прежняя история считается прочитанной
+    models.ConversationSummary.__table__.create(bind=connection, checkfirst=True)
+    connection.execute(text(
+        "INSERT INTO conversation_summaries (user_id, peer_id, last_message_id, last_sender_id, "
+        "last_snippet, last_timestamp, unread_count, last_read_id) "
+        "SELECT sides.user_id, sides.peer_id, m.id, m.sender_id, substr(m.content, 1, :length), m.timestamp, 0, m.id "
+        "FROM (SELECT user_id, peer_id, MAX(id) AS id FROM ("
+        "SELECT sender_id AS user_id, receiver_id AS peer_id, id FROM messages "
+        "UNION ALL SELECT receiver_id, sender_id, id FROM messages"
+        ") GROUP BY user_id, peer_id) AS sides JOIN messages m ON m.id = sides.id"
+    ), {"length": conversations.SNIPPET_LENGTH})
+
+
+def _add_username_lower_index(connection):
+    # Индекс по выражению lower(username) для поиска по префиксу без учёта регистра
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_users_username_lower ON users (lower(username), username)"
+    ))
+
+
+# Шаги миграции применяются по порядку; номер версии = индекс шага + 1.
+# Новые шаги добавляются только в конец списка.
+MIGRATIONS = [
+    _create_tables,
+    _add_message_indexes,
+    _create_user_search_index,
+    _create_message_search_index,
+    _create_change_log,
+    _create_archive_tables,
+    _create_attachments,
+    _create_conversation_summaries,
+    _add_username_lower_index,
+]
+
+
+def _lock(connection):
+    """Блокировка записи на время миграции, до чтения schema_version."""
+    if connection.dialect.name == "sqlite":
+        # pysqlite не открывает транзакцию перед DDL - начинаем её явно
+        connection.exec_driver_sql(f"PRAGMA busy_timeout={MIGRATION_LOCK_TIMEOUT}")
+        connection.exec_driver_sql("BEGIN EXCLUSIVE")
+    elif connection.dialect.name == "postgresql":
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _ADVISORY_LOCK_KEY})
+
+
+def _current_version(connection) -> int:
+    inspector = inspect(connection)
+    if inspector.has_table("schema_version") and \
+            "id" not in {column["name"] for column in inspector.get_columns("schema_version")}:
+        # Таблица прежнего формата без ключа (после параллельных запусков - с повторами строк)
+        current = connection.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+        connection.execute(text("DROP TABLE schema_version"))
+        _version_metadata.create_all(bind=connection)
+        connection.execute(schema_version.insert().values(id=1, version=current))
+        return current
+
+    _version_metadata.create_all(bind=connection)
+    current = connection.execute(select(schema_version.c.version).where(schema_version.c.id == 1)).scalar()
+    if current is None:
+        connection.execute(schema_version.insert().values(id=1, version=0))
+        current = 0
+    return current
+
+
+def run_migrations(engine):
+    """Приводит схему базы к последней версии, применяя недостающие шаги."""
+    with engine.connect() as connection:
+        try:
+            with connection.begin():
+                _lock(connection)
+                current = _current_version(connection)
+                for step in MIGRATIONS[current:]:
+                    step(connection)
+                if current < len(MIGRATIONS):
+                    connection.execute(
+                        schema_version.update().where(schema_version.c.id == 1).values(version=len(MIGRATIONS))
+                    )
+        finally:
+            if connection.dialect.name == "sqlite":
+                # Подключение вернётся в пул движка: восстанавливаем обычное ожидание блокировок
+                connection.exec_driver_sql(f"PRAGMA busy_timeout={SQLITE_PRAGMAS['busy_timeout']}")
+
+
+if __name__ == "__main__":
+    from app.database import engine
+
+    run_migrations(engine)
+    print(f"Schema is at version {len(MIGRATIONS)}")
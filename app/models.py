@@ -1,6 +1,6 @@
 # app/models.py
 
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, UniqueConstraint
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, UniqueConstraint, Index, func
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -16,6 +16,11 @@ class User(Base):
     sent_messages = relationship("Message", foreign_keys="Message.sender_id", back_populates="sender")
     received_messages = relationship("Message", foreign_keys="Message.receiver_id", back_populates="receiver")
 
+    # Поиск по префиксу без учёта регистра (app/user_search.py)
+    __table_args__ = (
+        Index("ix_users_username_lower", func.lower(username), username),
+    )
+
 
 class Message(Base):
     __tablename__ = "messages"
@@ -25,11 +30,30 @@ class Message(Base):
     receiver_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     content = Column(String, nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Вложение (например, голосовое сообщение) хранится в app/blob_store.py, здесь только ссылка
+    attachment_id = Column(String, ForeignKey("attachments.id"), nullable=True)
 
     # Связи с пользователем
     sender = relationship("User", foreign_keys=[sender_id], back_populates="sent_messages")
     receiver = relationship("User", foreign_keys=[receiver_id], back_populates="received_messages")
 
+    # Составные индексы для keyset-пагинации по переписке и по входящим
+    __table_args__ = (
+        Index("ix_messages_conversation", "sender_id", "receiver_id", "id"),
+        Index("ix_messages_receiver", "receiver_id", "id"),
+    )
+
+
+class Attachment(Base):
+    """Метаданные файла в хранилище вложений; id - SHA-256 содержимого."""
+    __tablename__ = "attachments"
+
+    id = Column(String, primary_key=True)
+    content_type = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+    uploader_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
 
 class Friendship(Base):
     __tablename__ = "friendships"
@@ -54,4 +78,75 @@ class FriendRequest(Base):
     timestamp = Column(DateTime, default=datetime.utcnow)
 
     sender = relationship("User", foreign_keys=[sender_id])
-    receiver = relationship("User", foreign_keys=[receiver_id])
\ No newline at end of file
+    receiver = relationship("User", foreign_keys=[receiver_id])
+
+class ChangeLog(Base):
+    """Журнал изменений для GET /sync: одна строка на затронутого пользователя.
+
+    id монотонно растёт (AUTOINCREMENT не переиспользует номера), поэтому служит курсором.
+    """
+    __tablename__ = "change_log"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    kind = Column(String, nullable=False)  # "message", "friend_request", "friendship"
+    ref_id = Column(Integer, nullable=False)  # id строки в messages / friend_requests / friendships
+
+    __table_args__ = (
+        Index("ix_change_log_user", "user_id", "id"),
+        {"sqlite_autoincrement": True},
+    )
+
+
+class ConversationSummary(Base):
+    """Сводка переписки для списка диалогов: по строке на каждую сторону (user_id, peer_id).
+
+    Обновляется в той же транзакции, что и вставка сообщений (app/conversations.py),
+    поэтому список диалогов не читает таблицу messages.
+    """
+    __tablename__ = "conversation_summaries"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    peer_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    last_message_id = Column(Integer, nullable=False)
+    last_sender_id = Column(Integer, nullable=False)
+    last_snippet = Column(String, nullable=False)  # начало текста последнего сообщения
+    last_timestamp = Column(DateTime, nullable=False)
+    unread_count = Column(Integer, nullable=False, default=0)  # входящие после last_read_id
+    last_read_id = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_conversation_summaries_user", "user_id", "last_message_id"),
+    )
+
+
+class ArchiveSegment(Base):
+    """Неизменяемый файл холодного архива с сообщениями id в [first_id, last_id] за один период.
+
+    Сами сообщения удаляются из messages в той же транзакции, в которой регистрируется сегмент.
+    """
+    __tablename__ = "archive_segments"
+
+    id = Column(Integer, primary_key=True)
+    period = Column(String, nullable=False)  # "YYYY-MM"
+    path = Column(String, nullable=False, unique=True)  # относительно каталога архива
+    first_id = Column(Integer, nullable=False, index=True)
+    last_id = Column(Integer, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    size_bytes = Column(Integer, nullable=False)  # размер файла
+    raw_bytes = Column(Integer, nullable=False)  # размер данных до сжатия
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class ArchiveSegmentUser(Base):
+    """Число сообщений пользователя (как отправителя или получателя) в сегменте архива:
+    позволяет не открывать сегменты без нужных пользователей и считать смещения."""
+    __tablename__ = "archive_segment_users"
+
+    segment_id = Column(Integer, ForeignKey("archive_segments.id"), primary_key=True)
+    user_id = Column(Integer, primary_key=True)
+    message_count = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_archive_segment_users_user", "user_id", "segment_id"),
+    )
@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 # Схемы для пользователей
 class UserCreate(BaseModel):
@@ -14,15 +14,34 @@ class UserResponse(BaseModel):
     class Config:
         from_attributes = True
 
+# Запрос профилей по списку id для POST /users/lookup
+class UserLookupRequest(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=1000)
+
 class UserLogin(BaseModel):
     username: str
     password: str
 
+# Вложение сообщения: в сообщениях и WebSocket-кадрах передаются только метаданные,
+# сам файл скачивается через GET /attachments/{id}
+class AttachmentResponse(BaseModel):
+    id: str
+    content_type: str
+    size: int
+
+    class Config:
+        from_attributes = True
+
 # Схемы для сообщений
 class MessageCreate(BaseModel):
     sender_id: int
     receiver_id: int
     content: str
+    attachment_id: Optional[str] = None  # id из ответа POST /attachments/
+
+# Пакет сообщений для POST /messages/batch и WebSocket-кадра "message_batch"
+class MessageBatchCreate(BaseModel):
+    messages: List[MessageCreate] = Field(..., min_length=1, max_length=5000)
 
 class MessageResponse(BaseModel):
     id: int
@@ -32,10 +51,15 @@ class MessageResponse(BaseModel):
     timestamp: datetime
     sender_username: Optional[str]
     receiver_username: Optional[str]
+    attachment: Optional[AttachmentResponse] = None
 
     class Config:
         from_attributes = True
 
+# Результат поиска по сообщениям: сообщение и фрагмент с подсвеченными совпадениями
+class MessageSearchResponse(MessageResponse):
+    snippet: str
+
 # Новые схемы для работы с друзьями и запросами на дружбу
 
 # Схема для создания дружбы
@@ -53,6 +77,12 @@ class FriendshipResponse(BaseModel):
     class Config:
         from_attributes = True
 
+# Схема для рекомендации друга (друг друзей) с числом общих друзей
+class FriendSuggestionResponse(BaseModel):
+    id: int
+    username: str
+    mutual_friends: int
+
 # Схема для создания запроса на добавление в друзья
 class FriendRequestCreate(BaseModel):
     sender_id: int
@@ -69,4 +99,23 @@ class FriendRequestResponse(BaseModel):
     receiver_username: Optional[str]
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# Элемент списка диалогов GET /users/{id}/conversations
+class ConversationResponse(BaseModel):
+    peer_id: int
+    peer_username: Optional[str]
+    last_message_id: int
+    last_sender_id: int
+    last_snippet: str
+    last_timestamp: datetime
+    unread_count: int
+    last_read_id: int
+
+# Ответ GET /sync: изменения после курсора и новый курсор
+class SyncResponse(BaseModel):
+    cursor: str
+    has_more: bool
+    messages: List[MessageResponse] = []
+    friend_requests: List[FriendRequestResponse] = []  # новые и со сменившимся статусом
+    friends: List[UserResponse] = []  # новые друзья
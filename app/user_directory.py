@@ -0,0 +1,90 @@
+# app/user_directory.py
+#
+# Кэш id -> username в памяти процесса. Имена пользователей почти не меняются,
+# поэтому горячие пути (отправка сообщений, история, запросы в друзья) берут
+# их отсюда, а в таблицу users ходят одним запросом только за промахами.
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app import models
+
+USER_DIRECTORY_SIZE = int(os.environ.get("USER_DIRECTORY_SIZE", "100000"))
+
+
+class UserDirectory:
+    """Ограниченный LRU-кэш имён пользователей со счётчиками попаданий и промахов."""
+
+    def __init__(self, max_size: int = USER_DIRECTORY_SIZE):
+        self.max_size = max_size
+        self._usernames: "OrderedDict[int, str]" = OrderedDict()
+        # Синхронные эндпоинты выполняются в пуле потоков
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int) -> Optional[str]:
+        with self._lock:
+            username = self._usernames.get(user_id)
+            if username is None:
+                self.misses += 1
+                return None
+            self._usernames.move_to_end(user_id)
+            self.hits += 1
+            return username
+
+    def put(self, user_id: int, username: str):
+        with self._lock:
+            self._usernames[user_id] = username
+            self._usernames.move_to_end(user_id)
+            while len(self._usernames) > self.max_size:
+                self._usernames.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._usernames.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._usernames.clear()
+
+    def _split(self, user_ids: Iterable[int]):
+        found: Dict[int, str] = {}
+        missing = []
+        for user_id in set(user_ids):
+            username = self.get(user_id)
+            if username is None:
+                missing.append(user_id)
+            else:
+                found[user_id] = username
+        return found, missing
+
+    def _store(self, found: Dict[int, str], rows):
+        for user_id, username in rows:
+            self.put(user_id, username)
+            found[user_id] = username
+        return found
+
+    def get_usernames(self, db: Session, user_ids: Iterable[int]) -> Dict[int, str]:
+        """Имена для набора id; отсутствующие в базе id не попадают в результат."""
+        found, missing = self._split(user_ids)
+        if missing:
+            rows = db.execute(select(models.User.id, models.User.username).where(models.User.id.in_(missing)))
+            self._store(found, rows)
+        return found
+
+    async def get_usernames_async(self, db: AsyncSession, user_ids: Iterable[int]) -> Dict[int, str]:
+        found, missing = self._split(user_ids)
+        if missing:
+            rows = await db.execute(select(models.User.id, models.User.username).where(models.User.id.in_(missing)))
+            self._store(found, rows)
+        return found
+
+    def stats(self) -> dict:
+        return {"size": len(self._usernames), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,132 @@
+# app/user_search.py
+#
+# Поиск пользователей по имени с лимитом и курсором.
+#   - без запроса: все пользователи по id;
+#   - 1-2 символа: поиск по префиксу без учёта регистра через индекс
+#     ix_users_username_lower (lower(username), username);
+#   - от 3 символов: сначала совпадения с начала имени (тот же индекс
+#     ix_users_username_lower), затем остальные совпадения по подстроке через
+#     триграммный индекс users_fts в порядке id (на базах без FTS5 - LIKE по подстроке).
+# Курсор непрозрачный (см. app/pagination.py).
+
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import String, func, literal, select, text, tuple_
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.pagination import decode_cursor, encode_cursor
+
+TRIGRAM = 3
+# Сколько совпадений триграммного индекса просматривается на страницу поиска по подстроке
+SUBSTRING_CANDIDATES = 1000
+# Максимальный символ Unicode: верхняя граница диапазона для поиска по префиксу
+_PREFIX_END = "\U0010ffff"
+
+
+def _list_users(db: Session, limit: int, after: Optional[list]):
+    query = select(models.User.id, models.User.username).order_by(models.User.id).limit(limit)
+    if after:
+        query = query.where(models.User.id > after[0])
+    rows = db.execute(query).all()
+    return rows, ([rows[-1].id] if len(rows) == limit else None)
+
+
+def _prefix_rows(db: Session, prefix: str, limit: int, after: Optional[list]):
+    # Регистр приводится функцией базы с обеих сторон, как в индексе: так же без учёта
+    # регистра ищет и триграммный индекс для запросов от 3 символов
+    username_lower = func.lower(models.User.username)
+    prefix_lower = func.lower(literal(prefix, String))
+    query = select(models.User.id, models.User.username, username_lower.label("username_lower")).where(
+        username_lower >= prefix_lower,
+        username_lower < prefix_lower + _PREFIX_END
+    ).order_by(username_lower, models.User.username).limit(limit)
+    if after:
+        query = query.where(tuple_(username_lower, models.User.username) > tuple_(after[0], after[1]))
+    return db.execute(query).all()
+
+
+def _prefix_search(db: Session, prefix: str, limit: int, after: Optional[list]):
+    rows = _prefix_rows(db, prefix, limit, after)
+    return rows, ([rows[-1].username_lower, rows[-1].username] if len(rows) == limit else None)
+
+
+def _like_search(db: Session, term: str, limit: int, after: Optional[list]):
+    # Запасной вариант для баз без FTS5: LIKE '%term%' с курсором по id
+    query = select(models.User.id, models.User.username).where(
+        models.User.username.contains(term, autoescape=True)
+    ).order_by(models.User.id).limit(limit)
+    if after:
+        query = query.where(models.User.id > after[0])
+    rows = db.execute(query).all()
+    return rows, ([rows[-1].id] if len(rows) == limit else None)
+
+
+def _contains_rows(db: Session, term: str, limit: int, after_id: int):
+    """Совпадения по подстроке не с начала имени, по возрастанию id, после after_id.
+
+    Просматривается не больше SUBSTRING_CANDIDATES строк индекса users_fts: возвращает
+    (строки, id последней просмотренной строки или None, если совпадения закончились).
+    """
+    sql = (
+        "SELECT u.id, u.username, candidates.rowid AS candidate_id,"
+        "       substr(lower(u.username), 1, length(:term)) = lower(:term) AS is_prefix"
+        " FROM (SELECT rowid FROM users_fts WHERE users_fts MATCH :match AND rowid > :after_id"
+        "       ORDER BY rowid LIMIT :candidates) AS candidates"
+        " JOIN users AS u ON u.id = candidates.rowid"
+        " ORDER BY candidates.rowid"
+    )
+    params = {"term": term, "match": '"' + term.replace('"', '""') + '"', "after_id": after_id,
+              "candidates": SUBSTRING_CANDIDATES}
+    candidates = db.execute(text(sql), params).all()
+    rows = []
+    for row in candidates:
+        # Совпадения с начала имени уже выданы из ix_users_username_lower (lower() базы, как там)
+        if not row.is_prefix:
+            rows.append(row)
+            if len(rows) == limit:
+                return rows, row.id
+    last_id = candidates[-1].candidate_id if len(candidates) == SUBSTRING_CANDIDATES else None
+    return rows, last_id
+
+
+def _substring_search(db: Session, term: str, limit: int, after: Optional[list]):
+    # Сначала совпадения с начала имени по индексу ix_users_username_lower, затем
+    # остальные по триграммному индексу в порядке id. Ни на одном шаге не сортируется
+    # всё множество совпадений: работа на страницу ограничена limit и SUBSTRING_CANDIDATES.
+    # Курсор: [0, lower(username), username] или [1, id].
+    rows = []
+    if not after or after[0] == 0:
+        rows = _prefix_rows(db, term, limit, after[1:] if after else None)
+        if len(rows) == limit:
+            return rows, [0, rows[-1].username_lower, rows[-1].username]
+        after = [1, 0]
+    contains, last_id = _contains_rows(db, term, limit - len(rows), after[1])
+    rows = list(rows) + contains
+    return rows, ([1, last_id] if last_id is not None else None)
+
+
+def search_users(db: Session, query: Optional[str], limit: int,
+                 cursor: Optional[str] = None) -> Tuple[List[schemas.UserResponse], Optional[str]]:
+    """Возвращает страницу пользователей и курсор следующей страницы (None, если это последняя).
+
+    При поиске по подстроке страница может оказаться короче limit, хотя курсор есть.
+    """
+    after = decode_cursor(cursor)
+    query = (query or "").strip()
+    try:
+        if not query:
+            rows, next_key = _list_users(db, limit, after)
+        elif len(query) < TRIGRAM:
+            rows, next_key = _prefix_search(db, query, limit, after)
+        elif db.get_bind().dialect.name != "sqlite":
+            rows, next_key = _like_search(db, query, limit, after)
+        else:
+            rows, next_key = _substring_search(db, query, limit, after)
+    except IndexError:
+        # Курсор от другого запроса
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    next_cursor = encode_cursor(next_key) if next_key is not None else None
+    return [schemas.UserResponse(id=row.id, username=row.username) for row in rows], next_cursor
@@ -0,0 +1,158 @@
+# app/voice.py
+#
+# Ретрансляция голоса: участники звонка /ws/voice/{call_id} шлют бинарные кадры
+# (например, 20 мс Opus или PCM), сервер пересылает их остальным участникам без
+# перекодирования и без копирования - в буферы получателей кладётся тот же объект bytes.
+#
+# Кадр: заголовок VOICE_HEADER (user_id отправителя, номер кадра, метка времени
+# отправителя в мс, все uint32 big-endian) + аудиоданные. Сервер только читает
+# заголовок: user_id должен совпадать с участником, номер кадра отсекает повторы
+# и опоздавшие кадры.
+#
+# У каждого участника свой буфер (джиттер-буфер) и задача-писатель. Буфер ограничен
+# VOICE_BUFFER_FRAMES кадрами: при переполнении вытесняются самые старые, а кадры,
+# пролежавшие дольше VOICE_MAX_FRAME_AGE_MS, при отправке отбрасываются - медленный
+# получатель теряет устаревший звук, но не копит задержку.
+#
+# Звонок обслуживается в пределах одного воркера: при нескольких воркерах
+# балансировщик должен направлять всех участников call_id на один воркер.
+
+import asyncio
+import os
+import struct
+import time
+from collections import deque
+from typing import Deque, Dict, Tuple
+
+from fastapi import WebSocket
+
+VOICE_HEADER = struct.Struct(">III")
+VOICE_BUFFER_FRAMES = int(os.environ.get("VOICE_BUFFER_FRAMES", "10"))  # 200 мс по 20 мс
+VOICE_MAX_FRAME_AGE_MS = int(os.environ.get("VOICE_MAX_FRAME_AGE_MS", "200"))
+# Максимальный размер кадра: защита от произвольных бинарных данных
+VOICE_MAX_FRAME_BYTES = int(os.environ.get("VOICE_MAX_FRAME_BYTES", "4096"))
+
+
+class VoiceParticipant:
+    """Участник звонка: буфер исходящих кадров и задача-писатель."""
+
+    def __init__(self, websocket: WebSocket, call_id: str, user_id: int, max_frames: int):
+        self.websocket = websocket
+        self.call_id = call_id
+        self.user_id = user_id
+        self.max_frames = max_frames
+        # (время поступления, кадр); кадры разных отправителей в порядке поступления
+        self.buffer: Deque[Tuple[float, bytes]] = deque()
+        self.ready = asyncio.Event()
+        self.last_seq: Dict[int, int] = {}  # Последний принятый номер кадра каждого отправителя
+        self.writer_task = None
+
+
+class VoiceRelay:
+    def __init__(self, max_frames: int = VOICE_BUFFER_FRAMES, max_frame_age_ms: int = VOICE_MAX_FRAME_AGE_MS):
+        self.max_frames = max_frames
+        self.max_frame_age = max_frame_age_ms / 1000
+        self.calls: Dict[str, Dict[int, VoiceParticipant]] = {}
+        self.frames_in = 0
+        self.frames_out = 0
+        self.dropped_invalid = 0
+        self.dropped_late = 0
+        self.dropped_overflow = 0
+        self.dropped_stale = 0
+        self._close_tasks = set()
+
+    async def join(self, websocket: WebSocket, call_id: str, user_id: int) -> VoiceParticipant:
+        await websocket.accept()
+        participants = self.calls.setdefault(call_id, {})
+        previous = participants.get(user_id)
+        if previous is not None:  # Повторное подключение того же пользователя вытесняет старое
+            self.leave(previous)
+            task = asyncio.create_task(self._close(previous.websocket))
+            self._close_tasks.add(task)
+            task.add_done_callback(self._close_tasks.discard)
+            participants = self.calls.setdefault(call_id, {})
+        # Новое подключение нумерует кадры заново: прежние номера не должны отсекать его кадры
+        self._forget_sender(call_id, user_id)
+        participant = VoiceParticipant(websocket, call_id, user_id, self.max_frames)
+        participant.writer_task = asyncio.create_task(self._writer(participant))
+        participants[user_id] = participant
+        return participant
+
+    def leave(self, participant: VoiceParticipant):
+        participants = self.calls.get(participant.call_id)
+        if participants and participants.get(participant.user_id) is participant:
+            del participants[participant.user_id]
+            if not participants:
+                del self.calls[participant.call_id]
+            self._forget_sender(participant.call_id, participant.user_id)
+        if participant.writer_task and participant.writer_task is not asyncio.current_task():
+            participant.writer_task.cancel()
+
+    def _forget_sender(self, call_id: str, user_id: int):
+        for participant in self.calls.get(call_id, {}).values():
+            participant.last_seq.pop(user_id, None)
+
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        try:
+            await websocket.close(code=1008)
+        except Exception:
+            pass
+
+    def relay(self, sender: VoiceParticipant, frame: bytes):
+        """Раздаёт кадр остальным участникам звонка; сам кадр не копируется."""
+        self.frames_in += 1
+        if not VOICE_HEADER.size <= len(frame) <= VOICE_MAX_FRAME_BYTES:
+            self.dropped_invalid += 1
+            return
+        user_id, seq, _ = VOICE_HEADER.unpack_from(frame)
+        if user_id != sender.user_id:
+            self.dropped_invalid += 1
+            return
+
+        now = time.monotonic()
+        for participant in self.calls.get(sender.call_id, {}).values():
+            if participant is sender:
+                continue
+            # Повтор или кадр, опоздавший относительно уже переданных: играть его поздно
+            last_seq = participant.last_seq.get(user_id)
+            if last_seq is not None and seq <= last_seq:
+                self.dropped_late += 1
+                continue
+            participant.last_seq[user_id] = seq
+            if len(participant.buffer) >= participant.max_frames:
+                participant.buffer.popleft()
+                self.dropped_overflow += 1
+            participant.buffer.append((now, frame))
+            participant.ready.set()
+
+    async def _writer(self, participant: VoiceParticipant):
+        buffer = participant.buffer
+        try:
+            while True:
+                await participant.ready.wait()
+                participant.ready.clear()
+                while buffer:
+                    received_at, frame = buffer.popleft()
+                    if time.monotonic() - received_at > self.max_frame_age:
+                        self.dropped_stale += 1
+                        continue
+                    await participant.websocket.send_bytes(frame)
+                    self.frames_out += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # Сокет закрыт: участник будет удалён обработчиком подключения
+            pass
+
+    def stats(self) -> dict:
+        return {
+            "calls": len(self.calls),
+            "participants": sum(len(participants) for participants in self.calls.values()),
+            "frames_in": self.frames_in,
+            "frames_out": self.frames_out,
+            "dropped_invalid": self.dropped_invalid,
+            "dropped_late": self.dropped_late,
+            "dropped_overflow": self.dropped_overflow,
+            "dropped_stale": self.dropped_stale,
+        }
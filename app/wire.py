@@ -0,0 +1,111 @@
+# app/wire.py
+#
+# Форматы кадров WebSocket-чата, выбираемые через подпротокол (Sec-WebSocket-Protocol):
+#   - без подпротокола: JSON с полными ключами (прежний формат);
+#   - "chat.compact-json": JSON с короткими ключами;
+#   - "chat.msgpack": MessagePack с короткими ключами, бинарные кадры.
+# JSON кодируется через orjson, если он установлен, MessagePack требует пакет msgpack.
+
+import json
+from typing import Dict, Iterable, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson необязателен
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack необязателен
+    msgpack = None
+
+# Короткие ключи для компактных форматов; неизвестные ключи передаются как есть
+SHORT_KEYS = {
+    "type": "T",
+    "id": "i",
+    "sender_id": "s",
+    "receiver_id": "r",
+    "content": "c",
+    "timestamp": "t",
+    "sender_username": "su",
+    "receiver_username": "ru",
+    "message": "m",
+    "messages": "ms",
+    "request_id": "q",
+    "attachment": "a",
+}
+LONG_KEYS = {short: long for long, short in SHORT_KEYS.items()}
+
+
+def _shorten(data: dict) -> dict:
+    short = {SHORT_KEYS.get(key, key): value for key, value in data.items()}
+    if "messages" in data:  # Кадр "message_batch" - список сообщений
+        short["ms"] = [_shorten(message) for message in data["messages"]]
+    return short
+
+
+def _expand(data: dict) -> dict:
+    expanded = {LONG_KEYS.get(key, key): value for key, value in data.items()}
+    if "ms" in data:
+        expanded["messages"] = [_expand(message) for message in data["ms"]]
+    return expanded
+
+
+def dumps_json(data: dict) -> str:
+    if orjson is not None:
+        return orjson.dumps(data).decode()
+    return json.dumps(data, separators=(",", ":"))
+
+
+def loads_json(payload: Union[str, bytes]) -> dict:
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+class Codec:
+    subprotocol: Optional[str] = None
+    binary = False
+
+    def encode(self, data: dict) -> Union[str, bytes]:
+        # Прежний формат: совместим с клиентами, не указавшими подпротокол
+        return dumps_json(data)
+
+    def decode(self, payload: Union[str, bytes]) -> dict:
+        return loads_json(payload)
+
+
+class CompactJsonCodec(Codec):
+    subprotocol = "chat.compact-json"
+
+    def encode(self, data: dict) -> str:
+        return dumps_json(_shorten(data))
+
+    def decode(self, payload: Union[str, bytes]) -> dict:
+        return _expand(loads_json(payload))
+
+
+class MsgpackCodec(Codec):
+    subprotocol = "chat.msgpack"
+    binary = True
+
+    def encode(self, data: dict) -> bytes:
+        return msgpack.packb(_shorten(data))
+
+    def decode(self, payload: Union[str, bytes]) -> dict:
+        return _expand(msgpack.unpackb(payload))
+
+
+DEFAULT_CODEC = Codec()
+# Подпротоколы, которые умеет сервер
+CODECS: Dict[str, Codec] = {CompactJsonCodec.subprotocol: CompactJsonCodec()}
+if msgpack is not None:
+    CODECS[MsgpackCodec.subprotocol] = MsgpackCodec()
+
+
+def negotiate(offered: Iterable[str]) -> Codec:
+    """Первый из предложенных клиентом подпротоколов, который поддерживает сервер."""
+    for subprotocol in offered:
+        if subprotocol in CODECS:
+            return CODECS[subprotocol]
+    return DEFAULT_CODEC
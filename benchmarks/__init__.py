@@ -0,0 +1 @@
+# Бенчмарки API. Запуск: python -m benchmarks.<имя_модуля>
@@ -0,0 +1,152 @@
+# benchmarks/chat_view.py
+#
+# Открытие длинной переписки в GUI: время заполнения, первой отрисовки и прирост
+# RSS для модели с делегатом (gui/message_view.py) и для прежнего QListWidget
+# с отдельным виджетом на каждое сообщение. Каждый вариант - в своём процессе,
+# Qt работает без экрана (QT_QPA_PLATFORM=offscreen).
+#
+#   python -m benchmarks.chat_view --messages 100000 --legacy-messages 10000
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+GUI_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gui")
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def sample_rows(count: int):
+    rng = random.Random(1)
+    words = ["hello", "how", "are", "you", "ok", "see", "tomorrow", "meeting", "call", "voice", "привет", "пока"]
+    return [
+        (i, i % 3 == 0, ("You" if i % 3 == 0 else "friend") + ": " + " ".join(rng.choices(words, k=rng.randint(1, 40))))
+        for i in range(1, count + 1)
+    ]
+
+
+def run_model(app, view_parent, rows):
+    from message_view import MessageListModel, create_message_view
+
+    model = MessageListModel()
+    view = create_message_view(model, view_parent)
+    view_parent.layout().addWidget(view)
+
+    start = time.perf_counter()
+    model.reset_rows(rows)
+    populated = time.perf_counter()
+    view_parent.show()
+    view.scrollToBottom()
+    app.processEvents()
+    painted = time.perf_counter()
+
+    # Новое сообщение и подгрузка страницы более старых
+    append_start = time.perf_counter()
+    model.append_rows([(len(rows) + 1, True, "You: new message")])
+    app.processEvents()
+    append_time = time.perf_counter() - append_start
+    page = [(-i, False, "friend: older message") for i in range(1, 101)]
+    prepend_start = time.perf_counter()
+    model.prepend_rows(page)
+    view.scrollTo(model.index(len(page), 0), view.PositionAtTop)
+    app.processEvents()
+    prepend_time = time.perf_counter() - prepend_start
+    return populated - start, painted - populated, {"append_ms": append_time * 1000, "prepend_page_ms": prepend_time * 1000}
+
+
+def run_widgets(app, view_parent, rows):
+    # Прежний путь MainWindow.add_message: QWidget + layout + QLabel со стилем на сообщение
+    from PyQt5.QtCore import Qt
+    from PyQt5.QtGui import QFont
+    from PyQt5.QtWidgets import QHBoxLayout, QLabel, QListWidget, QListWidgetItem, QWidget
+
+    chat_display = QListWidget()
+    view_parent.layout().addWidget(chat_display)
+
+    start = time.perf_counter()
+    for _, is_sender, text in rows:
+        widget = QWidget()
+        layout = QHBoxLayout()
+        label = QLabel(text)
+        label.setWordWrap(True)
+        label.setFont(QFont("Arial", 12))
+        color = "#00a86b" if is_sender else "#00754a"
+        label.setStyleSheet(f"background-color: {color}; padding: 10px; border-radius: 10px;")
+        layout.addWidget(label, alignment=Qt.AlignRight if is_sender else Qt.AlignLeft)
+        widget.setLayout(layout)
+        item = QListWidgetItem()
+        item.setSizeHint(widget.sizeHint())
+        chat_display.addItem(item)
+        chat_display.setItemWidget(item, widget)
+    populated = time.perf_counter()
+    view_parent.show()
+    chat_display.scrollToBottom()
+    app.processEvents()
+    painted = time.perf_counter()
+    return populated - start, painted - populated, {}
+
+
+def run_variant(variant: str, count: int):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    sys.path.insert(0, GUI_DIR)
+    from PyQt5.QtWidgets import QApplication, QVBoxLayout, QWidget
+
+    app = QApplication([])
+    window = QWidget()
+    window.setLayout(QVBoxLayout())
+    window.resize(800, 600)
+    rows = sample_rows(count)
+    rss_before = rss_mb()
+    runner = run_model if variant == "model" else run_widgets
+    populate, paint, extra = runner(app, window, rows)
+    result = {
+        "variant": variant,
+        "messages": count,
+        "populate_s": round(populate, 3),
+        "first_paint_s": round(paint, 3),
+        "rss_delta_mb": round(rss_mb() - rss_before, 1),
+    }
+    result.update({key: round(value, 2) for key, value in extra.items()})
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--legacy-messages", type=int, default=10000,
+                        help="Сообщений для варианта с виджетами (0 - не запускать)")
+    parser.add_argument("--variant", choices=["model", "widgets"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args.variant, args.messages)
+        return
+
+    runs = [("model", args.messages)]
+    if args.legacy_messages:
+        runs.append(("widgets", args.legacy_messages))
+    for variant, count in runs:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.chat_view", "--variant", variant, "--messages", str(count)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        line = (f"{result['variant']:8} {result['messages']:>7} msgs  populate {result['populate_s']:7.3f} s  "
+                f"first paint {result['first_paint_s']:7.3f} s  RSS +{result['rss_delta_mb']:7.1f} MB")
+        if "append_ms" in result:
+            line += f"  append {result['append_ms']:.2f} ms  prepend page {result['prepend_page_ms']:.2f} ms"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
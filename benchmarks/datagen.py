@@ -0,0 +1,167 @@
+# benchmarks/datagen.py
+#
+# Синтетическая база для нагрузочного тестирования (см. benchmarks/load.py):
+# пользователи, дружбы, запросы в друзья и сообщения в схеме app/models.py.
+# Таблицы создаются по моделям, данные вставляются пачками через sqlite3, затем
+# миграции приложения строят остальное по уже загруженным данным (FTS-индексы,
+# сводки переписок) - так быстрее, чем обновлять их триггерами на каждую вставку.
+#
+# Граф дружбы циркулянтный: пользователь u дружит с u ± o для --friends
+# случайных смещений o, так что дружбы генерируются без дубликатов и без
+# хранения графа в памяти. Сообщения идут между друзьями, с id растёт и время
+# отправки (от --days дней назад до текущего момента), как в живой базе.
+# Все пользователи имеют пароль "password".
+#
+#   python -m benchmarks.datagen bench.db --users 1000000 --friends 10 --messages 5000000
+
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from passlib.context import CryptContext
+from sqlalchemy import create_engine
+
+from app.database import Base
+from app.migrations import run_migrations
+
+CHUNK = 50000
+PASSWORD = "password"
+
+
+def vocabulary(size: int):
+    rng = random.Random(1)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(3, 9))) for _ in range(size)]
+
+
+def friend_offsets(users: int, friends: int, seed: int):
+    """Смещения o, для которых u дружит с (u + o) mod users; пары (o, users - o) исключены,
+    чтобы одна и та же дружба не появилась дважды."""
+    if users < 2 * friends + 1:
+        raise ValueError("Too few users for the requested number of friends")
+    rng = random.Random(seed)
+    offsets = set()
+    while len(offsets) < friends:
+        offset = rng.randint(1, users - 1)
+        if offset not in offsets and users - offset not in offsets and 2 * offset != users:
+            offsets.add(offset)
+    return sorted(offsets)
+
+
+def _insert_chunks(connection, sql: str, rows, label: str):
+    started = time.perf_counter()
+    total = 0
+    while True:
+        chunk = list(itertools.islice(rows, CHUNK))
+        if not chunk:
+            break
+        connection.executemany(sql, chunk)
+        connection.commit()
+        total += len(chunk)
+    print(f"{label:16} {total:>12} rows in {time.perf_counter() - started:7.1f}s")
+
+
+def generate(path: str, users: int, friends: int, friend_requests: int, messages: int, days: int, seed: int):
+    offsets = friend_offsets(users, friends, seed)
+    rng = random.Random(seed)
+    # Один хеш на всех: bcrypt для миллионов пользователей занял бы часы
+    hashed_password = CryptContext(schemes=["bcrypt"]).hash(PASSWORD)
+
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=OFF")
+
+    _insert_chunks(
+        connection, "INSERT INTO users (id, username, hashed_password) VALUES (?, ?, ?)",
+        ((i, f"user{i}", hashed_password) for i in range(1, users + 1)), "users"
+    )
+
+    # Дружба хранится двумя строками, как при принятии запроса в respond_to_friend_request
+    def friendship_rows():
+        for index in range(users):
+            for offset in offsets:
+                friend = (index + offset) % users
+                yield index + 1, friend + 1
+                yield friend + 1, index + 1
+
+    _insert_chunks(connection, "INSERT INTO friendships (user_id, friend_id) VALUES (?, ?)",
+                   friendship_rows(), "friendships")
+
+    now = datetime.utcnow()
+    start = now - timedelta(days=days)
+
+    def friend_request_rows():
+        # Входящие запросы от не-друзей (смещение вне offsets), статус pending
+        seen = set()
+        while len(seen) < friend_requests:
+            sender = rng.randint(1, users)
+            offset = rng.randint(1, users - 1)
+            if offset in offsets or users - offset in offsets:
+                continue
+            receiver = (sender - 1 + offset) % users + 1
+            if (sender, receiver) in seen:
+                continue
+            seen.add((sender, receiver))
+            yield sender, receiver, "pending", (start + (now - start) * rng.random()).isoformat(" ")
+
+    _insert_chunks(
+        connection, "INSERT INTO friend_requests (sender_id, receiver_id, status, timestamp) VALUES (?, ?, ?, ?)",
+        friend_request_rows(), "friend_requests"
+    )
+
+    words = vocabulary(5000)
+    # Веса по закону Ципфа: несколько частых слов и длинный хвост редких
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+    step = (now - start) / max(messages, 1)
+
+    def message_rows():
+        for i in range(messages):
+            index = rng.randrange(users)
+            friend = (index + rng.choice(offsets)) % users
+            sender, receiver = (index + 1, friend + 1) if rng.random() < 0.5 else (friend + 1, index + 1)
+            content = " ".join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(1, 20)))
+            yield sender, receiver, content, (start + step * i).isoformat(" ")
+
+    _insert_chunks(
+        connection, "INSERT INTO messages (sender_id, receiver_id, content, timestamp) VALUES (?, ?, ?, ?)",
+        message_rows(), "messages"
+    )
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic chat database for load tests")
+    parser.add_argument("path", help="SQLite file to create")
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--friends", type=int, default=10, help="Friendships created per user (degree is twice this)")
+    parser.add_argument("--friend-requests", type=int, default=10000, help="Pending friend requests")
+    parser.add_argument("--messages", type=int, default=1000000)
+    parser.add_argument("--days", type=int, default=365, help="Message history spans this many days")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if os.path.exists(args.path):
+        parser.error(f"{args.path} already exists")
+    started = time.perf_counter()
+    engine = create_engine(f"sqlite:///{args.path}")
+    Base.metadata.create_all(bind=engine)
+    generate(args.path, args.users, args.friends, args.friend_requests, args.messages, args.days, args.seed)
+    # Все шаги с нуля: FTS-индексы и сводки переписок строятся по загруженным данным
+    migrations_started = time.perf_counter()
+    run_migrations(engine)
+    engine.dispose()
+    print(f"{'migrations':16} {time.perf_counter() - migrations_started:7.1f}s")
+
+    connection = sqlite3.connect(args.path)
+    connection.execute("ANALYZE")
+    connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    connection.close()
+    print(f"total {time.perf_counter() - started:.1f}s, {os.path.getsize(args.path) / 2 ** 20:.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
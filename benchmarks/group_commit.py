@@ -0,0 +1,72 @@
+# benchmarks/group_commit.py
+#
+# Сравнение пропускной способности записи сообщений: одна транзакция на
+# сообщение (прежний путь send_message) против групповой записи MessageWriter.
+#
+#   python -m benchmarks.group_commit --messages 5000 --concurrency 100
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app import models
+from app.database import Base
+from app.message_writer import MessageWriter
+
+
+async def per_message_commit(session_factory, sender_id, receiver_id, content):
+    async with session_factory() as db:
+        db_message = models.Message(sender_id=sender_id, receiver_id=receiver_id,
+                                    content=content, timestamp=datetime.utcnow())
+        db.add(db_message)
+        await db.commit()
+        return db_message.id
+
+
+async def run(write, messages: int, concurrency: int) -> float:
+    counter = iter(range(messages))
+
+    async def producer():
+        for i in counter:
+            await write(1, 2, f"message {i}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(producer() for _ in range(concurrency)))
+    return messages / (time.perf_counter() - started)
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        Base.metadata.create_all(bind=create_engine(f"sqlite:///{path}"))
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        session_factory = async_sessionmaker(async_engine, expire_on_commit=False)
+
+        rate = await run(lambda *row: per_message_commit(session_factory, *row), args.messages, args.concurrency)
+        print(f"per-message commit:  {rate:10.0f} msg/s")
+
+        writer = MessageWriter(async_engine, session_factory, max_batch_size=args.batch_size,
+                               max_batch_delay=args.batch_delay, synchronous=args.synchronous)
+        writer.start()
+        rate = await run(writer.write, args.messages, args.concurrency)
+        await writer.stop()
+        print(f"group commit:        {rate:10.0f} msg/s "
+              f"({writer.messages / writer.batches:.1f} msg/batch, synchronous={args.synchronous})")
+
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Message write throughput: per-message commit vs group commit")
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--batch-delay", type=float, default=0.002)
+    parser.add_argument("--synchronous", default="FULL", help="PRAGMA synchronous for group commit batches")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,277 @@
+# benchmarks/load.py
+#
+# Нагрузочный тест API под uvicorn. Сначала открываются --sockets подключений
+# /ws/chat/{user_id} случайных пользователей, затем --concurrency воркеров в
+# течение --duration секунд выполняют запросы вперемешку (веса --mix):
+#   send_message         POST /messages/ (получатель - пользователь с открытым сокетом)
+#   get_messages         GET /messages/?user_id=
+#   search_users         GET /users/?query=
+#   friend_requests      GET /friend_requests/{user_id}
+#   send_friend_request  POST /friend_requests/
+#   conversations        GET /users/{user_id}/conversations (не входит в смесь по умолчанию)
+# Каждый воркер ждёт ответа перед следующим запросом (замкнутая нагрузка).
+# Для отправленных сообщений измеряется и задержка доставки по WebSocket.
+# Отчёт - JSON (см. benchmarks/report.py), его можно сравнить с отчётом другого коммита.
+#
+#   python -m benchmarks.datagen bench.db --users 100000 --messages 1000000
+#   python -m benchmarks.load bench.db --sockets 2000 --duration 30 --output load.json
+#   python -m benchmarks.load --url http://127.0.0.1:8000 --users 100000
+#
+# База копируется во временный каталог, чтобы каждый прогон начинался с одного состояния.
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+import httpx
+import websockets
+
+from benchmarks import report
+from benchmarks.server import cpu_seconds, free_port, raise_open_files_limit, rss_bytes, start_server
+
+DEFAULT_MIX = "send_message=40,get_messages=25,search_users=15,friend_requests=15,send_friend_request=5"
+# Префикс текста сообщений теста: за ним время отправки (perf_counter_ns) для задержки доставки
+MARK = "load:"
+CONNECT_CONCURRENCY = 100
+
+
+class LoadState:
+    def __init__(self):
+        self.latencies = defaultdict(list)  # операция -> задержки, мс
+        self.statuses = defaultdict(Counter)  # операция -> {код ответа или тип ошибки: число}
+        self.connect_latencies = []
+        self.connect_failures = 0
+        self.connected = []  # id пользователей с открытым сокетом
+        self.delivery_latencies = []
+        self.frames = 0
+
+
+def parse_mix(value: str) -> dict:
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name not in REQUESTS:
+            raise ValueError(f"Unknown operation: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def _send_message(rng, users, state):
+    receiver = rng.choice(state.connected) if state.connected else rng.randint(1, users)
+    content = f"{MARK}{time.perf_counter_ns()} benchmark message"
+    return "POST", "/messages/", {"json": {"sender_id": rng.randint(1, users), "receiver_id": receiver,
+                                           "content": content}}
+
+
+def _get_messages(rng, users, state):
+    return "GET", "/messages/", {"params": {"user_id": rng.randint(1, users), "limit": 50}}
+
+
+def _search_users(rng, users, state):
+    return "GET", "/users/", {"params": {"query": f"user{rng.randint(1, users)}"}}
+
+
+def _friend_requests(rng, users, state):
+    return "GET", f"/friend_requests/{rng.randint(1, users)}", {}
+
+
+def _send_friend_request(rng, users, state):
+    return "POST", "/friend_requests/", {"json": {"sender_id": rng.randint(1, users),
+                                                  "receiver_id": rng.randint(1, users)}}
+
+
+def _conversations(rng, users, state):
+    return "GET", f"/users/{rng.randint(1, users)}/conversations", {}
+
+
+REQUESTS = {
+    "send_message": _send_message,
+    "get_messages": _get_messages,
+    "search_users": _search_users,
+    "friend_requests": _friend_requests,
+    "send_friend_request": _send_friend_request,
+    "conversations": _conversations,
+}
+
+
+def _record_frame(data: dict, state: LoadState, received_ns: int):
+    messages = data.get("messages", []) if data.get("type") == "message_batch" else [data]
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str) and content.startswith(MARK):
+            sent_ns = int(content[len(MARK):].split(" ", 1)[0])
+            state.delivery_latencies.append((received_ns - sent_ns) / 1e6)
+
+
+async def hold_socket(ws_url: str, user_id: int, state: LoadState, semaphore: asyncio.Semaphore,
+                      stop: asyncio.Event):
+    started = time.perf_counter()
+    try:
+        async with semaphore:
+            websocket = await websockets.connect(f"{ws_url}/ws/chat/{user_id}", max_queue=None, open_timeout=60)
+    except Exception:
+        state.connect_failures += 1
+        return
+    state.connect_latencies.append((time.perf_counter() - started) * 1000)
+    state.connected.append(user_id)
+
+    async def receive():
+        async for frame in websocket:
+            received_ns = time.perf_counter_ns()
+            state.frames += 1
+            _record_frame(json.loads(frame), state, received_ns)
+
+    receiver = asyncio.create_task(receive())
+    await stop.wait()
+    receiver.cancel()
+    await websocket.close()
+
+
+async def worker(client: httpx.AsyncClient, rng: random.Random, mix: dict, users: int, state: LoadState,
+                 deadline: float):
+    operations, weights = list(mix), list(mix.values())
+    while time.perf_counter() < deadline:
+        operation = rng.choices(operations, weights)[0]
+        method, path, options = REQUESTS[operation](rng, users, state)
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, **options)
+            status = str(response.status_code)
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        state.latencies[operation].append((time.perf_counter() - started) * 1000)
+        state.statuses[operation][status] += 1
+
+
+async def run_load(url: str, users: int, args) -> dict:
+    state = LoadState()
+    rng = random.Random(args.seed)
+    mix = parse_mix(args.mix)
+    ws_url = "ws" + url[len("http"):]
+
+    # Фаза 1: подключение сокетов
+    stop = asyncio.Event()
+    semaphore = asyncio.Semaphore(CONNECT_CONCURRENCY)
+    socket_users = rng.sample(range(1, users + 1), min(args.sockets, users))
+    connect_started = time.perf_counter()
+    sockets = [asyncio.create_task(hold_socket(ws_url, user_id, state, semaphore, stop)) for user_id in socket_users]
+    while len(state.connected) + state.connect_failures < len(socket_users):
+        await asyncio.sleep(0.05)
+    connect_time = time.perf_counter() - connect_started
+
+    # Фаза 2: HTTP-нагрузка при открытых сокетах
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(
+            worker(client, random.Random(args.seed * 1000 + i), mix, users, state, deadline)
+            for i in range(args.concurrency)
+        ))
+        duration = time.perf_counter() - started
+    await asyncio.sleep(1)  # Доставка последних сообщений
+    stop.set()
+    await asyncio.gather(*sockets)
+
+    operations = {
+        operation: report.operation_summary(state.latencies[operation], state.statuses[operation], duration)
+        for operation in mix
+    }
+    total_requests = sum(summary["requests"] for summary in operations.values())
+    return {
+        "duration_s": round(duration, 3),
+        "total": {
+            "requests": total_requests,
+            "errors": sum(summary["errors"] for summary in operations.values()),
+            "throughput_rps": round(total_requests / duration, 1),
+        },
+        "operations": operations,
+        "websocket": {
+            "sockets": len(socket_users),
+            "connected": len(state.connected),
+            "failures": state.connect_failures,
+            "connect": {"seconds": round(connect_time, 3),
+                        "latency_ms": report.latency_summary(state.connect_latencies)},
+            "delivery": {"frames": state.frames, "messages": len(state.delivery_latencies),
+                         "latency_ms": report.latency_summary(state.delivery_latencies)},
+        },
+    }
+
+
+def database_counts(path: str) -> dict:
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return {table: connection.execute(f"SELECT MAX(id) FROM {table}").fetchone()[0] or 0
+                for table in ("users", "friendships", "friend_requests", "messages")}
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the chat API and report latency percentiles as JSON")
+    parser.add_argument("database", nargs="?", help="Database from benchmarks.datagen; the server is started on a copy")
+    parser.add_argument("--url", help="Test an already running server instead of starting one")
+    parser.add_argument("--users", type=int, help="Number of users (required with --url)")
+    parser.add_argument("--sockets", type=int, default=1000, help="WebSocket connections held open during the run")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent HTTP workers")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of HTTP load")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Operation weights, e.g. send_message=1,get_messages=1")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--in-place", action="store_true", help="Run against the database itself instead of a copy")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    if args.url is None and args.database is None:
+        parser.error("either a database or --url is required")
+    if args.url is not None and args.users is None:
+        parser.error("--users is required with --url")
+    parse_mix(args.mix)
+    raise_open_files_limit()
+
+    result = {"environment": report.environment(),
+              "config": {key: value for key, value in vars(args).items() if key != "output"}}
+    if args.url is not None:
+        result.update(asyncio.run(run_load(args.url.rstrip("/"), args.users, args)))
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            path = args.database
+            if not args.in_place:
+                path = os.path.join(directory, "bench.db")
+                shutil.copyfile(args.database, path)
+            counts = database_counts(path)
+            result["database"] = counts
+            port = free_port()
+            server = start_server(port, path)
+            try:
+                cpu_before, wall_before = cpu_seconds(server.pid), time.perf_counter()
+                result.update(asyncio.run(run_load(f"http://127.0.0.1:{port}", counts["users"], args)))
+                cpu = cpu_seconds(server.pid) - cpu_before
+                result["server"] = {
+                    "cpu_seconds": round(cpu, 2),
+                    "cpu_utilization": round(cpu / (time.perf_counter() - wall_before), 3),
+                    "rss_mb": round(rss_bytes(server.pid) / 2 ** 20, 1),
+                }
+            finally:
+                server.terminate()
+                server.wait()
+    result["driver"] = {"cpu_seconds": round(time.process_time(), 2)}
+
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+        total = result["total"]
+        print(f"{total['requests']} requests, {total['throughput_rps']} req/s, {total['errors']} errors "
+              f"-> {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
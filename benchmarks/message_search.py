@@ -0,0 +1,97 @@
+# benchmarks/message_search.py
+#
+# Задержка полнотекстового поиска по сообщениям на синтетическом корпусе.
+#
+#   python -m benchmarks.message_search --messages 2000000 --users 20000
+
+import argparse
+import itertools
+import os
+import random
+import statistics
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.message_search import search_messages
+from app.migrations import run_migrations
+
+CHUNK = 50000
+
+
+def vocabulary(size: int):
+    rng = random.Random(1)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(3, 9))) for _ in range(size)]
+
+
+def generate(path: str, messages: int, users: int, words: list):
+    rng = random.Random(2)
+    # Веса по закону Ципфа: несколько частых слов и длинный хвост редких
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=OFF")
+    connection.executemany("INSERT INTO users (id, username, hashed_password) VALUES (?, ?, '')",
+                           ((i, f"user{i}") for i in range(1, users + 1)))
+    timestamp = datetime.utcnow().isoformat(" ")
+    started = time.perf_counter()
+    for offset in range(0, messages, CHUNK):
+        rows = []
+        for _ in range(min(CHUNK, messages - offset)):
+            sender, receiver = rng.randint(1, users), rng.randint(1, users)
+            content = " ".join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(3, 15)))
+            rows.append((sender, receiver, content, timestamp))
+        connection.executemany(
+            "INSERT INTO messages (sender_id, receiver_id, content, timestamp) VALUES (?, ?, ?, ?)", rows
+        )
+        connection.commit()
+    print(f"generated {messages} messages in {time.perf_counter() - started:.1f}s "
+          f"({os.path.getsize(path) / 2 ** 20:.0f} MiB)")
+    connection.close()
+
+
+def measure(session_factory, label: str, queries: list, limit: int):
+    latencies = []
+    with session_factory() as db:
+        for user_id, term, peer_id in queries:
+            started = time.perf_counter()
+            search_messages(db, user_id, term, limit, peer_id)
+            latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    print(f"{label:28} p50 {statistics.median(latencies):7.2f} ms   "
+          f"p95 {latencies[int(len(latencies) * 0.95)]:7.2f} ms   max {latencies[-1]:7.2f} ms")
+
+
+def main(args):
+    words = vocabulary(args.vocabulary)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        engine = create_engine(f"sqlite:///{path}")
+        run_migrations(engine)
+        generate(path, args.messages, args.users, words)
+        session_factory = sessionmaker(bind=engine)
+
+        rng = random.Random(3)
+        users = [rng.randint(1, args.users) for _ in range(args.queries)]
+        measure(session_factory, "frequent word, all chats",
+                [(u, rng.choice(words[:10]), None) for u in users], args.limit)
+        measure(session_factory, "rare word, all chats",
+                [(u, rng.choice(words[-1000:]), None) for u in users], args.limit)
+        measure(session_factory, "frequent word, one chat",
+                [(u, rng.choice(words[:10]), rng.randint(1, args.users)) for u in users], args.limit)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Full-text message search latency")
+    parser.add_argument("--messages", type=int, default=2000000)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    main(parser.parse_args())
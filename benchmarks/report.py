@@ -0,0 +1,104 @@
+# benchmarks/report.py
+#
+# JSON-отчёт нагрузочного теста (benchmarks/load.py) и сравнение двух отчётов,
+# например до и после коммита:
+#
+#   python -m benchmarks.report base.json new.json
+
+import argparse
+import json
+import math
+import platform
+import subprocess
+from datetime import datetime
+from typing import Dict, List, Optional
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Процентиль по ближайшему рангу для уже отсортированного списка."""
+    if not sorted_values:
+        return float("nan")
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def latency_summary(latencies_ms: List[float]) -> Dict[str, float]:
+    values = sorted(latencies_ms)
+    if not values:  # null в JSON: NaN не является допустимым JSON
+        return {**{f"p{q}": None for q in PERCENTILES}, "mean": None, "max": None}
+    summary = {f"p{q}": round(percentile(values, q), 3) for q in PERCENTILES}
+    summary["mean"] = round(sum(values) / len(values), 3)
+    summary["max"] = round(values[-1], 3)
+    return summary
+
+
+def operation_summary(latencies_ms: List[float], statuses: Dict[str, int], duration: float) -> dict:
+    """Итог по одной операции: число запросов, ошибки, пропускная способность и задержки."""
+    errors = sum(count for status, count in statuses.items() if not status.startswith("2"))
+    return {
+        "requests": len(latencies_ms),
+        "errors": errors,
+        "statuses": dict(sorted(statuses.items())),
+        "throughput_rps": round(len(latencies_ms) / duration, 1) if duration else 0.0,
+        "latency_ms": latency_summary(latencies_ms),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> dict:
+    return {
+        "commit": git_commit(),
+        "started_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+
+
+def _metric(report: dict, path: List[str]) -> Optional[float]:
+    value = report
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def compare(base: dict, new: dict):
+    """Печатает пропускную способность и процентили задержки обоих отчётов и изменение в %."""
+    print(f"base {base['environment'].get('commit')}  ->  new {new['environment'].get('commit')}")
+    sections = [("operations", name) for name in new.get("operations", {})]
+    sections += [("websocket", name) for name in ("connect", "delivery") if name in new.get("websocket", {})]
+    for section, name in sections:
+        rows = [("throughput_rps", [section, name, "throughput_rps"])]
+        rows += [(f"p{q} ms", [section, name, "latency_ms", f"p{q}"]) for q in PERCENTILES]
+        for label, path in rows:
+            old_value, new_value = _metric(base, path), _metric(new, path)
+            if new_value is None:
+                continue
+            change = ""
+            if old_value:
+                change = f"{(new_value - old_value) / old_value:+8.1%}"
+            old_text = f"{old_value:10.2f}" if old_value is not None else f"{'-':>10}"
+            print(f"  {section + '.' + name:30} {label:15} {old_text} {new_value:10.2f} {change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two load test reports")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    args = parser.parse_args()
+    with open(args.base) as base_file, open(args.new) as new_file:
+        compare(json.load(base_file), json.load(new_file))
+
+
+if __name__ == "__main__":
+    main()
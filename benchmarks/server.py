@@ -0,0 +1,57 @@
+# benchmarks/server.py
+#
+# Запуск приложения под uvicorn отдельным процессом для нагрузочных бенчмарков.
+
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+from typing import Optional
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def raise_open_files_limit():
+    # Тысячи сокетов упираются в мягкий лимит дескрипторов; дочерние процессы его наследуют
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def start_server(port: int, db_path: str, core: Optional[int] = None, env: Optional[dict] = None) -> subprocess.Popen:
+    """Запускает app.main:app на 127.0.0.1:port с базой db_path (на ядре core, если задано)."""
+    server_env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", **(env or {}))
+    # Схема обновляется до запуска сервера, как при развёртывании
+    subprocess.run([sys.executable, "-m", "app.migrations"], env=server_env, check=True, stdout=subprocess.DEVNULL)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=server_env, preexec_fn=(lambda: os.sched_setaffinity(0, {core})) if core is not None else None
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("Server did not start")
+
+
+def cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as stat:
+        fields = stat.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def rss_bytes(pid: int) -> int:
+    with open(f"/proc/{pid}/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
@@ -0,0 +1,100 @@
+# benchmarks/user_search.py
+#
+# Задержка поиска пользователей (app/user_search.py) на базе с миллионами имён.
+# Половина имён - user<id>, так что "user" совпадает с началом сотен тысяч имён,
+# а "ser1" - с их серединой; остальные имена - слово и число.
+#
+#   python -m benchmarks.user_search --users 2000000 --max-p95-ms 10
+
+import argparse
+import os
+import random
+import statistics
+import sqlite3
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.migrations import run_migrations
+from app.user_search import search_users
+
+CHUNK = 50000
+
+
+def generate(path: str, users: int):
+    rng = random.Random(1)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = ["".join(rng.choice(letters) for _ in range(rng.randint(3, 8))) for _ in range(5000)]
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=OFF")
+    started = time.perf_counter()
+    for offset in range(1, users + 1, CHUNK):
+        rows = [
+            (i, f"user{i}" if i % 2 else f"{rng.choice(words).capitalize()}{i}")
+            for i in range(offset, min(offset + CHUNK, users + 1))
+        ]
+        connection.executemany("INSERT INTO users (id, username, hashed_password) VALUES (?, ?, '')", rows)
+        connection.commit()
+    connection.execute("ANALYZE")
+    connection.close()
+    print(f"generated {users} users in {time.perf_counter() - started:.1f}s "
+          f"({os.path.getsize(path) / 2 ** 20:.0f} MiB)")
+    return words
+
+
+def measure(session_factory, label: str, queries: list, limit: int, pages: int) -> float:
+    """Задержка каждой из первых pages страниц; возвращает p95 в мс."""
+    latencies = []
+    with session_factory() as db:
+        for query in queries:
+            cursor = None
+            for _ in range(pages):
+                started = time.perf_counter()
+                _, cursor = search_users(db, query, limit, cursor)
+                latencies.append((time.perf_counter() - started) * 1000)
+                if cursor is None:
+                    break
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95)]
+    print(f"{label:28} p50 {statistics.median(latencies):7.2f} ms   "
+          f"p95 {p95:7.2f} ms   max {latencies[-1]:7.2f} ms")
+    return p95
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        engine = create_engine(f"sqlite:///{path}")
+        run_migrations(engine)
+        words = generate(path, args.users)
+        session_factory = sessionmaker(bind=engine)
+        with session_factory() as db:
+            search_users(db, "warmup", args.limit)  # Первое обращение читает страницы индексов с диска
+
+        rng = random.Random(2)
+        results = [
+            measure(session_factory, "prefix, 2 chars", ["us", "US", "ab"], args.limit, args.pages),
+            measure(session_factory, "prefix, high match", ["user", "USER", "user1"], args.limit, args.pages),
+            measure(session_factory, "substring, high match", ["ser1", "ser2", "er12"], args.limit, args.pages),
+            measure(session_factory, "word", [rng.choice(words) for _ in range(args.queries)],
+                    args.limit, args.pages),
+            measure(session_factory, "no match", ["zzzzq", "qqxq"], args.limit, args.pages),
+        ]
+        engine.dispose()
+    if args.max_p95_ms is not None and max(results) > args.max_p95_ms:
+        print(f"p95 above {args.max_p95_ms} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="User search latency at scale")
+    parser.add_argument("--users", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=3, help="Pages fetched per query through the cursor")
+    parser.add_argument("--max-p95-ms", type=float, help="Exit with status 1 if any p95 exceeds this")
+    main(parser.parse_args())
@@ -0,0 +1,96 @@
+# benchmarks/voice_relay.py
+#
+# Нагрузка на голосовой канал /ws/voice/{call_id} (см. app/voice.py): сервер
+# запускается отдельным процессом на одном ядре, в каждом звонке два участника
+# шлют синтетические 20 мс кадры. Измеряются задержка ретрансляции (от отправки
+# до получения, p50/p99), потери и CPU сервера на один звонок.
+#
+#   python -m benchmarks.voice_relay --calls 10,50,100 --duration 10
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import websockets
+
+from app.voice import VOICE_HEADER
+from benchmarks.server import cpu_seconds, free_port, start_server
+
+FRAME_INTERVAL = 0.02
+
+
+async def participant(uri: str, user_id: int, duration: float, payload_size: int, latencies: list, counters: dict):
+    async with websockets.connect(uri, max_queue=None) as websocket:
+        async def receive():
+            async for frame in websocket:
+                # Первые 8 байт данных - время отправки (CLOCK_MONOTONIC общий для процессов)
+                sent_ns = int.from_bytes(frame[VOICE_HEADER.size:VOICE_HEADER.size + 8], "big")
+                latencies.append((time.perf_counter_ns() - sent_ns) / 1e6)
+                counters["received"] += 1
+
+        receiver = asyncio.create_task(receive())
+        padding = bytes(payload_size - 8)
+        start = time.perf_counter()
+        seq = 0
+        while time.perf_counter() - start < duration:
+            header = VOICE_HEADER.pack(user_id, seq, int(time.time() * 1000) & 0xFFFFFFFF)
+            await websocket.send(header + time.perf_counter_ns().to_bytes(8, "big") + padding)
+            counters["sent"] += 1
+            seq += 1
+            # Расписание от начала, чтобы задержки цикла не накапливались
+            await asyncio.sleep(max(0.0, start + seq * FRAME_INTERVAL - time.perf_counter()))
+        await asyncio.sleep(0.5)  # Дождаться последних кадров
+        receiver.cancel()
+
+
+async def run_calls(port: int, calls: int, duration: float, payload_size: int):
+    latencies = []
+    counters = {"sent": 0, "received": 0}
+    tasks = []
+    for call in range(calls):
+        for user_id in (2 * call + 1, 2 * call + 2):
+            uri = f"ws://127.0.0.1:{port}/ws/voice/bench-{call}?user_id={user_id}"
+            tasks.append(participant(uri, user_id, duration, payload_size, latencies, counters))
+    await asyncio.gather(*tasks)
+    return latencies, counters
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", default="10,50,100", help="Comma-separated numbers of concurrent calls")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of audio per run")
+    parser.add_argument("--payload", type=int, default=160, help="Audio bytes per 20 ms frame (160 = 64 kbit/s)")
+    parser.add_argument("--server-core", type=int, default=0)
+    args = parser.parse_args()
+
+    # Клиенты - на остальных ядрах, чтобы не мешать серверу
+    cores = os.sched_getaffinity(0) - {args.server_core}
+    if cores:
+        os.sched_setaffinity(0, cores)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        port = free_port()
+        server = start_server(port, os.path.join(tmp, "bench.db"), core=args.server_core)
+        try:
+            for calls in (int(value) for value in args.calls.split(",")):
+                cpu_before = cpu_seconds(server.pid)
+                wall_start = time.perf_counter()
+                latencies, counters = asyncio.run(run_calls(port, calls, args.duration, args.payload))
+                wall = time.perf_counter() - wall_start
+                cpu = cpu_seconds(server.pid) - cpu_before
+                latencies.sort()
+                p50 = statistics.median(latencies) if latencies else float("nan")
+                p99 = latencies[int(len(latencies) * 0.99)] if latencies else float("nan")
+                loss = 1 - counters["received"] / counters["sent"] if counters["sent"] else 0
+                print(f"{calls:4} calls  latency p50 {p50:6.2f} ms  p99 {p99:6.2f} ms  loss {loss:6.2%}  "
+                      f"server CPU {cpu / wall:6.1%} of one core  {cpu / wall / calls * 1000:5.2f} ms CPU/s per call")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# benchmarks/wire_format.py
+#
+# Размер кадра и затраты CPU на кодирование/декодирование для форматов
+# WebSocket-чата (см. app/wire.py).
+#
+#   python -m benchmarks.wire_format --frames 100000
+
+import argparse
+import json
+import random
+import time
+from datetime import datetime
+
+from app import wire
+
+
+def sample_messages(count: int):
+    rng = random.Random(1)
+    words = ["hello", "how", "are", "you", "ok", "see", "tomorrow", "meeting", "call", "voice", "привет", "пока"]
+    return [
+        {
+            "id": 1000000 + i,
+            "sender_id": rng.randint(1, 100000),
+            "receiver_id": rng.randint(1, 100000),
+            "content": " ".join(rng.choices(words, k=rng.randint(1, 12))),
+            "timestamp": datetime.utcnow().isoformat(),
+            "sender_username": f"user_{rng.randint(1, 100000)}",
+            "receiver_username": f"user_{rng.randint(1, 100000)}",
+        }
+        for i in range(count)
+    ]
+
+
+class StdlibJsonCodec(wire.Codec):
+    # Прежний путь send_json/json.loads для сравнения
+    def encode(self, data):
+        return json.dumps(data)
+
+    def decode(self, payload):
+        return json.loads(payload)
+
+
+def measure(name: str, codec: wire.Codec, messages: list):
+    started = time.perf_counter()
+    frames = [codec.encode(message) for message in messages]
+    encoded = time.perf_counter()
+    for frame in frames:
+        codec.decode(frame)
+    decoded = time.perf_counter()
+    size = sum(len(frame.encode() if isinstance(frame, str) else frame) for frame in frames) / len(frames)
+    print(f"{name:28} {size:8.1f} B/msg   encode {(encoded - started) / len(frames) * 1e6:6.2f} us   "
+          f"decode {(decoded - encoded) / len(frames) * 1e6:6.2f} us")
+
+
+def main(args):
+    messages = sample_messages(args.frames)
+    print(f"orjson: {'yes' if wire.orjson else 'no'}, msgpack: {'yes' if wire.msgpack else 'no'}")
+    measure("json (stdlib, before)", StdlibJsonCodec(), messages)
+    measure("json (default)", wire.DEFAULT_CODEC, messages)
+    for subprotocol, codec in wire.CODECS.items():
+        measure(subprotocol, codec, messages)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="WebSocket wire format size and CPU cost")
+    parser.add_argument("--frames", type=int, default=100000)
+    main(parser.parse_args())
@@ -0,0 +1,141 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from PyQt5.QtCore import QObject, pyqtSignal
+
+BASE_URL = "http://127.0.0.1:8000"
+# Число потоков, выполняющих запросы; столько же соединений держит пул keep-alive
+MAX_WORKERS = 4
+# Сколько секунд ответ на GET считается свежим
+CACHE_TTL = 2.0
+REQUEST_TIMEOUT = 10
+
+
+class ApiRequest(QObject):
+    # Сигналы испускаются из рабочего потока, слоты выполняются в потоке интерфейса
+    succeeded = pyqtSignal(object)  # Разобранный JSON ответа
+    failed = pyqtSignal(str)
+
+    def __init__(self, method, url, params=None, json=None):
+        super().__init__()
+        self.method = method
+        self.url = url
+        self.params = params
+        self.json = json
+        self.cancelled = False
+        self.future = None
+
+    def cancel(self):
+        # Ещё не начатый запрос снимается с очереди, результат начатого отбрасывается
+        self.cancelled = True
+        if self.future is not None:
+            self.future.cancel()
+
+
+class ApiClient(QObject):
+    """HTTP-клиент GUI: запросы выполняются в пуле потоков поверх общей сессии keep-alive,
+    результаты приходят сигналами ApiRequest, поэтому поток интерфейса не блокируется."""
+
+    def __init__(self, base_url=BASE_URL, max_workers=MAX_WORKERS, cache_ttl=CACHE_TTL):
+        super().__init__()
+        self.base_url = base_url
+        self.cache_ttl = cache_ttl
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="api")
+        self._cache = {}  # (url, params) -> (время, данные)
+        self._cache_lock = threading.Lock()
+        self._active = {}  # Ключ -> последний запрос с этим ключом
+        self._pending = set()  # Ссылки на запросы до их завершения
+
+    def get(self, path, params=None, key=None, on_success=None, on_error=None, cache=True):
+        return self.request("GET", path, params=params, key=key, on_success=on_success, on_error=on_error,
+                            cache=cache)
+
+    def post(self, path, json=None, key=None, on_success=None, on_error=None):
+        return self.request("POST", path, json=json, key=key, on_success=on_success, on_error=on_error)
+
+    def put(self, path, params=None, json=None, key=None, on_success=None, on_error=None):
+        return self.request("PUT", path, params=params, json=json, key=key, on_success=on_success, on_error=on_error)
+
+    def request(self, method, path, params=None, json=None, key=None, on_success=None, on_error=None, cache=True):
+        """Ставит запрос в очередь. Новый запрос с тем же key отменяет предыдущий
+        (например, поиск по устаревшему тексту); cache=False - GET мимо кэша."""
+        api_request = ApiRequest(method, self.base_url + path, params, json)
+        if on_success is not None:
+            api_request.succeeded.connect(on_success)
+        if on_error is not None:
+            api_request.failed.connect(on_error)
+        if key is not None:
+            previous = self._active.get(key)
+            if previous is not None:
+                previous.cancel()
+                self._pending.discard(previous)
+            self._active[key] = api_request
+        self._pending.add(api_request)
+        api_request.succeeded.connect(lambda _: self._finished(api_request, key))
+        api_request.failed.connect(lambda _: self._finished(api_request, key))
+
+        cached = self._cached(api_request) if method == "GET" and cache else None
+        if cached is not None:
+            api_request.future = self._executor.submit(self._emit, api_request, cached)
+        else:
+            api_request.future = self._executor.submit(self._run, api_request)
+        return api_request
+
+    def _finished(self, api_request, key):
+        self._pending.discard(api_request)
+        if key is not None and self._active.get(key) is api_request:
+            del self._active[key]
+
+    def _cache_key(self, api_request):
+        return api_request.url, tuple(sorted((api_request.params or {}).items()))
+
+    def _cached(self, api_request):
+        with self._cache_lock:
+            entry = self._cache.get(self._cache_key(api_request))
+        if entry is not None and time.monotonic() - entry[0] < self.cache_ttl:
+            return entry[1]
+        return None
+
+    def _emit(self, api_request, data):
+        if not api_request.cancelled:
+            api_request.succeeded.emit(data)
+
+    def _run(self, api_request):
+        if api_request.cancelled:
+            return
+        try:
+            response = self.session.request(api_request.method, api_request.url, params=api_request.params,
+                                            json=api_request.json, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+            data = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logging.error(f"{api_request.method} request failed. URL: {api_request.url}, "
+                          f"Params: {api_request.params}, Data: {api_request.json}, Error: {e}")
+            if not api_request.cancelled:
+                api_request.failed.emit(str(e))
+            return
+        with self._cache_lock:
+            if api_request.method == "GET":
+                self._cache[self._cache_key(api_request)] = (time.monotonic(), data)
+            else:
+                # Изменяющий запрос мог сделать закэшированные ответы устаревшими
+                self._cache.clear()
+        self._emit(api_request, data)
+
+    def invalidate(self):
+        with self._cache_lock:
+            self._cache.clear()
+
+    def close(self):
+        for api_request in list(self._pending):
+            api_request.cancel()
+        self._executor.shutdown(wait=False)
+        self.session.close()
@@ -1,63 +1,26 @@
-import requests
 import logging
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton, QMessageBox, QListWidget, \
     QListWidgetItem, QSplitter, QLabel
 from PyQt5.QtCore import Qt, QTimer
-from PyQt5.QtGui import QColor, QFont
-from websocket_listener import WebSocketListener
+from api_client import ApiClient
+from message_cache import MessageCache
+from message_view import MessageListModel, create_message_view
+from websocket_listener import WebSocketListener, EVENT_MESSAGE, EVENT_FRIEND_REQUEST, EVENT_REQUEST_ACCEPTED, \
+    EVENT_REQUEST_REJECTED, EVENT_CONNECTED, EVENT_DISCONNECTED
 
 # Настройка логирования
 logging.basicConfig(level=logging.ERROR, format="%(asctime)s - %(levelname)s - %(message)s")
 
-# Вспомогательная функция для обработки GET-запросов с логированием ошибок
-def safe_get(url, params=None):
-    try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        return response
-    except requests.exceptions.RequestException as e:
-        logging.error(f"GET request failed. URL: {url}, Params: {params}, Error: {e}")
-        return None
-
-# Вспомогательная функция для обработки POST-запросов с логированием ошибок
-def safe_post(url, json=None):
-    try:
-        response = requests.post(url, json=json)
-        response.raise_for_status()
-        return response
-    except requests.exceptions.RequestException as e:
-        logging.error(f"POST request failed. URL: {url}, Data: {json}, Error: {e}")
-        return None
-
-# Вспомогательная функция для обработки PUT-запросов с логированием ошибок
-def safe_put(url, json=None):
-    try:
-        response = requests.put(url, json=json)
-        response.raise_for_status()
-        return response
-    except requests.exceptions.RequestException as e:
-        logging.error(f"PUT request failed. URL: {url}, Data: {json}, Error: {e}")
-        return None
-
-
-class MessageWidget(QWidget):
-    def __init__(self, text, is_sender):
-        super().__init__()
-        layout = QHBoxLayout()
-
-        # Настройка выравнивания и фона для отправителя и получателя
-        label = QLabel(text)
-        label.setWordWrap(True)
-        label.setFont(QFont("Arial", 12))
-
-        if is_sender:
-            label.setStyleSheet("background-color: #00a86b; padding: 10px; border-radius: 10px;")
-            layout.addWidget(label, alignment=Qt.AlignRight)
-        else:
-            label.setStyleSheet("background-color: #00754a; padding: 10px; border-radius: 10px;")
-            layout.addWidget(label, alignment=Qt.AlignLeft)
-
-        self.setLayout(layout)
+# Задержка поиска после последнего нажатия клавиши, мс
+SEARCH_DEBOUNCE_MS = 300
+# Размер страницы истории: сначала последняя, более старые - при прокрутке к началу
+MESSAGE_PAGE_SIZE = 100
+# Размер страницы при догрузке сообщений, появившихся после последнего закэшированного
+NEWER_PAGE_SIZE = 500
+# Максимум id в одном запросе POST /users/lookup
+LOOKUP_BATCH_SIZE = 1000
+# Роль данных элемента списка контактов, в которой хранится id пользователя
+USER_ID_ROLE = Qt.UserRole
 
 
 class MainWindow(QWidget):
@@ -65,20 +28,36 @@ class MainWindow(QWidget):
         super().__init__()
         self.user_id = user_id
         self.friends = set()  # Множество для хранения ID друзей
+        self.usernames = {}  # ID пользователя -> имя, известные клиенту профили
+        self.pending_profile_ids = set()  # ID, имена которых будут запрошены одним POST /users/lookup
         self.selected_contact_id = None
         self.processed_request_ids = set()  # Инициализация для отслеживания ID запросов на дружбу
+        self.sync_cursor = None  # Курсор GET /sync: изменения загружаются только после него
+        self.friend_request_items = {}  # ID запроса -> элементы запроса в списке запросов
+        self.has_older_messages = False  # Есть ли в открытой переписке более старые страницы
+        self.loading_older_messages = False
+        # Открытая переписка догружена с сервера: новые сообщения можно дописывать в кэш
+        self.conversation_synced = False
+        # Собеседники, чей кэш в этом сеансе догружен до конца: сообщения из /sync с ними
+        # продолжают кэш без разрыва (журнал изменений сервера не пропускает записей)
+        self.synced_peers = set()
+        # Сообщения открытой переписки из /sync, пришедшие пока она догружается
+        self.pending_synced_messages = []
+        # Локальный кэш переписок: показ из него сразу, с сервера - только новые сообщения
+        self.message_cache = MessageCache(self.user_id)
+        # HTTP-запросы выполняются в фоне, ответы приходят в поток интерфейса сигналами
+        self.api = ApiClient()
         self.initUI()
         self.load_contacts()
+        self.load_friend_requests()
+        self.sync_changes()
 
-        # WebSocketListener для получения сообщений в реальном времени
-        self.websocket_listener = WebSocketListener(self.chat_display, self.user_id)
+        # WebSocketListener для получения событий в реальном времени: сообщения, запросы
+        # в друзья и ответы на них приходят пачками в поток интерфейса через сигнал
+        self.websocket_listener = WebSocketListener(self.user_id)
+        self.websocket_listener.events_received.connect(self.handle_events)
         self.websocket_listener.start()
 
-        # Таймер для проверки новых запросов на дружбу
-        self.friend_request_timer = QTimer(self)
-        self.friend_request_timer.timeout.connect(self.load_friend_requests)
-        self.friend_request_timer.start(5000)  # Проверка каждые 30 секунд
-
     def initUI(self):
         self.setWindowTitle("Chat Application")
         self.setGeometry(100, 100, 800, 600)
@@ -88,16 +67,36 @@ class MainWindow(QWidget):
         contact_layout = QVBoxLayout()
         self.search_input = QLineEdit()
         self.search_input.setPlaceholderText("Search users...")
-        self.search_input.textChanged.connect(self.search_users)
+        # Поиск запускается, когда пользователь перестал печатать
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.search_users)
+        self.search_input.textChanged.connect(self.search_timer.start)
         contact_layout.addWidget(self.search_input)
 
         self.contact_list = QListWidget()
         self.contact_list.itemClicked.connect(self.on_contact_selected)
         contact_layout.addWidget(self.contact_list)
 
+        # Недостающие профили собираются за итерацию цикла событий и запрашиваются пачкой
+        self.profile_timer = QTimer(self)
+        self.profile_timer.setSingleShot(True)
+        self.profile_timer.setInterval(0)
+        self.profile_timer.timeout.connect(self.resolve_profiles)
+
         # Правый раздел для чата
         chat_layout = QVBoxLayout()
-        self.chat_display = QListWidget()  # Используем QListWidget для отображения сообщений
+        # Входящие запросы в друзья с кнопками - отдельный небольшой список над перепиской
+        self.friend_request_list = QListWidget()
+        self.friend_request_list.setMaximumHeight(120)
+        self.friend_request_list.hide()
+        chat_layout.addWidget(self.friend_request_list)
+
+        # Переписка: модель + делегат, рисующий только видимые сообщения
+        self.message_model = MessageListModel(self)
+        self.chat_display = create_message_view(self.message_model)
+        self.chat_display.verticalScrollBar().valueChanged.connect(self.on_chat_scrolled)
         chat_layout.addWidget(self.chat_display)
 
         message_layout = QHBoxLayout()
@@ -121,77 +120,198 @@ class MainWindow(QWidget):
         main_layout.addWidget(splitter)
         self.setLayout(main_layout)
 
+    def closeEvent(self, event):
+        self.websocket_listener.events_received.disconnect(self.handle_events)
+        self.websocket_listener.stop()
+        self.websocket_listener.wait(2000)
+        self.api.close()
+        self.message_cache.close()
+        super().closeEvent(event)
+
     def load_contacts(self):
-        url = f"http://127.0.0.1:8000/users/{self.user_id}/friends/"
-        response = safe_get(url)
-        if response:
-            friends = response.json()
-            self.contact_list.clear()
-            for friend in friends:
-                friend_item = QListWidgetItem(f"{friend['username']} (Friend)")
-                self.contact_list.addItem(friend_item)
-                self.friends.add(friend['id'])  # Добавление в локальный список друзей
-        else:
-            QMessageBox.warning(self, "Error", "Failed to load contacts.")
+        self.api.get(f"/users/{self.user_id}/friends/", key="contacts", on_success=self.on_contacts_loaded,
+                     on_error=lambda _: QMessageBox.warning(self, "Error", "Failed to load contacts."))
+
+    def on_contacts_loaded(self, friends):
+        self.contact_list.clear()
+        for friend in friends:
+            self.add_contact(friend['id'], friend['username'])
+
+    def add_contact(self, friend_id, username=None):
+        # Элемент хранит id контакта; без известного имени профиль догружается пачкой
+        if username:
+            self.usernames[friend_id] = username
+        friend_item = QListWidgetItem(self.contact_text(friend_id))
+        friend_item.setData(USER_ID_ROLE, friend_id)
+        self.contact_list.addItem(friend_item)
+        self.friends.add(friend_id)  # Добавление в локальный список друзей
+        if friend_id not in self.usernames:
+            self.request_profiles([friend_id])
+
+    def contact_text(self, user_id):
+        return f"{self.usernames.get(user_id, f'User {user_id}')} (Friend)"
+
+    def request_profiles(self, user_ids):
+        self.pending_profile_ids.update(user_ids)
+        self.profile_timer.start()
+
+    def resolve_profiles(self):
+        user_ids = sorted(self.pending_profile_ids)
+        self.pending_profile_ids.clear()
+        for start in range(0, len(user_ids), LOOKUP_BATCH_SIZE):
+            self.api.post("/users/lookup", json={"ids": user_ids[start:start + LOOKUP_BATCH_SIZE]},
+                          on_success=self.on_profiles_loaded)
+
+    def on_profiles_loaded(self, users):
+        for user in users:
+            self.usernames[user["id"]] = user["username"]
+        for row in range(self.contact_list.count()):
+            item = self.contact_list.item(row)
+            user_id = item.data(USER_ID_ROLE)
+            if user_id in self.friends and self.contact_list.itemWidget(item) is None:
+                item.setText(self.contact_text(user_id))
 
     def on_contact_selected(self, item):
-        selected_username = item.text()
-        response = safe_get("http://127.0.0.1:8000/users/")
-        if response:
-            users = response.json()
-            for user in users:
-                if user['username'] == selected_username:
-                    self.selected_contact_id = user['id']
-                    break
-            self.load_messages()
-        else:
-            QMessageBox.warning(self, "Error", "Failed to retrieve user information.")
+        # Id контакта хранится в самом элементе - выбор не требует запросов к серверу
+        contact_id = item.data(USER_ID_ROLE)
+        if contact_id is None:
+            return
+        self.selected_contact_id = contact_id
+        self.load_messages()
 
     def load_messages(self):
         if self.selected_contact_id is None:
             return
 
-        url = f"http://127.0.0.1:8000/messages"
-        params = {
-            "sender_id": self.user_id,
-            "receiver_id": self.selected_contact_id
-        }
-        response = safe_get(url, params=params)
-        if response:
-            messages = response.json()
-            self.chat_display.clear()
-            for message in messages:
-                is_sender = message["sender_id"] == self.user_id
-                sender_name = "You" if is_sender else message["sender_username"]
-                text = f"{sender_name}: {message['content']}"
-                self.add_message(text, is_sender)
+        # Сначала показываем закэшированный хвост переписки, затем догружаем новые сообщения
+        peer_id = self.selected_contact_id
+        self.message_cache.touch(peer_id)
+        cached = self.message_cache.latest(peer_id, MESSAGE_PAGE_SIZE)
+        self.message_model.reset_rows([self.message_row(message) for message in cached])
+        self.has_older_messages = bool(cached)
+        self.loading_older_messages = False
+        self.conversation_synced = False
+        self.pending_synced_messages = []
+        self.chat_display.scrollToBottom()
+        self.fetch_newer_messages()
+
+    def fetch_newer_messages(self):
+        # Переключение на другой контакт отменяет загрузку истории предыдущего
+        peer_id = self.selected_contact_id
+        url = f"/users/{self.user_id}/conversations/{peer_id}/messages"
+        after_id = self.message_cache.max_id(peer_id)
+        if after_id is None:
+            params = {"limit": MESSAGE_PAGE_SIZE}
         else:
-            QMessageBox.warning(self, "Error", "Failed to load messages.")
+            params = {"limit": NEWER_PAGE_SIZE, "after_id": after_id}
+        self.api.get(url, params=params, key="messages", cache=False,
+                     on_success=lambda messages: self.on_newer_messages_loaded(peer_id, messages, after_id),
+                     on_error=lambda _: QMessageBox.warning(self, "Error", "Failed to load messages."))
+
+    def on_newer_messages_loaded(self, peer_id, messages, after_id):
+        if peer_id != self.selected_contact_id:
+            return  # Ответ для переписки, которую уже закрыли
+        self.message_cache.store(messages)
+        self.add_messages(messages)
+        if after_id is None:
+            self.has_older_messages = len(messages) == MESSAGE_PAGE_SIZE
+        elif len(messages) == NEWER_PAGE_SIZE:
+            self.fetch_newer_messages()  # Пропущенных сообщений больше страницы
+            return
+        self.conversation_synced = True
+        self.synced_peers.add(peer_id)
+        # Ответ /sync мог быть собран позже ответа выше: его сообщения дописываются после
+        pending, self.pending_synced_messages = self.pending_synced_messages, []
+        if pending:
+            self.message_cache.store(pending)
+            self.add_messages(pending)
+
+    def on_chat_scrolled(self, value):
+        # Прокрутка к началу переписки подгружает предыдущую страницу
+        if value == self.chat_display.verticalScrollBar().minimum() and self.has_older_messages \
+                and not self.loading_older_messages:
+            self.load_older_messages()
+
+    def load_older_messages(self):
+        peer_id = self.selected_contact_id
+        before_id = self.message_model.oldest_id()
+        cached = self.message_cache.before(peer_id, before_id, MESSAGE_PAGE_SIZE)
+        if len(cached) == MESSAGE_PAGE_SIZE:
+            self.prepend_messages(cached)
+            return
+
+        self.loading_older_messages = True
+        url = f"/users/{self.user_id}/conversations/{peer_id}/messages"
+        params = {"limit": MESSAGE_PAGE_SIZE, "before_id": before_id}
+        self.api.get(url, params=params, key="older_messages",
+                     on_success=lambda messages: self.on_older_messages_loaded(peer_id, messages),
+                     on_error=lambda _: setattr(self, "loading_older_messages", False))
+
+    def on_older_messages_loaded(self, peer_id, messages):
+        self.loading_older_messages = False
+        if peer_id != self.selected_contact_id:
+            return
+        self.has_older_messages = len(messages) == MESSAGE_PAGE_SIZE
+        # Страница примыкает к самому старому закэшированному сообщению - кэш остаётся непрерывным
+        self.message_cache.store(messages)
+        self.prepend_messages(messages)
+
+    def prepend_messages(self, messages):
+        added = self.message_model.prepend_rows([self.message_row(message) for message in messages])
+        if added:
+            # Оставляем на экране сообщение, которое было первым до подгрузки
+            self.chat_display.scrollTo(self.message_model.index(added, 0), self.chat_display.PositionAtTop)
+
+    def message_row(self, message):
+        is_sender = message["sender_id"] == self.user_id
+        sender_name = "You" if is_sender else message.get("sender_username", "Unknown")
+        text = message.get("content", "")
+        attachment = message.get("attachment")
+        if attachment:
+            # Приходят только метаданные; файл скачивается по GET /attachments/{id}
+            kind = "Voice message" if attachment["content_type"].startswith("audio/") else "Attachment"
+            note = f"[{kind}, {max(1, attachment['size'] // 1024)} KB]"
+            text = f"{note} {text}" if text else note
+        return message["id"], is_sender, f"{sender_name}: {text}"
+
+    def add_messages(self, messages):
+        # Новые сообщения дописываются в конец; прокручиваем, только если список был в самом низу
+        scroll_bar = self.chat_display.verticalScrollBar()
+        at_bottom = scroll_bar.value() == scroll_bar.maximum()
+        if self.message_model.append_rows([self.message_row(message) for message in messages]) and at_bottom:
+            self.chat_display.scrollToBottom()
+
+    def add_notice(self, text):
+        self.message_model.append_rows([(None, None, text)])
+        self.chat_display.scrollToBottom()
 
     def search_users(self):
-        query = self.search_input.text()
-        response = safe_get(f"http://127.0.0.1:8000/users?query={query}")
-        if response:
-            users = response.json()
-            self.contact_list.clear()
-            for user in users:
-                user_item = QListWidgetItem()
-                if user['id'] in self.friends:
-                    user_item.setText(f"{user['username']} (Friend)")
-                else:
-                    add_friend_button = QPushButton("Add Friend")
-                    add_friend_button.clicked.connect(lambda _, uid=user['id']: self.add_friend(uid))
-                    item_widget = QWidget()
-                    layout = QHBoxLayout(item_widget)
-                    layout.addWidget(QLabel(user['username']))
-                    layout.addWidget(add_friend_button)
-                    item_widget.setLayout(layout)
-                    item = QListWidgetItem()
-                    item.setSizeHint(item_widget.sizeHint())
-                    self.contact_list.addItem(item)
-                    self.contact_list.setItemWidget(item, item_widget)
-        else:
-            QMessageBox.warning(self, "Error", "Failed to search users.")
+        # Ответ на запрос по устаревшему тексту отбрасывается
+        self.api.get("/users/", params={"query": self.search_input.text()}, key="search",
+                     on_success=self.on_users_found,
+                     on_error=lambda _: QMessageBox.warning(self, "Error", "Failed to search users."))
+
+    def on_users_found(self, users):
+        self.contact_list.clear()
+        for user in users:
+            self.usernames[user['id']] = user['username']
+            if user['id'] in self.friends:
+                friend_item = QListWidgetItem(self.contact_text(user['id']))
+                friend_item.setData(USER_ID_ROLE, user['id'])
+                self.contact_list.addItem(friend_item)
+            else:
+                add_friend_button = QPushButton("Add Friend")
+                add_friend_button.clicked.connect(lambda _, uid=user['id']: self.add_friend(uid))
+                item_widget = QWidget()
+                layout = QHBoxLayout(item_widget)
+                layout.addWidget(QLabel(user['username']))
+                layout.addWidget(add_friend_button)
+                item_widget.setLayout(layout)
+                item = QListWidgetItem()
+                item.setData(USER_ID_ROLE, user['id'])
+                item.setSizeHint(item_widget.sizeHint())
+                self.contact_list.addItem(item)
+                self.contact_list.setItemWidget(item, item_widget)
 
     def send_message(self):
         message = self.message_input.text()
@@ -199,63 +319,153 @@ class MainWindow(QWidget):
             QMessageBox.warning(self, "Error", "Select a contact and enter a message")
             return
 
-        url = "http://127.0.0.1:8000/messages/"
         data = {
             "sender_id": self.user_id,
             "receiver_id": self.selected_contact_id,
             "content": message
         }
-        response = safe_post(url, json=data)
-        if response:
-            self.add_message(f"You: {message}", is_sender=True)
-            self.message_input.clear()
-        else:
-            QMessageBox.warning(self, "Error", "Failed to send message.")
+        self.message_input.clear()
+        self.api.post("/messages/", json=data, on_success=self.on_message_sent,
+                      on_error=lambda _: self.on_message_failed(message))
+
+    def on_message_sent(self, message):
+        # Модель пропускает сообщение, если оно уже пришло по WebSocket
+        if message["receiver_id"] == self.selected_contact_id:
+            self.cache_messages([message])
+            self.add_messages([message])
+
+    def cache_messages(self, messages):
+        # Пока открытая переписка не догружена, в кэше между старыми и новыми сообщениями
+        # мог бы остаться разрыв - такие сообщения подтянет fetch_newer_messages
+        if self.conversation_synced:
+            self.message_cache.store(messages)
+
+    def on_message_failed(self, message):
+        # Возвращаем текст в поле ввода, чтобы его можно было отправить повторно
+        if not self.message_input.text():
+            self.message_input.setText(message)
+        QMessageBox.warning(self, "Error", "Failed to send message.")
 
     def load_friend_requests(self):
-        url = f"http://127.0.0.1:8000/friend_requests/{self.user_id}"
-        response = safe_get(url)
-        if response:
-            friend_requests = response.json()
-            for req in friend_requests:
-                if req["id"] not in self.processed_request_ids:
-                    self.show_friend_request(req["sender_id"], req["sender_username"])
-                    self.processed_request_ids.add(req["id"])
-        else:
-            QMessageBox.warning(self, "Error", "Failed to load friend requests.")
-
-    def accept_friend_request(self, sender_id):
-        url = f"http://127.0.0.1:8000/friend_requests/{sender_id}?status=accepted"
-        response = safe_put(url)
-        if response:
-            QMessageBox.information(self, "Success", "Friend request accepted")
-            self.load_contacts()  # Обновление списка друзей после принятия запроса
-            self.remove_friend_request_items(sender_id)  # Удаление UI-запроса
-        else:
-            QMessageBox.warning(self, "Error", "Failed to accept friend request")
-
-    def reject_friend_request(self, sender_id):
-        url = f"http://127.0.0.1:8000/friend_requests/{sender_id}?status=rejected"
-        response = safe_put(url)
-        if response:
-            QMessageBox.information(self, "Success", "Friend request rejected")
-            self.remove_friend_request_items(sender_id)  # Удаление UI-запроса
-        else:
-            QMessageBox.warning(self, "Error", "Failed to reject friend request")
+        self.api.get(f"/friend_requests/{self.user_id}", on_success=self.on_friend_requests_loaded,
+                     on_error=lambda _: QMessageBox.warning(self, "Error", "Failed to load friend requests."))
+
+    def on_friend_requests_loaded(self, friend_requests):
+        for req in friend_requests:
+            self.show_friend_request(req["id"], req["sender_username"])
+
+    def sync_changes(self):
+        # Запрашиваем только изменения после курсора; без изменений ответ пустой
+        params = {"user_id": self.user_id}
+        if self.sync_cursor:
+            params["cursor"] = self.sync_cursor
+        self.api.get("/sync", params=params, key="sync", cache=False, on_success=self.on_changes_loaded)
+
+    def on_changes_loaded(self, changes):
+        for req in changes["friend_requests"]:
+            if req["status"] == "pending" and req["receiver_id"] == self.user_id:
+                self.show_friend_request(req["id"], req["sender_username"])
+            else:
+                self.remove_friend_request_items(req["id"])
+        for friend in changes["friends"]:
+            if friend["id"] not in self.friends:
+                self.add_contact(friend["id"], friend["username"])
+        self.merge_synced_messages(changes["messages"])
+        self.sync_cursor = changes["cursor"]
+        if changes["has_more"]:
+            self.sync_changes()
+
+    def merge_synced_messages(self, messages):
+        # Сообщения, пропущенные без соединения: в кэш - для собеседников, чей кэш уже
+        # догружен (иначе между ним и этими сообщениями остался бы разрыв, их подтянет
+        # fetch_newer_messages); в открытую переписку - сразу или после её догрузки
+        by_peer = {}
+        for message in messages:
+            peer_id = message["receiver_id"] if message["sender_id"] == self.user_id else message["sender_id"]
+            by_peer.setdefault(peer_id, []).append(message)
+        for peer_id, peer_messages in by_peer.items():
+            if peer_id in self.synced_peers:
+                self.message_cache.store(peer_messages)
+            if peer_id == self.selected_contact_id:
+                if self.conversation_synced:
+                    self.add_messages(peer_messages)
+                else:
+                    self.pending_synced_messages.extend(peer_messages)
+
+    def handle_events(self, events):
+        # Слот сигнала WebSocketListener: выполняется в потоке интерфейса, события
+        # приходят пачкой за кадр - сообщения пачки добавляются в модель одной вставкой
+        messages = []
+        self.chat_display.setUpdatesEnabled(False)
+        try:
+            for event_type, data in events:
+                if event_type == EVENT_MESSAGE:
+                    messages.append(data)
+                elif event_type == EVENT_FRIEND_REQUEST:
+                    self.show_friend_request(data["request_id"], data.get("sender_username", "Unknown"))
+                elif event_type == EVENT_REQUEST_ACCEPTED:
+                    self.remove_friend_request_items(data["request_id"])
+                    if data["sender_id"] == self.user_id:
+                        friend_id, username = data["receiver_id"], data.get("receiver_username")
+                    else:
+                        friend_id, username = data["sender_id"], data.get("sender_username")
+                    if friend_id not in self.friends:
+                        self.add_contact(friend_id, username)
+                elif event_type == EVENT_REQUEST_REJECTED:
+                    self.remove_friend_request_items(data["request_id"])
+                elif event_type == EVENT_CONNECTED:
+                    # Догружаем изменения и сообщения, пропущенные пока соединения не было
+                    self.sync_changes()
+                    if self.selected_contact_id is not None:
+                        self.conversation_synced = False
+                        self.fetch_newer_messages()
+                elif event_type == EVENT_DISCONNECTED:
+                    self.conversation_synced = False
+                    self.add_notice(data["message"])
+            # Показываем только сообщения открытой переписки, остальные загрузятся при её выборе
+            messages = [
+                message for message in messages
+                if self.selected_contact_id in (message["sender_id"], message["receiver_id"])
+                and self.user_id in (message["sender_id"], message["receiver_id"])
+            ]
+            self.cache_messages(messages)
+            self.add_messages(messages)
+        finally:
+            self.chat_display.setUpdatesEnabled(True)
+
+    def accept_friend_request(self, request_id):
+        # Новый друг добавится в контакты по событию request_accepted
+        self.api.put(f"/friend_requests/{request_id}", params={"status": "accepted"},
+                     on_success=lambda _: self.on_friend_request_answered(request_id, "Friend request accepted"),
+                     on_error=lambda _: QMessageBox.warning(self, "Error", "Failed to accept friend request"))
+
+    def reject_friend_request(self, request_id):
+        self.api.put(f"/friend_requests/{request_id}", params={"status": "rejected"},
+                     on_success=lambda _: self.on_friend_request_answered(request_id, "Friend request rejected"),
+                     on_error=lambda _: QMessageBox.warning(self, "Error", "Failed to reject friend request"))
+
+    def on_friend_request_answered(self, request_id, text):
+        self.remove_friend_request_items(request_id)  # Удаление UI-запроса
+        QMessageBox.information(self, "Success", text)
+
+    def show_friend_request(self, request_id, sender_username):
+        # Запрос может прийти и по WebSocket, и через /sync - показываем один раз
+        if request_id in self.processed_request_ids:
+            return
+        self.processed_request_ids.add(request_id)
 
-    def show_friend_request(self, sender_id, sender_username):
-        # Показ сообщения о запросе на дружбу в окне чата
+        # Показ сообщения о запросе на дружбу в списке запросов
         request_message = f"{sender_username} has sent you a friend request."
         item = QListWidgetItem(request_message)
-        self.chat_display.addItem(item)
+        self.friend_request_list.addItem(item)
 
         # Создание кнопок для принятия и отклонения запроса
         accept_button = QPushButton("Accept")
         reject_button = QPushButton("Reject")
 
-        # Привязываем кнопки к функциям, передавая sender_id
-        accept_button.clicked.connect(lambda _, uid=sender_id: self.accept_friend_request(uid))
-        reject_button.clicked.connect(lambda _, uid=sender_id: self.reject_friend_request(uid))
+        # Привязываем кнопки к функциям, передавая ID запроса
+        accept_button.clicked.connect(lambda _, rid=request_id: self.accept_friend_request(rid))
+        reject_button.clicked.connect(lambda _, rid=request_id: self.reject_friend_request(rid))
 
         # Создание виджета для кнопок
         layout = QHBoxLayout()
@@ -265,29 +475,26 @@ class MainWindow(QWidget):
         button_widget.setLayout(layout)
         button_item = QListWidgetItem()
         button_item.setSizeHint(button_widget.sizeHint())
-        self.chat_display.addItem(button_item)
-        self.chat_display.setItemWidget(button_item, button_widget)
+        self.friend_request_list.addItem(button_item)
+        self.friend_request_list.setItemWidget(button_item, button_widget)
+        self.friend_request_list.show()
 
-        # Добавление в словарь для последующего удаления (если не было инициализировано ранее)
-        if not hasattr(self, 'friend_request_items'):
-            self.friend_request_items = {}
-        self.friend_request_items[sender_id] = (item, button_item)
+        # Добавление в словарь для последующего удаления
+        self.friend_request_items[request_id] = (item, button_item)
 
     def add_friend(self, user_id):
-        url = f"http://127.0.0.1:8000/friend_requests/"
         data = {
             "sender_id": self.user_id,
             "receiver_id": user_id
         }
-        response = safe_post(url, json=data)
-        if response:
-            QMessageBox.information(self, "Success", "Friend request sent successfully")
-        else:
-            QMessageBox.warning(self, "Error", "Failed to send friend request")
+        self.api.post("/friend_requests/", json=data,
+                      on_success=lambda _: QMessageBox.information(self, "Success", "Friend request sent successfully"),
+                      on_error=lambda _: QMessageBox.warning(self, "Error", "Failed to send friend request"))
 
-    def remove_friend_request_items(self, sender_id):
+    def remove_friend_request_items(self, request_id):
         # Удаление элементов сообщения и кнопок, связанных с запросом на дружбу
-        if sender_id in self.friend_request_items:
-            request_message_item, button_item = self.friend_request_items.pop(sender_id)
-            self.chat_display.takeItem(self.chat_display.row(request_message_item))
-            self.chat_display.takeItem(self.chat_display.row(button_item))
\ No newline at end of file
+        if request_id in self.friend_request_items:
+            request_message_item, button_item = self.friend_request_items.pop(request_id)
+            self.friend_request_list.takeItem(self.friend_request_list.row(request_message_item))
+            self.friend_request_list.takeItem(self.friend_request_list.row(button_item))
+            self.friend_request_list.setVisible(bool(self.friend_request_items))
\ No newline at end of file
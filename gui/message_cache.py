@@ -0,0 +1,149 @@
+import json
+import os
+import sqlite3
+import time
+
+# Каталог локального кэша сообщений; у каждого пользователя свой файл
+CACHE_DIR = os.environ.get("CHAT_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".chat_app", "cache"))
+# Бюджет кэша в байтах (оценка по размеру строк); сверх него вытесняются давно открытые переписки
+CACHE_MAX_BYTES = int(os.environ.get("CHAT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Накладные расходы на строку сверх длины текста: id, ключи, индекс
+ROW_OVERHEAD = 64
+
+MESSAGE_COLUMNS = ("id", "sender_id", "receiver_id", "content", "timestamp", "sender_username", "receiver_username",
+                   "attachment")
+
+
+class MessageCache:
+    """Локальная копия переписок пользователя в SQLite. Для каждого собеседника хранится
+    непрерывный диапазон сообщений, заканчивающийся последним синхронизированным: новые
+    догружаются с сервера после max_id, более старые - страницами перед самым старым."""
+
+    def __init__(self, user_id, path=None, max_bytes=CACHE_MAX_BYTES):
+        if path is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            path = os.path.join(CACHE_DIR, f"messages_{user_id}.db")
+        self.user_id = user_id
+        self.max_bytes = max_bytes
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY,
+                peer_id INTEGER NOT NULL,
+                sender_id INTEGER NOT NULL,
+                receiver_id INTEGER NOT NULL,
+                content TEXT NOT NULL,
+                timestamp TEXT,
+                sender_username TEXT,
+                receiver_username TEXT,
+                size INTEGER NOT NULL,
+                attachment TEXT
+            );
+            CREATE INDEX IF NOT EXISTS ix_messages_peer ON messages (peer_id, id);
+            CREATE TABLE IF NOT EXISTS conversations (
+                peer_id INTEGER PRIMARY KEY,
+                last_opened REAL NOT NULL
+            );
+        """)
+        # Кэш, созданный до появления вложений
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(messages)")}
+        if "attachment" not in columns:
+            self.db.execute("ALTER TABLE messages ADD COLUMN attachment TEXT")
+        self.total_bytes = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM messages").fetchone()[0]
+
+    def _peer_id(self, message):
+        return message["receiver_id"] if message["sender_id"] == self.user_id else message["sender_id"]
+
+    def _messages(self, rows):
+        messages = [dict(zip(MESSAGE_COLUMNS, row)) for row in rows]
+        for message in messages:
+            # Метаданные вложения хранятся как JSON; сам файл не кэшируется
+            if message["attachment"] is not None:
+                message["attachment"] = json.loads(message["attachment"])
+        return messages
+
+    def touch(self, peer_id):
+        """Отмечает открытие переписки: давно не открытые вытесняются первыми."""
+        self.db.execute("INSERT OR REPLACE INTO conversations (peer_id, last_opened) VALUES (?, ?)",
+                        (peer_id, time.time()))
+        self.db.commit()
+
+    def latest(self, peer_id, limit):
+        rows = self.db.execute(
+            f"SELECT {', '.join(MESSAGE_COLUMNS)} FROM messages WHERE peer_id = ? ORDER BY id DESC LIMIT ?",
+            (peer_id, limit)
+        ).fetchall()
+        return self._messages(reversed(rows))
+
+    def before(self, peer_id, before_id, limit):
+        rows = self.db.execute(
+            f"SELECT {', '.join(MESSAGE_COLUMNS)} FROM messages WHERE peer_id = ? AND id < ? "
+            "ORDER BY id DESC LIMIT ?",
+            (peer_id, before_id, limit)
+        ).fetchall()
+        return self._messages(reversed(rows))
+
+    def max_id(self, peer_id):
+        return self.db.execute("SELECT MAX(id) FROM messages WHERE peer_id = ?", (peer_id,)).fetchone()[0]
+
+    def store(self, messages):
+        """Сохраняет сообщения (повторные id игнорируются) и при превышении бюджета вытесняет старые."""
+        rows = [
+            (message["id"], self._peer_id(message), message["sender_id"], message["receiver_id"],
+             message["content"], message.get("timestamp"), message.get("sender_username"),
+             message.get("receiver_username"), len(message["content"].encode()) + ROW_OVERHEAD,
+             json.dumps(message["attachment"]) if message.get("attachment") else None)
+            for message in messages
+        ]
+        if not rows:
+            return
+        # total_bytes ведётся по вставленным строкам: полный SUM(size) на каждую пачку
+        # заметно задерживал поток интерфейса
+        for row in rows:
+            before = self.db.total_changes
+            self.db.execute(
+                "INSERT OR IGNORE INTO messages (id, peer_id, sender_id, receiver_id, content, timestamp, "
+                "sender_username, receiver_username, size, attachment) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                row
+            )
+            if self.db.total_changes != before:
+                self.total_bytes += row[8]
+        self.db.commit()
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        # Сначала целиком удаляются давно открытые переписки, затем самые старые сообщения
+        # самой свежей - так у каждого собеседника остаётся непрерывный хвост переписки
+        while self.total_bytes > self.max_bytes:
+            peers = self.db.execute(
+                "SELECT peer_id FROM messages GROUP BY peer_id "
+                "ORDER BY (SELECT last_opened FROM conversations c WHERE c.peer_id = messages.peer_id) "
+                "NULLS FIRST LIMIT 2"
+            ).fetchall()
+            if not peers:
+                break
+            # Размер удаляемого считается только по строкам этого собеседника (индекс ix_messages_peer)
+            if len(peers) > 1:
+                freed, = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM messages WHERE peer_id = ?",
+                                         peers[0]).fetchone()
+                self.db.execute("DELETE FROM messages WHERE peer_id = ?", peers[0])
+            else:
+                # Осталась одна переписка: удаляются самые старые сообщения ровно на превышение
+                # бюджета, а не фиксированная порция, которая может быть больше всей переписки
+                excess = self.total_bytes - self.max_bytes
+                freed, last_id = 0, None
+                for message_id, size in self.db.execute(
+                        "SELECT id, size FROM messages WHERE peer_id = ? ORDER BY id", peers[0]):
+                    freed += size
+                    last_id = message_id
+                    if freed >= excess:
+                        break
+                self.db.execute("DELETE FROM messages WHERE peer_id = ? AND id <= ?", (peers[0][0], last_id))
+            self.total_bytes -= freed
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,162 @@
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QRect, QSize
+from PyQt5.QtGui import QColor, QFont, QFontMetrics, QPainter
+from PyQt5.QtWidgets import QStyledItemDelegate, QListView, QAbstractItemView
+
+# Цвета "пузырей": свои сообщения и сообщения собеседника (как в прежнем MessageWidget)
+SENDER_COLOR = QColor("#00a86b")
+RECEIVER_COLOR = QColor("#00754a")
+NOTICE_COLOR = QColor("#888888")
+
+BUBBLE_PADDING = 10
+BUBBLE_RADIUS = 10
+BUBBLE_MARGIN = 5
+# Максимальная ширина "пузыря" относительно ширины списка
+BUBBLE_MAX_WIDTH = 0.7
+
+
+class MessageListModel(QAbstractListModel):
+    """Сообщения открытой переписки, от старых к новым. Строка - кортеж
+    (id, is_sender, text); is_sender=None - служебное уведомление без id."""
+
+    MessageIdRole = Qt.UserRole + 1
+    IsSenderRole = Qt.UserRole + 2
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []
+        self._ids = set()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        message_id, is_sender, text = self._rows[index.row()]
+        if role == Qt.DisplayRole:
+            return text
+        if role == self.MessageIdRole:
+            return message_id
+        if role == self.IsSenderRole:
+            return is_sender
+        return None
+
+    def contains(self, message_id):
+        return message_id in self._ids
+
+    def oldest_id(self):
+        for message_id, _, _ in self._rows:
+            if message_id is not None:
+                return message_id
+        return None
+
+    def _new_rows(self, rows):
+        # Сообщение может прийти дважды (ответ на отправку и эхо по WebSocket)
+        new_rows = []
+        for row in rows:
+            if row[0] is not None:
+                if row[0] in self._ids:
+                    continue
+                self._ids.add(row[0])
+            new_rows.append(row)
+        return new_rows
+
+    def reset_rows(self, rows):
+        self.beginResetModel()
+        self._ids = set()
+        self._rows = self._new_rows(rows)
+        self.endResetModel()
+
+    def append_rows(self, rows):
+        rows = self._new_rows(rows)
+        if rows:
+            first = len(self._rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+            self._rows.extend(rows)
+            self.endInsertRows()
+        return len(rows)
+
+    def prepend_rows(self, rows):
+        """Добавляет более старую страницу в начало; возвращает число добавленных строк."""
+        rows = self._new_rows(rows)
+        if rows:
+            self.beginInsertRows(QModelIndex(), 0, len(rows) - 1)
+            self._rows[:0] = rows
+            self.endInsertRows()
+        return len(rows)
+
+
+class MessageBubbleDelegate(QStyledItemDelegate):
+    """Рисует сообщение "пузырём" без отдельного виджета на строку: отрисовываются
+    только видимые строки, размеры кэшируются по тексту и ширине списка."""
+
+    def __init__(self, view):
+        super().__init__(view)
+        self._view = view
+        self.font = QFont("Arial", 12)
+        self._metrics = QFontMetrics(self.font)
+        self._size_cache = {}
+        self._cache_width = None
+
+    def _max_text_width(self):
+        width = int(self._view.viewport().width() * BUBBLE_MAX_WIDTH) - 2 * BUBBLE_PADDING
+        return max(width, 50)
+
+    def _text_size(self, text, max_width):
+        if self._cache_width != max_width:
+            self._size_cache.clear()
+            self._cache_width = max_width
+        size = self._size_cache.get(text)
+        if size is None:
+            size = self._metrics.boundingRect(QRect(0, 0, max_width, 100000), Qt.TextWordWrap, text).size()
+            self._size_cache[text] = size
+        return size
+
+    def sizeHint(self, option, index):
+        text_size = self._text_size(index.data(Qt.DisplayRole), self._max_text_width())
+        return QSize(text_size.width() + 2 * (BUBBLE_PADDING + BUBBLE_MARGIN),
+                     text_size.height() + 2 * (BUBBLE_PADDING + BUBBLE_MARGIN))
+
+    def paint(self, painter, option, index):
+        text = index.data(Qt.DisplayRole)
+        is_sender = index.data(MessageListModel.IsSenderRole)
+        text_size = self._text_size(text, self._max_text_width())
+        bubble_width = text_size.width() + 2 * BUBBLE_PADDING
+        bubble_height = text_size.height() + 2 * BUBBLE_PADDING
+        row = option.rect
+
+        if is_sender is None:
+            left = row.left() + (row.width() - bubble_width) // 2  # Уведомления - по центру
+        elif is_sender:
+            left = row.right() - BUBBLE_MARGIN - bubble_width
+        else:
+            left = row.left() + BUBBLE_MARGIN
+        bubble = QRect(left, row.top() + BUBBLE_MARGIN, bubble_width, bubble_height)
+
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setFont(self.font)
+        if is_sender is None:
+            painter.setPen(NOTICE_COLOR)
+        else:
+            painter.setPen(Qt.NoPen)
+            painter.setBrush(SENDER_COLOR if is_sender else RECEIVER_COLOR)
+            painter.drawRoundedRect(bubble, BUBBLE_RADIUS, BUBBLE_RADIUS)
+            painter.setPen(Qt.white)
+        painter.drawText(bubble.adjusted(BUBBLE_PADDING, BUBBLE_PADDING, -BUBBLE_PADDING, -BUBBLE_PADDING),
+                         Qt.TextWordWrap, text)
+        painter.restore()
+
+
+def create_message_view(model, parent=None):
+    """QListView переписки: строки разной высоты, раскладка порциями, прокрутка по пикселям."""
+    view = QListView(parent)
+    view.setModel(model)
+    view.setItemDelegate(MessageBubbleDelegate(view))
+    view.setSelectionMode(QAbstractItemView.NoSelection)
+    view.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+    view.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+    view.setResizeMode(QListView.Adjust)  # Перераскладка при изменении ширины
+    view.setLayoutMode(QListView.Batched)
+    view.setBatchSize(200)
+    return view
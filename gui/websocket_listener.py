@@ -1,31 +1,80 @@
 import asyncio
-import json
 import websockets
-from PyQt5.QtCore import QThread
+from PyQt5.QtCore import QThread, pyqtSignal
+from wire_format import SUBPROTOCOLS, decode_frame
+
+# Типы событий, которые получает окно
+EVENT_MESSAGE = "message"
+EVENT_FRIEND_REQUEST = "friend_request"
+EVENT_REQUEST_ACCEPTED = "request_accepted"
+EVENT_REQUEST_REJECTED = "request_rejected"
+EVENT_CONNECTED = "connected"
+EVENT_DISCONNECTED = "disconnected"
+
+# Интервал, с которым накопленные события передаются в поток интерфейса (~60 кадров/с)
+FRAME_INTERVAL = 1 / 60
+
+
+def decode_events(data):
+    """Разбирает кадр сервера в список событий (type, payload)."""
+    event_type = data.get("type", EVENT_MESSAGE)  # Одиночные сообщения приходят без "type"
+    if event_type == "message_batch":
+        return [(EVENT_MESSAGE, message) for message in data.get("messages", [])]
+    return [(event_type, data)]
+
 
 class WebSocketListener(QThread):
-    def __init__(self, chat_display, user_id):
+    # Пачка событий [(type, payload), ...]; слоты выполняются в потоке интерфейса
+    events_received = pyqtSignal(list)
+
+    def __init__(self, user_id):
         super().__init__()
-        self.chat_display = chat_display
         self.user_id = user_id
+        self._pending = []
+        self._flush_scheduled = False
+        self._loop = None
+        self._task = None
+
+    def _push(self, events):
+        # Вызывается только из цикла событий потока слушателя, блокировки не нужны
+        self._pending.extend(events)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_later(FRAME_INTERVAL, self._flush)
+
+    def _flush(self):
+        self._flush_scheduled = False
+        events, self._pending = self._pending, []
+        if events:
+            # Сигнал между потоками доставляется через очередь событий Qt
+            self.events_received.emit(events)
+
+    def stop(self):
+        # Вызывается из потока интерфейса: отменяем задачу слушателя в его цикле событий
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._task.cancel)
 
     async def listen(self):
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
         uri = f"ws://127.0.0.1:8000/ws/chat/{self.user_id}"
         while True:
             try:
-                async with websockets.connect(uri) as websocket:
+                # Сервер выбирает компактный формат из предложенных; без него - обычный JSON
+                async with websockets.connect(uri, subprotocols=SUBPROTOCOLS) as websocket:
+                    self._push([(EVENT_CONNECTED, {})])
                     while True:
                         message = await websocket.recv()
-                        data = json.loads(message)
-                        sender = data.get("sender_username", "Unknown")
-                        content = data.get("content", "")
-                        self.chat_display.append(f"{sender}: {content}")
+                        self._push(decode_events(decode_frame(websocket.subprotocol, message)))
             except websockets.ConnectionClosedError:
-                self.chat_display.append("Connection to server closed. Reconnecting...")
+                self._push([(EVENT_DISCONNECTED, {"message": "Connection to server closed. Reconnecting..."})])
                 await asyncio.sleep(2)
             except Exception as e:
-                self.chat_display.append(f"Error: {e}")
+                self._push([(EVENT_DISCONNECTED, {"message": f"Error: {e}"})])
                 await asyncio.sleep(2)
 
     def run(self):
-        asyncio.run(self.listen())
\ No newline at end of file
+        try:
+            asyncio.run(self.listen())
+        except asyncio.CancelledError:
+            pass
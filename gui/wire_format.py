@@ -0,0 +1,44 @@
+import json
+
+try:
+    import msgpack
+except ImportError:  # msgpack необязателен: тогда используется компактный JSON
+    msgpack = None
+
+# Подпротоколы чата в порядке предпочтения клиента
+SUBPROTOCOLS = (["chat.msgpack"] if msgpack is not None else []) + ["chat.compact-json"]
+
+# Короткие ключи компактных форматов (см. app/wire.py на сервере)
+LONG_KEYS = {
+    "T": "type",
+    "i": "id",
+    "s": "sender_id",
+    "r": "receiver_id",
+    "c": "content",
+    "t": "timestamp",
+    "su": "sender_username",
+    "ru": "receiver_username",
+    "m": "message",
+    "ms": "messages",
+    "q": "request_id",
+    "a": "attachment",
+}
+
+
+def decode_frame(subprotocol, payload):
+    """Декодирует кадр в словарь с полными ключами."""
+    if subprotocol == "chat.msgpack":
+        data = msgpack.unpackb(payload)
+    else:
+        data = json.loads(payload)
+    if subprotocol is None:
+        return data
+    return _expand(data)
+
+
+def _expand(data):
+    expanded = {LONG_KEYS.get(key, key): value for key, value in data.items()}
+    if "ms" in data:  # Кадр "message_batch" - список сообщений
+        expanded["messages"] = [_expand(message) for message in data["ms"]]
+    return expanded
+
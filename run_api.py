@@ -1,4 +1,9 @@
 import uvicorn
 
+from app.database import engine
+from app.migrations import run_migrations
+
 if __name__ == "__main__":
-    uvicorn.run("app.main:app", host="127.0.0.1", port=8000, reload=True)
\ No newline at end of file
+    # Миграции - один раз до запуска воркеров, а не при импорте app.main в каждом из них
+    run_migrations(engine)
+    uvicorn.run("app.main:app", host="127.0.0.1", port=8000, reload=True)
@@ -0,0 +1,63 @@
+# tests/conftest.py
+#
+# Приложение настраивается переменными окружения при импорте app.main, поэтому
+# временная база и каталоги задаются здесь, до импорта тестовых модулей.
+
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import event
+
+_directory = tempfile.mkdtemp(prefix="chat-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_directory, 'test.db')}"
+os.environ.pop("DATABASE_READ_URL", None)
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["ARCHIVE_DIR"] = os.path.join(_directory, "archive")
+os.environ["BLOB_DIR"] = os.path.join(_directory, "blobs")
+os.environ["BACKPLANE_URL"] = "memory://"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app import main  # noqa: E402
+from app.migrations import run_migrations  # noqa: E402
+
+
+class QueryCounter:
+    """Считает SQL-запросы всех движков приложения (before_cursor_execute)."""
+
+    def __init__(self, engines):
+        self.engines = list(dict.fromkeys(engines))
+        self.statements = []
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        for engine in self.engines:
+            event.listen(engine, "before_cursor_execute", self._count)
+        return self
+
+    def __exit__(self, *exc_info):
+        for engine in self.engines:
+            event.remove(engine, "before_cursor_execute", self._count)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+
+@pytest.fixture(scope="session")
+def client():
+    run_migrations(main.engine)
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def count_queries():
+    def counter():
+        # Кэш имён сбрасывается, чтобы считать запросы холодного пути
+        main.user_directory.clear()
+        return QueryCounter([main.engine, main.read_engine, main.async_engine.sync_engine])
+    return counter
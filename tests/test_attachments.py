@@ -0,0 +1,30 @@
+# tests/test_attachments.py
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def uploader(client):
+    return client.post("/users/", json={"username": "uploader", "password": "p"}).json()["id"]
+
+
+@pytest.mark.parametrize("content_type, served", [
+    ("audio/ogg; codecs=opus", "audio/ogg"),
+    ("text/html", "application/octet-stream"),
+    ("image/svg+xml", "application/octet-stream"),
+])
+def test_download_does_not_trust_uploaded_type(client, uploader, content_type, served):
+    body = f"<html><script>alert(1)</script>{content_type}</html>".encode()
+    attachment = client.post("/attachments/", params={"user_id": uploader}, content=body,
+                             headers={"content-type": content_type}).json()
+
+    response = client.get(f"/attachments/{attachment['id']}")
+    assert response.status_code == 200
+    assert response.content == body
+    assert response.headers["content-type"] == served
+    assert response.headers["x-content-type-options"] == "nosniff"
+    assert response.headers["content-disposition"] == "attachment"
+
+    partial = client.get(f"/attachments/{attachment['id']}", headers={"Range": "bytes=0-5"})
+    assert partial.status_code == 206
+    assert partial.content == body[:6]
@@ -0,0 +1,39 @@
+# tests/test_query_counts.py
+#
+# Число SQL-запросов на HTTP-запрос не должно зависеть от размера страницы (N+1).
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def users(client):
+    ids = [client.post("/users/", json={"username": f"qc{i}", "password": "p"}).json()["id"] for i in range(7)]
+    for i in range(30):
+        response = client.post("/messages/", json={"sender_id": ids[i % 3], "receiver_id": ids[0],
+                                                   "content": f"message {i}"})
+        assert response.status_code == 200
+    # ids[0] получает 5 запросов в друзья, ids[6] - один
+    for sender_id in ids[1:6]:
+        assert client.post("/friend_requests/", json={"sender_id": sender_id, "receiver_id": ids[0]}).status_code == 200
+    assert client.post("/friend_requests/", json={"sender_id": ids[1], "receiver_id": ids[6]}).status_code == 200
+    return ids
+
+
+@pytest.mark.parametrize("limit", [5, 25])
+def test_get_messages_query_count(client, users, count_queries, limit):
+    with count_queries() as queries:
+        response = client.get("/messages/", params={"user_id": users[0], "limit": limit})
+    assert response.status_code == 200
+    assert len(response.json()) == limit
+    # Счётчик архивных сообщений, страница сообщений, имена пользователей одним запросом
+    assert queries.count == 3, queries.statements
+
+
+@pytest.mark.parametrize("receiver_index, pending", [(6, 1), (0, 5)])
+def test_get_friend_requests_query_count(client, users, count_queries, receiver_index, pending):
+    with count_queries() as queries:
+        response = client.get(f"/friend_requests/{users[receiver_index]}")
+    assert response.status_code == 200
+    assert len(response.json()) == pending
+    # Запросы в друзья и имена отправителей и получателей одним запросом
+    assert queries.count == 2, queries.statements
@@ -0,0 +1,43 @@
+# tests/test_user_search.py
+
+import pytest
+
+from app import main, models, user_search
+
+NAMES = ["Qzx1", "qzx22", "QZX3", "aQzx4", "bqzx5", "xxQZX6", "qzx7x", "cQZX8", "other9"]
+PREFIX_HITS = ["Qzx1", "qzx22", "QZX3", "qzx7x"]
+# Сначала совпадения с начала имени, затем остальные по возрастанию id
+SUBSTRING_HITS = PREFIX_HITS + ["aQzx4", "bqzx5", "xxQZX6", "cQZX8"]
+
+
+@pytest.fixture(scope="module")
+def users(client):
+    with main.SessionLocal() as db:
+        db.add_all(models.User(username=name, hashed_password="x") for name in NAMES)
+        db.commit()
+
+
+def _all_pages(query, limit):
+    found, cursor = [], None
+    with main.SessionLocal() as db:
+        while True:
+            rows, cursor = user_search.search_users(db, query, limit, cursor)
+            found += [row.username for row in rows]
+            if cursor is None:
+                return found
+
+
+@pytest.mark.parametrize("query", ["qz", "QZ", "qZ"])
+def test_prefix_search_ignores_case(users, query):
+    assert _all_pages(query, 3) == PREFIX_HITS
+
+
+@pytest.mark.parametrize("candidates", [1, 2, 1000])
+@pytest.mark.parametrize("limit", [1, 3, 20])
+def test_substring_search_pages(users, monkeypatch, candidates, limit):
+    # С малым лимитом кандидатов страницы короче limit, но совпадения не теряются и не повторяются
+    monkeypatch.setattr(user_search, "SUBSTRING_CANDIDATES", candidates)
+    assert _all_pages("qzx", limit) == SUBSTRING_HITS
+    assert _all_pages("QZX7", limit) == ["qzx7x"]
+    assert _all_pages("zx4", limit) == ["aQzx4"]
+    assert _all_pages("qzxq", limit) == []